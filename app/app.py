@@ -1,18 +1,11 @@
 # app/app.py
 import streamlit as st
-import tempfile
 import json
 from pathlib import Path
 
-# Import your project agents (adjust names if needed)
-from src.agents.report_agent import parse_report
-from src.agents.summary_agent import generate_summary
-from src.agents.recommendation_agent import generate_recommendations
-from src.agents.trend_agent import analyze_trends
-from src.agents.diet_agent import analyze_diet
-from src.agents.sleep_agent import analyze_sleep
-from src.agents.stress_agent import analyze_stress
-from src.agents.hydration_agent import analyze_hydration
+# Project agents run through the same concurrent pipeline as the CLI
+from src.main import SECTIONS, build_agents, build_pipeline
+from src.utils.cache import MemoryCache, hash_bytes
 
 st.set_page_config(page_title="Personal Health Guardian", layout="wide")
 
@@ -28,64 +21,64 @@ with st.sidebar:
 
     run_btn = st.button("Run analysis")
 
-def run_pipeline(report_path: str):
-    """Call project agents and return a consolidated result dict."""
-    result = {}
-    # parse raw report
-    parsed = parse_report(report_path)
-    result["extracted"] = parsed
-
-    # summary
-    try:
-        summary = generate_summary(parsed)
-    except Exception:
-        summary = {"summary": "No summary available."}
-    result["summary"] = summary
-
-    # recommendations
-    try:
-        recs = generate_recommendations(parsed)
-    except Exception:
-        recs = {"recommendations": ["No recommendations available."]}
-    result["recommendations"] = recs
-
-    # trends
-    try:
-        trends = analyze_trends(parsed)
-    except Exception:
-        trends = {"trends": ["No trends analysis available."]}
-    result["trends"] = trends
-
-    # diet
-    try:
-        diet = analyze_diet(parsed)
-    except Exception:
-        diet = {"diet": "No diet analysis available."}
-    result["diet"] = diet
-
-    # sleep
-    try:
-        sleep = analyze_sleep(parsed)
-    except Exception:
-        sleep = {"sleep": "No sleep analysis available."}
-    result["sleep"] = sleep
-
-    # stress
-    try:
-        stress = analyze_stress(parsed)
-    except Exception:
-        stress = {"stress": "No stress analysis available."}
-    result["stress"] = stress
-
-    # hydration
-    try:
-        hydration = analyze_hydration(parsed)
-    except Exception:
-        hydration = {"hydration": "No hydration analysis available."}
-    result["hydration"] = hydration
+# Shown in place of an agent's output when it fails or times out
+FALLBACKS = {
+    "summary": {"summary": "No summary available."},
+    "recommendations": {"recommendations": ["No recommendations available."]},
+    "trends": {"trends": ["No trends analysis available."]},
+    "diet": {"diet": "No diet analysis available."},
+    "sleep": {"sleep": "No sleep analysis available."},
+    "stress": {"stress": "No stress analysis available."},
+    "hydration": {"hydration": "No hydration analysis available."},
+}
+
+# Seconds each agent may take before its section falls back
+STAGE_TIMEOUT = 30
+
+# Uploaded health records stay in memory: no extracted text or agent output goes to the
+# on-disk caches the CLI uses
+PARSE_OPTIONS = {"cache": False}
+
+# Memory budget for analysed reports kept across Streamlit reruns
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource
+def result_cache() -> MemoryCache:
+    # one cache per server process, shared by every session and rerun
+    return MemoryCache(RESULT_CACHE_BYTES, sizeof=lambda res: len(json.dumps(res, default=str)))
+
+def run_pipeline(report: bytes):
+    """Call project agents on the PDF bytes and return a consolidated result dict."""
+    pipeline = build_pipeline(build_agents(), PARSE_OPTIONS, timeout=STAGE_TIMEOUT, memoize=False)
+    outputs = pipeline.run({"report_path": report})
+
+    # parse raw report; without it there is nothing to show
+    parsed = outputs["parse_report"]
+    if isinstance(parsed, dict) and "_error" in parsed:
+        raise RuntimeError(parsed["_error"])
+    # a plain dict drops the cached lower-cased copy of the text before the result is kept
+    result = {"extracted": dict(parsed)}
+
+    # the seven analysis agents ran concurrently on the parsed report
+    for name, key, _ in SECTIONS:
+        out = outputs[name]
+        if out is None or (isinstance(out, dict) and "_error" in out):
+            out = FALLBACKS[key]
+        result[key] = out
 
     return result
 
+def analyse(report: bytes) -> dict:
+    """Results for this exact PDF content, computed at most once while they fit the cache."""
+    digest = hash_bytes(report)
+    cache = result_cache()
+    consolidated = cache.get(digest)
+    if consolidated is None:
+        consolidated = run_pipeline(report)
+        cache.put(digest, consolidated)
+    st.session_state["report_digest"] = digest
+    return consolidated
+
 def show_results(res: dict):
     st.header("=== Consolidated Report ===")
     cols = st.columns([1, 1])
@@ -121,24 +114,28 @@ if run_btn:
     if uploaded_file is None and not sample:
         st.error("Please upload a PDF or check 'Use sample PDF'.")
     else:
-        # Save uploaded to a temp file (or use your sample file path)
+        # Work on the PDF bytes in memory; nothing is written to disk
+        report = None
         if sample:
             # expect repository sample path
             sample_path = Path.cwd() / "sample_reports" / "sample1.pdf"
             if not sample_path.exists():
                 st.error("Sample PDF not found in sample_reports/sample1.pdf")
             else:
-                report_path = str(sample_path)
+                report = sample_path.read_bytes()
         else:
-            t = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-            t.write(uploaded_file.read())
-            t.flush()
-            report_path = t.name
-
-        with st.spinner("Running analysis... this may take a few seconds"):
-            try:
-                consolidated = run_pipeline(report_path)
-                show_results(consolidated)
-                st.success("Analysis complete")
-            except Exception as e:
-                st.exception(e)
\ No newline at end of file
+            report = uploaded_file.getvalue()
+
+        if report is not None:
+            with st.spinner("Running analysis... this may take a few seconds"):
+                try:
+                    consolidated = analyse(report)
+                    show_results(consolidated)
+                    st.success("Analysis complete")
+                except Exception as e:
+                    st.exception(e)
+elif "report_digest" in st.session_state:
+    # other widget interactions rerun the script: re-render the last report from the cache
+    consolidated = result_cache().get(st.session_state["report_digest"])
+    if consolidated is not None:
+        show_results(consolidated)
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Benchmark harness
+- Generates synthetic reports across page counts and keyword densities, then times
+  extract_text_from_pdf, every analysis agent and the full run_all path.
+- Writes machine-readable JSON (with commit and library versions) and can compare
+  against an earlier results file to spot regressions between commits.
+
+Usage:
+  python -m benchmarks.run_benchmarks --output bench.json
+  python -m benchmarks.run_benchmarks --pages 1,50 --densities 0.05 --compare bench.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# measure decoding and analysis, not the on-disk extraction cache
+os.environ["PHG_CACHE"] = "0"
+
+import fitz  # PyMuPDF
+
+from benchmarks.synthetic_reports import generate_report
+from src.main import SECTIONS, build_agents, run_all
+from src.utils.lab_values import extract_lab_values
+from src.utils.pdf_utils import extract_text_from_pdf
+from src.utils.report_context import ParsedReport
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {"min_s": min(samples), "median_s": statistics.median(samples), "repeat": repeat}
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+def run(pages_list: List[int], densities: List[float], repeat: int) -> Dict[str, Any]:
+    agents = build_agents()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in pages_list:
+            for density in densities:
+                path = generate_report(os.path.join(tmp, f"r_{pages}_{density}.pdf"), pages, density)
+                case = {"pages": pages, "density": density}
+
+                results.append({**case, "stage": "extract_text_from_pdf",
+                                **_time(lambda: extract_text_from_pdf(path, cache=None, ocr=False), repeat)})
+
+                text = extract_text_from_pdf(path, cache=None, ocr=False)
+                labs = extract_lab_values(text)
+                for name, _, _ in SECTIONS:
+                    fn = agents.get(name)
+                    if fn is None:
+                        continue
+                    # a fresh report each time so no agent benefits from another's cached lookups
+                    results.append({**case, "stage": name,
+                                    **_time(lambda: fn(ParsedReport(raw_text=text, labs=labs)), repeat)})
+
+                def full():
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        run_all(path)
+                results.append({**case, "stage": "run_all", **_time(full, repeat)})
+                print(f"pages={pages} density={density} done", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One line per case present in both runs: baseline vs current median and the ratio."""
+    key = lambda r: (r["stage"], r["pages"], r["density"])
+    before = {key(r): r for r in baseline["results"]}
+    lines = [f"{'stage':<26}{'pages':>6}{'density':>9}{'before_ms':>12}{'after_ms':>12}{'ratio':>8}"]
+    for r in current["results"]:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else float("nan")
+        lines.append(f"{r['stage']:<26}{r['pages']:>6}{r['density']:>9}"
+                     f"{old['median_s'] * 1000:>12.3f}{r['median_s'] * 1000:>12.3f}{ratio:>8.2f}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(prog="Personal Health Guardian benchmarks")
+    parser.add_argument("--pages", default="1,10,100", help="Comma-separated page counts")
+    parser.add_argument("--densities", default="0.0,0.05,0.3", help="Comma-separated keyword densities (0-1)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--output", "-o", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    current = run([int(p) for p in args.pages.split(",")], [float(d) for d in args.densities.split(",")], args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    else:
+        print(json.dumps(current, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(current, baseline)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
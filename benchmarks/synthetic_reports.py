@@ -0,0 +1,77 @@
+"""
+Synthetic report generator
+- Writes lab-report-like PDFs with PyMuPDF for benchmarking.
+- pages controls document length; keyword_density is the share of lines that mention
+  one of the keywords the agents look for (the rest is neutral filler).
+- Output is deterministic for a given seed so runs on different commits are comparable.
+"""
+
+import random
+from typing import List
+
+import fitz  # PyMuPDF
+
+KEYWORD_LINES = [
+    "Patient reports fatigue and feeling tired most afternoons.",
+    "History of insomnia; sleep quality described as poor.",
+    "Mild anxiety and stress related to work were discussed.",
+    "Episodes of low mood reported over the last month.",
+    "Occasional dry mouth and dark urine noted; possible dehydration.",
+    "Thyroid function to be rechecked at next visit.",
+    "Blood pressure trend shows an increase since last review.",
+    "Serum cholesterol remains stable compared to prior results.",
+    "Advised to monitor blood sugar after meals.",
+]
+
+LAB_LINES = [
+    "LDL Cholesterol: {ldl} mg/dL (0-100)",
+    "HDL Cholesterol: {hdl} mg/dL (40-60)",
+    "Fasting Blood Glucose: {glu} mg/dL (70-99)",
+    "HbA1c: {a1c} %",
+    "Hemoglobin: {hb} g/dL (13.0-17.0)",
+    "Blood pressure: {sys}/{dia} mmHg",
+    "Weight: {wt} kg   Height: {ht} cm",
+]
+
+FILLER_LINES = [
+    "Specimen collected and processed according to laboratory protocol.",
+    "Results were reviewed by the attending physician.",
+    "Please bring this report to your next appointment.",
+    "Reference intervals are method and population dependent.",
+    "Comments: no further action required for this panel.",
+    "Sample received in good condition at the laboratory.",
+]
+
+LINES_PER_PAGE = 40
+
+def _lab_line(rng: random.Random) -> str:
+    return rng.choice(LAB_LINES).format(
+        ldl=rng.randint(60, 190), hdl=rng.randint(30, 80), glu=rng.randint(70, 180),
+        a1c=round(rng.uniform(4.8, 9.5), 1), hb=round(rng.uniform(10.5, 17.5), 1),
+        sys=rng.randint(100, 170), dia=rng.randint(60, 105), wt=rng.randint(50, 120), ht=rng.randint(150, 195),
+    )
+
+def page_lines(rng: random.Random, keyword_density: float) -> List[str]:
+    lines = []
+    for _ in range(LINES_PER_PAGE):
+        roll = rng.random()
+        if roll < keyword_density:
+            lines.append(rng.choice(KEYWORD_LINES))
+        elif roll < keyword_density + 0.15:
+            lines.append(_lab_line(rng))
+        else:
+            lines.append(rng.choice(FILLER_LINES))
+    return lines
+
+def generate_report(path: str, pages: int, keyword_density: float = 0.05, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    try:
+        for pno in range(pages):
+            page = doc.new_page()
+            text = f"Laboratory Report - page {pno + 1} of {pages}\n" + "\n".join(page_lines(rng, keyword_density))
+            page.insert_textbox(fitz.Rect(36, 36, page.rect.width - 36, page.rect.height - 36), text, fontsize=9)
+        doc.save(path)
+    finally:
+        doc.close()
+    return path
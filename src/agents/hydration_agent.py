@@ -1,59 +1,74 @@
 """
 Hydration Agent
 - Detects hydration-related mentions and gives practical hydration advice.
-- If weight is present in report text (kg), estimates daily water need using a simple rule.
+- If weight is among the report's extracted lab values, estimates daily water need using a simple rule.
+- Flags and recommendation texts are the "analyze_hydration" rules in rules.json.
 """
 
-import re
-from typing import Dict, Any, Optional
+from typing import Any, Dict
 
-def _extract_weight_kg(text: str) -> Optional[float]:
-    # find numbers followed by kg or kilograms
-    m = re.search(r"(\d{2,3}(?:\.\d+)?)\s*(?:kg|kgs|kilograms)\b", text, re.IGNORECASE)
-    if m:
-        try:
-            return float(m.group(1))
-        except:
-            return None
-    return None
+import numpy as np
+
+from ..utils.catalogue import ResultBatch
+from ..utils.cohort import text_series
+from ..utils.lab_values import first_measurement
+from ..utils.report_context import ReportContext, get_context
+from ..utils.rules import default_rules
+
+RULES = default_rules()
+
+LAYOUT = (("flags", "flags"), ("recommended_daily_ml", "param:water_ml"), ("recommendations", "recommendations"))
+# fill the water-need template of the "lab:weight" rule
+PARAMS = (("weight", float), ("water_ml", int), ("cups", int))
+# compile now (streamed reports need the keywords registered up front) and register the catalogue
+RULES.agent("analyze_hydration").catalogue(LAYOUT, params=PARAMS)
 
 def _estimate_water_ml_per_day(weight_kg: float) -> int:
     # Simple rule: 30-35 ml per kg body weight. We'll use 35 ml/kg for recommendation.
     return int(round(weight_kg * 35))
 
 def analyze_hydration(report_data: Dict[str, Any]) -> Dict[str, Any]:
-    text = report_data.get("raw_text", "") or ""
-    text_l = text.lower()
-
-    flags = []
-    recommendations = []
-
-    # Keyword checks
-    if any(k in text_l for k in ["dehydrat", "dehydration", "thirst", "very thirsty", "dry mouth", "reduced urine", "dark urine"]):
-        flags.append("possible_dehydration")
-        recommendations.append("Increase fluid intake immediately and consult a doctor if symptoms persist.")
-
-    if "sweat" in text_l or "diarrhoea" in text_l or "vomit" in text_l:
-        flags.append("fluid_loss_risk")
-        recommendations.append("Replace fluids and electrolytes; consider oral rehydration solutions if needed.")
-
-    # Weight-based recommendation
-    weight = _extract_weight_kg(text)
-    water_ml = None
-    if weight:
-        water_ml = _estimate_water_ml_per_day(weight)
-        recommendations.append(f"Estimated daily water need (based on weight {weight} kg): about {water_ml} ml (~{int(water_ml/250)} cups of 250ml).")
-
-    # Generic advice added if none specific
-    if not recommendations:
-        recommendations.append("Aim for 1.5–3 liters of fluids daily depending on activity, climate and health status.")
-        recommendations.append("Prefer water, herbal teas, and electrolyte drinks when needed; limit sugary drinks.")
-
-    return {
-        "flags": flags,
-        "recommended_daily_ml": water_ml,
-        "recommendations": recommendations,
-    }
+    ctx = get_context(report_data)
+    rules = RULES.agent("analyze_hydration")
+    result = rules.evaluate(ctx)
+
+    # Weight-based estimate for the water-need recommendation
+    weight_rec = ctx.lab("weight")
+    params = None
+    if weight_rec and weight_rec.value:
+        water_ml = _estimate_water_ml_per_day(weight_rec.value)
+        params = {"weight": weight_rec.value, "water_ml": water_ml, "cups": int(water_ml/250)}
+
+    return rules.catalogue(LAYOUT, params=PARAMS).expand(result.flags, None, result.codes["recommendations"], params)
+
+def analyze_hydration_batch(texts, labs=None, hits=None, compact=False):
+    """
+    analyze_hydration for many report texts at once (list or pandas Series).
+    labs optionally gives each report's extracted lab values (as in the report dict); without
+    them only the weight pattern is scanned. Keyword rules are vectorised; the weight lookup is per report.
+    Returns one result per text, identical to the per-report function, or a ResultBatch with compact=True.
+    """
+    texts = text_series(texts)
+    labs = [None] * len(texts) if labs is None else list(labs)
+
+    weights = np.full(len(texts), np.nan)
+    water = np.full(len(texts), np.nan)
+    for i, (text, report_labs) in enumerate(zip(texts, labs)):
+        if report_labs is None:
+            weight_rec = first_measurement(text, "weight")
+        else:
+            weight_rec = ReportContext(text, report_labs).lab("weight")
+        if weight_rec and weight_rec.value:
+            weights[i] = weight_rec.value
+            water[i] = _estimate_water_ml_per_day(weight_rec.value)
+
+    rules = RULES.agent("analyze_hydration")
+    result = rules.evaluate_batch(texts, hits, facts={"lab:weight": ~np.isnan(water)})
+    batch = ResultBatch.from_masks(
+        rules.catalogue(LAYOUT, params=PARAMS), result.flag_masks, result.rec_masks["recommendations"],
+        params={"weight": weights, "water_ml": water, "cups": np.floor(water / 250)},
+    )
+    return batch if compact else batch.expand()
 
 # convenience alias
 def analyze(report_data: Dict[str, Any]) -> Dict[str, Any]:
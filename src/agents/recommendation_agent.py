@@ -1,22 +1,31 @@
 """
 Recommendation Agent:
 Takes parsed report data and generates basic recommendations.
+The rules are the "generate_recommendations" entry of rules.json.
 """
 
-def generate_recommendations(report_data):
-    text = report_data.get("raw_text", "").lower()
-    recs = []
+from ..utils.catalogue import ResultBatch
+from ..utils.report_context import get_context
+from ..utils.rules import default_rules
+
+RULES = default_rules()
 
-    # simple rule-based recommendations
-    if "cholesterol" in text:
-        recs.append("Reduce oily and fried foods. Increase fiber intake.")
-    if "sugar" in text or "glucose" in text:
-        recs.append("Monitor sugar levels and reduce sweets.")
-    if "blood pressure" in text or "bp" in text:
-        recs.append("Reduce salt intake and check BP regularly.")
-    if "hemoglobin" in text:
-        recs.append("Increase iron-rich foods like spinach and broccoli.")
-    if len(recs) == 0:
-        recs.append("No specific issues detected. Maintain a healthy lifestyle.")
+LAYOUT = (("recommendations", "recommendations"),)
+# compile now (streamed reports need the keywords registered up front) and register the catalogue
+RULES.agent("generate_recommendations").catalogue(LAYOUT)
+
+def generate_recommendations(report_data):
+    rules = RULES.agent("generate_recommendations")
+    result = rules.evaluate(get_context(report_data))
+    return rules.catalogue(LAYOUT).expand(result.flags, result.score, result.codes["recommendations"])
 
-    return {"recommendations": recs}
\ No newline at end of file
+def generate_recommendations_batch(texts, hits=None, compact=False):
+    """
+    generate_recommendations for many report texts at once (list or pandas Series).
+    Returns one result per text, identical to the per-report function, or a ResultBatch with compact=True.
+    """
+    rules = RULES.agent("generate_recommendations")
+    result = rules.evaluate_batch(texts, hits)
+    batch = ResultBatch.from_masks(rules.catalogue(LAYOUT), result.flag_masks, result.rec_masks["recommendations"],
+                                   rows=len(texts))
+    return batch if compact else batch.expand()
@@ -0,0 +1,134 @@
+"""
+Agent registry
+- Maps agent names to (module, candidate function names) and resolves each one lazily,
+  importing the module on first use only and caching the result (including "not found").
+- Built-in agents are registered explicitly; third-party agents can be added through the
+  "personal_health_guardian.agents" entry point group, which is only scanned when a name
+  is not registered explicitly (scanning installed packages is itself slow).
+- Records how long each resolution took so startup cost is visible.
+"""
+
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+ENTRY_POINT_GROUP = "personal_health_guardian.agents"
+
+_MISSING = object()
+
+class AgentRegistry(Mapping):
+    def __init__(self):
+        self._specs: Dict[str, Any] = {}
+        self._resolved: Dict[str, Optional[Callable[..., Any]]] = {}
+        self._timings: Dict[str, float] = {}
+        self._groups: List[str] = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, module: str, candidates: List[str]):
+        """Register an agent found as the first callable of candidates in module (imported lazily)."""
+        with self._lock:
+            self._specs[name] = (module, list(candidates))
+            self._resolved.pop(name, None)
+
+    def register_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        """Consult entry point group for names not registered explicitly (scanned on first miss)."""
+        with self._lock:
+            self._groups.append(group)
+
+    def _scan_entry_points(self):
+        with self._lock:
+            groups, self._groups = self._groups, []
+        for group in groups:
+            started = time.perf_counter()
+            for ep in entry_points(group=group):
+                with self._lock:
+                    self._specs.setdefault(ep.name, ep)
+            self._timings[f"entry_points:{group}"] = time.perf_counter() - started
+
+    def _resolve(self, spec: Any) -> Optional[Callable[..., Any]]:
+        if isinstance(spec, tuple):
+            module_name, candidates = spec
+            try:
+                mod = importlib.import_module(module_name)
+            except Exception:
+                return None
+            for candidate in candidates:
+                fn = getattr(mod, candidate, None)
+                if callable(fn):
+                    return fn
+            return None
+        try:
+            fn = spec.load()
+        except Exception:
+            return None
+        return fn if callable(fn) else None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        fn = self._resolved.get(name, _MISSING)
+        if fn is not _MISSING:
+            return fn if fn is not None else default
+        if name not in self._specs and self._groups:
+            self._scan_entry_points()
+        with self._lock:
+            if name not in self._resolved:
+                spec = self._specs.get(name)
+                if spec is None:
+                    return default
+                started = time.perf_counter()
+                self._resolved[name] = self._resolve(spec)
+                self._timings[name] = time.perf_counter() - started
+            fn = self._resolved[name]
+        return fn if fn is not None else default
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self:
+            raise KeyError(name)
+        return self.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        # membership must not import anything
+        if name not in self._specs and self._groups:
+            self._scan_entry_points()
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        if self._groups:
+            self._scan_entry_points()
+        return iter(list(self._specs))
+
+    def __len__(self) -> int:
+        if self._groups:
+            self._scan_entry_points()
+        return len(self._specs)
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds spent resolving each agent resolved so far (import + lookup)."""
+        return dict(self._timings)
+
+def _builtin_registry() -> AgentRegistry:
+    registry = AgentRegistry()
+    registry.register("parse_report", "src.agents.report_agent", ["parse_report", "report_agent", "parse"])
+    registry.register("generate_summary", "src.agents.summary_agent", ["generate_summary", "make_summary", "summarize", "generate_summary_from_report"])
+    registry.register("generate_recommendations", "src.agents.recommendation_agent", ["generate_recommendations", "recommendations", "generate_recs"])
+    registry.register("analyze_trends", "src.agents.trend_agent", ["analyze_trends", "analyze_trend", "trend_analysis", "detect_trends"])
+    registry.register("analyze_diet", "src.agents.diet_agent", ["analyze_diet", "diet_analysis", "analyze_diet_report", "diet_agent"])
+    registry.register("analyze_sleep", "src.agents.sleep_agent", ["analyze_sleep", "sleep_analysis", "sleep_agent"])
+    registry.register("analyze_stress", "src.agents.stress_agent", ["analyze_stress", "stress_analysis", "stress_agent"])
+    registry.register("analyze_hydration", "src.agents.hydration_agent", ["analyze_hydration", "hydration_analysis", "hydration_agent"])
+    registry.register_entry_points()
+    return registry
+
+_default: Optional[AgentRegistry] = None
+_default_lock = threading.Lock()
+
+def default_registry() -> AgentRegistry:
+    """Process-wide registry of built-in and entry-point agents, created once."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = _builtin_registry()
+    return _default
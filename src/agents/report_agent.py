@@ -1,6 +1,29 @@
-from ..utils.pdf_utils import extract_text_from_pdf
+from ..utils.lab_values import extract_lab_values_from_pages
+from ..utils.pdf_utils import extract_pages_with_ocr_timings, iter_pages
+from ..utils.report_context import ParsedReport, ReportContext, register_keywords
+from ..utils.rules import default_rules
 
-def parse_report(path):
-    txt = extract_text_from_pdf(path)
-    # placeholder parsing - later replace with real extraction
-    return {"raw_text": txt}
\ No newline at end of file
+def _register_agent_keywords():
+    # a streamed report only answers for keywords registered before it is streamed, and the
+    # agent modules that register theirs are imported lazily, so register them all up front
+    from .trend_agent import KEYWORDS as trend_keywords
+    register_keywords(*default_rules().table().keywords(), *trend_keywords)
+
+def parse_report(path, keep_text=True, workers=1, ocr="auto", layout=False, cache=True):
+    """
+    path is a PDF file path or the PDF's bytes (e.g. an upload held in memory).
+    layout=True rebuilds pages from word boxes so lab table rows keep label, result, unit and range together.
+    cache=False keeps the extracted text and OCR results out of the on-disk cache.
+    """
+    if not keep_text:
+        # stream page by page; only keyword hits, lab values and the report head are kept
+        _register_agent_keywords()
+        ctx = ReportContext.from_pages(iter_pages(path, ocr=ocr, layout=layout, cache=cache), layout=layout)
+        return ParsedReport.from_context(ctx, page_count=ctx.page_count, labs=ctx.labs)
+
+    pages, ocr_timings = extract_pages_with_ocr_timings(path, cache=cache, workers=workers, ocr=ocr, layout=layout)
+    report = ParsedReport(raw_text="".join(pages), labs=extract_lab_values_from_pages(pages, layout),
+                          page_count=len(pages))
+    if ocr_timings:
+        report["ocr_pages"] = ocr_timings
+    return report
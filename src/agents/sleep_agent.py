@@ -1,42 +1,33 @@
 """
 Sleep Analysis Agent:
 Detects sleep-related indicators in report text and recommends improvements.
+Flags, score deductions and recommendations are the "analyze_sleep" rules in rules.json.
 """
 
-def analyze_sleep(report_data):
-    text = report_data.get("raw_text", "").lower()
-
-    flags = []
-    recommendations = []
-    
-    # Keyword detection (simple NLP)
-    if "tired" in text or "fatigue" in text or "exhaustion" in text:
-        flags.append("fatigue")
-        recommendations.append("Ensure 7–9 hours of consistent sleep; avoid screens 1 hour before bed.")
-
-    if "insomnia" in text or "sleep" in text and "poor" in text:
-        flags.append("possible insomnia")
-        recommendations.append("Maintain fixed sleep schedule and avoid caffeine after 5 PM.")
+from ..utils.catalogue import ResultBatch
+from ..utils.report_context import get_context
+from ..utils.rules import default_rules
 
-    if "iron" in text or "hemoglobin" in text:
-        recommendations.append("Low iron can affect sleep; consider iron-rich foods if suggested by doctor.")
+RULES = default_rules()
 
-    if "thyroid" in text:
-        recommendations.append("Thyroid imbalance may disrupt sleep; follow prescribed treatment.")
+LAYOUT = (("sleep_flags", "flags"), ("sleep_score", "score"), ("sleep_recommendations", "recommendations"))
+# compile now (streamed reports need the keywords registered up front) and register the catalogue
+RULES.agent("analyze_sleep").catalogue(LAYOUT)
 
-    # General recommendations (added only if no specific flags)
-    if not recommendations:
-        recommendations.append("Maintain consistent sleep schedule and good sleep hygiene practices.")
-
-    # Simple sleep score (mock)
-    score = 100
-    if "fatigue" in flags:
-        score -= 20
-    if "possible insomnia" in flags:
-        score -= 30
-
-    return {
-        "sleep_flags": flags,
-        "sleep_score": score,
-        "sleep_recommendations": recommendations,
-    }
\ No newline at end of file
+def analyze_sleep(report_data):
+    rules = RULES.agent("analyze_sleep")
+    result = rules.evaluate(get_context(report_data))
+    return rules.catalogue(LAYOUT).expand(result.flags, result.score, result.codes["recommendations"])
+
+def analyze_sleep_batch(texts, hits=None, compact=False):
+    """
+    analyze_sleep for many report texts at once (list or pandas Series).
+    hits may be a precomputed keyword_hits frame covering the rules' keywords (see RuleSet.keyword_hits).
+    Returns one result per text, identical to analyze_sleep({"raw_text": text}),
+    or with compact=True the same results as a ResultBatch.
+    """
+    rules = RULES.agent("analyze_sleep")
+    result = rules.evaluate_batch(texts, hits)
+    batch = ResultBatch.from_masks(rules.catalogue(LAYOUT), result.flag_masks, result.rec_masks["recommendations"],
+                                   scores=result.scores)
+    return batch if compact else batch.expand()
@@ -1,58 +1,31 @@
 """
 Stress / Mental Health Agent
 Detects mental health indicators from report text and provides suggestions.
+Flags, score deductions and recommendations are the "analyze_stress" rules in rules.json.
 """
 
-def analyze_stress(report_data):
-    text = report_data.get("raw_text", "").lower()
-
-    flags = []
-    recommendations = []
-
-    # Keyword-based stress detection
-    if "stress" in text or "anxiety" in text or "anxious" in text:
-        flags.append("stress/anxiety detected")
-        recommendations.append("Practice deep breathing or meditation for 10–15 minutes daily.")
-
-    if "depression" in text or "low mood" in text or "sad" in text:
-        flags.append("low mood indicators")
-        recommendations.append("Maintain routine, stay socially connected, and consider counseling if symptoms persist.")
-
-    if "fatigue" in text or "tired" in text:
-        flags.append("fatigue")
-        recommendations.append("Balance work and rest; avoid overexertion.")
+from ..utils.catalogue import ResultBatch
+from ..utils.report_context import get_context
+from ..utils.rules import default_rules
 
-    if "panic" in text:
-        flags.append("panic indicators")
-        recommendations.append("Practice grounding techniques; consult healthcare if episodes repeat.")
+RULES = default_rules()
 
-    if "sleep" in text and ("poor" in text or "lack" in text):
-        flags.append("sleep-related stress")
-        recommendations.append("Maintain sleep hygiene: fixed sleep times, no caffeine late evening.")
+LAYOUT = (("stress_flags", "flags"), ("stress_score", "score"), ("stress_recommendations", "recommendations"))
+# compile now (streamed reports need the keywords registered up front) and register the catalogue
+RULES.agent("analyze_stress").catalogue(LAYOUT)
 
-    # General baseline recommendation
-    if not recommendations:
-        recommendations.append("Maintain a balanced schedule, practice mindfulness, and stay physically active.")
-
-    # Stress score (mock scoring)
-    score = 100
-    if "stress/anxiety detected" in flags:
-        score -= 25
-    if "low mood indicators" in flags:
-        score -= 25
-    if "panic indicators" in flags:
-        score -= 30
-    if "sleep-related stress" in flags:
-        score -= 10
-    if "fatigue" in flags:
-        score -= 5
-
-    # Clip score to 0–100 range
-    if score < 0:
-        score = 0
-
-    return {
-        "stress_flags": flags,
-        "stress_score": score,
-        "stress_recommendations": recommendations,
-    }
\ No newline at end of file
+def analyze_stress(report_data):
+    rules = RULES.agent("analyze_stress")
+    result = rules.evaluate(get_context(report_data))
+    return rules.catalogue(LAYOUT).expand(result.flags, result.score, result.codes["recommendations"])
+
+def analyze_stress_batch(texts, hits=None, compact=False):
+    """
+    analyze_stress for many report texts at once (list or pandas Series).
+    Returns one result per text, identical to the per-report function, or a ResultBatch with compact=True.
+    """
+    rules = RULES.agent("analyze_stress")
+    result = rules.evaluate_batch(texts, hits)
+    batch = ResultBatch.from_masks(rules.catalogue(LAYOUT), result.flag_masks, result.rec_masks["recommendations"],
+                                   scores=result.scores)
+    return batch if compact else batch.expand()
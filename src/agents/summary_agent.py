@@ -1,18 +1,36 @@
 """
 Summary Agent:
 Creates a short summary from raw extracted text.
+- "first" mode (default): the opening sentence(s), found without splitting the whole report.
+- "textrank" mode: the highest-ranked sentences, kept in document order.
 """
 
-def generate_summary(report_data):
-    text = report_data.get("raw_text", "").strip()
+from itertools import islice
+
+from ..utils.report_context import get_context
+from ..utils.sentences import iter_sentences, summarize
+
+SUMMARY_MODES = ("first", "textrank")
+DEFAULT_SENTENCES = {"first": 1, "textrank": 3}
+
+def generate_summary(report_data, mode="first", sentences=None):
+    # streamed reports carry no raw_text, only the head of the document
+    text = (report_data.get("raw_text", "") or get_context(report_data).head).strip()
 
     if not text:
         return {"summary": "No information found in the report."}
 
-    # Simple summary logic (demo)
-    sentences = text.split(".")
-    first_sentence = sentences[0].strip()
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"unknown summary mode {mode!r} (expected one of {', '.join(SUMMARY_MODES)})")
+    count = sentences or DEFAULT_SENTENCES[mode]
+    if mode == "first":
+        picked = list(islice(iter_sentences(text), count))
+    else:
+        picked = summarize(text, count)
 
-    summary = f"Summary: {first_sentence}."
+    # sentences may span wrapped lines of the PDF
+    summary = " ".join(" ".join(s.split()) for s in picked)
+    if not summary.endswith((".", "!", "?")):
+        summary += "."
 
-    return {"summary": summary}
\ No newline at end of file
+    return {"summary": f"Summary: {summary}"}
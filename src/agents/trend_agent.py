@@ -1,21 +1,63 @@
 """
 Trend Agent:
 Extracts basic trends from report text (demo version).
+When a patient's metric history is supplied, also reports real trends across their reports.
 """
 
-def analyze_trends(report_data):
-    text = report_data.get("raw_text", "").lower()
+from ..utils.lab_values import canonical_unit, display_name
+from ..utils.report_context import get_context, register_keywords
+
+KEYWORDS = ("increase", "decrease", "stable")
+register_keywords(*KEYWORDS)
+
+# percent change below which a series is reported as stable
+STABLE_PCT = 5.0
+
+def _signed(value: float, digits: int) -> str:
+    # values that round to zero print as +0.0, not -0.0
+    value = round(float(value), digits)
+    return f"{value + 0.0:+.{digits}f}"
+
+def _history_trends(history, patient_id):
+    found = history.trends(patient_id=patient_id)
+    lines = []
+    for i, metric in enumerate(found["metric"]):
+        pct = found["pct_change"][i]
+        if pct != pct:  # NaN: first value was 0
+            continue
+        if abs(pct) < STABLE_PCT:
+            direction = "is stable"
+        elif pct > 0:
+            direction = "has increased"
+        else:
+            direction = "has decreased"
+        unit = canonical_unit(metric)
+        slope = _signed(found["slope_per_year"][i], 2)
+        lines.append(
+            f"{display_name(metric)} {direction}: {found['first'][i]:g} -> {found['last'][i]:g} {unit} "
+            f"({_signed(pct, 1)}% over {found['n'][i]} reports, {slope} {unit}/year)."
+        )
+    return lines
+
+def analyze_trends(report_data, history=None):
+    ctx = get_context(report_data)
 
     trends = []
 
     # Simple keyword-based trend extraction
-    if "increase" in text:
+    if ctx.has("increase"):
         trends.append("There are indicators of increasing values in your report.")
-    if "decrease" in text:
+    if ctx.has("decrease"):
         trends.append("Some values show decreasing trends.")
-    if "stable" in text:
+    if ctx.has("stable"):
         trends.append("Your report suggests stable readings.")
+
+    # Longitudinal trends from the patient's earlier reports (MetricStore)
+    patient_id = report_data.get("patient_id")
+    if history is not None and patient_id is not None:
+        trends.extend(_history_trends(history, patient_id))
+
     if len(trends) == 0:
         trends.append("No clear trends detected from the report.")
 
-    return {"trends": trends}
\ No newline at end of file
+    return {"trends": trends}
@@ -3,13 +3,23 @@ Main entrypoint for Personal Health Guardian
 Usage:
   python -m src.main --report sample_reports/sample1.pdf
   python -m src.main --interactive
+  python -m src.main --batch reports/ --output results.jsonl
+  python -m src.main --batch reports/ --output /dev/null --results results.parquet
+  python -m src.main --report r.pdf --patient P123 --history history.npz
+  python -m src.main --serve --port 8000
 """
 import argparse
 import importlib
 import os
 import sys
+import time
 from typing import Any, Callable, Dict
 
+from src.agents.registry import default_registry
+from src.utils.agent_cache import agent_code_hash, memoize_agent
+from src.utils.instrumentation import default_metrics, measure
+from src.utils.pipeline import Pipeline, Stage
+
 # Helper to attempt import and find a function under likely names
 def load_callable(module_name: str, candidates: list[str]) -> Callable[..., Any] | None:
     try:
@@ -26,26 +36,18 @@ def safe_call(fn: Callable[..., Any] | None, *args, **kwargs) -> Any:
     if fn is None:
         return None
     try:
-        return fn(*args, **kwargs)
+        result, record = measure(fn, *args, **kwargs)
     except Exception as e:
-        return {"_error": f"{e}"}
+        result, record = {"_error": f"{e}"}, {"error": True}
+    default_metrics().observe(getattr(fn, "__name__", "agent"), record)
+    return result
 
 def build_agents():
     """
-    Try to load each agent function with common candidate names.
-    Returns dict name -> callable or None
+    Agents by name from the shared registry: name -> callable or None.
+    Each agent module is imported on first access only and resolved once per process.
     """
-    agents = {}
-
-    agents["parse_report"] = load_callable("src.agents.report_agent", ["parse_report", "report_agent", "parse"])
-    agents["generate_summary"] = load_callable("src.agents.summary_agent", ["generate_summary", "make_summary", "summarize", "generate_summary_from_report"])
-    agents["generate_recommendations"] = load_callable("src.agents.recommendation_agent", ["generate_recommendations", "recommendations", "generate_recs"])
-    agents["analyze_trends"] = load_callable("src.agents.trend_agent", ["analyze_trends", "analyze_trend", "trend_analysis", "detect_trends"])
-    agents["analyze_diet"] = load_callable("src.agents.diet_agent", ["analyze_diet", "diet_analysis", "analyze_diet_report", "diet_agent"])
-    agents["analyze_sleep"] = load_callable("src.agents.sleep_agent", ["analyze_sleep", "sleep_analysis", "sleep_agent"])
-    agents["analyze_stress"] = load_callable("src.agents.stress_agent", ["analyze_stress", "stress_analysis", "stress_agent"])
-    agents["analyze_hydration"] = load_callable("src.agents.hydration_agent", ["analyze_hydration", "hydration_analysis", "hydration_agent"])
-    return agents
+    return default_registry()
 
 def pretty_print_section(title: str, data: Any):
     print()
@@ -62,51 +64,164 @@ def pretty_print_section(title: str, data: Any):
     # Otherwise, just print repr
     print(data)
 
-def run_all(report_path: str | None, interactive: bool = False):
-    agents = build_agents()
+# (agent name, result key, section title) in the order sections are reported
+SECTIONS = [
+    ("generate_summary", "summary", "Summary:"),
+    ("generate_recommendations", "recommendations", "Recommendations:"),
+    ("analyze_trends", "trends", "Trend Analysis:"),
+    ("analyze_diet", "diet", "Diet Analysis:"),
+    ("analyze_sleep", "sleep", "Sleep Analysis:"),
+    ("analyze_stress", "stress", "Stress / Mental Health Analysis:"),
+    ("analyze_hydration", "hydration", "Hydration Analysis:"),
+]
+
+# agents that read the report's text itself rather than keyword hits and lab values; a near
+# duplicate's results are not reused for them (the summary quotes the patient's own header)
+RAW_TEXT_AGENTS = {"generate_summary"}
 
+def resolve_report_path(report_path: str | None) -> str | None:
     if report_path is None:
         # default sample if exists
         candidate = os.path.join("sample_reports", "sample1.pdf")
         if os.path.exists(candidate):
-            report_path = candidate
-        else:
-            report_path = None
+            return candidate
+    return report_path
 
-    # 1. Parse PDF -> data
-    parsed = safe_call(agents.get("parse_report"), report_path) if agents.get("parse_report") else None
-    pretty_print_section("Reading report:", {"report_path": report_path})
-    pretty_print_section("Extracted Data:", parsed)
+def _record_history(parsed: Any, history: Any, patient_id: str, report_date: str | None) -> Any:
+    if not isinstance(parsed, dict) or "_error" in parsed:
+        return None
+    parsed["patient_id"] = patient_id
+    history.append_report(patient_id, report_date, parsed.get("labs") or [])
+    return history
 
-    # 2. Summary
-    summary = safe_call(agents.get("generate_summary"), parsed) if agents.get("generate_summary") else None
-    pretty_print_section("Summary:", summary)
+def build_pipeline(agents: Dict[str, Any], parse_options: Dict[str, Any] | None = None,
+                   history: Any = None, patient_id: str | None = None, report_date: str | None = None,
+                   timeout: float | None = None, memoize: bool = True,
+                   agent_options: Dict[str, Dict[str, Any]] | None = None) -> Pipeline:
+    """
+    Stage graph: report_path -> parse_report -> every SECTIONS agent, concurrently.
+    With a MetricStore history and a patient_id, a history stage appends the report's
+    lab values first and the trend agent also receives the history.
+    With memoize, agents that only read the parsed report are served from the agent cache.
+    agent_options maps an agent name to keyword arguments for it (e.g. the summary mode).
+    """
+    agent_options = agent_options or {}
+    stages = [Stage("parse_report", agents.get("parse_report"), ["report_path"], timeout, parse_options)]
+    trend_inputs = ["parse_report"]
+    if history is not None and patient_id is not None:
+        stages.append(Stage("history", _record_history, ["parse_report"],
+                            kwargs={"history": history, "patient_id": patient_id, "report_date": report_date}))
+        trend_inputs.append("history")
+    for name, _, _ in SECTIONS:
+        inputs = trend_inputs if name == "analyze_trends" else ["parse_report"]
+        fn = agents.get(name)
+        if memoize and inputs == ["parse_report"]:
+            fn = memoize_agent(name, fn)
+        stages.append(Stage(name, fn, inputs, timeout, agent_options.get(name)))
+    return Pipeline(stages)
+
+def _fingerprint(dedup: Any, parsed: Any, agents: Dict[str, Any], agent_options: Dict[str, Any] | None):
+    # streamed or failed parses have no text to compare
+    if not isinstance(parsed, dict) or "_error" in parsed or not parsed.get("raw_text"):
+        return None
+    # results are only reusable for the same agent code and options
+    scope = {name: agent_code_hash(agents.get(name)) for name, _, _ in SECTIONS}
+    return dedup.fingerprint(parsed["raw_text"], parsed.get("labs"), scope=[scope, agent_options or {}])
+
+def analyze_report(report_path: str | None, agents: Dict[str, Any] | None = None,
+                   parse_options: Dict[str, Any] | None = None, history: Any = None,
+                   patient_id: str | None = None, report_date: str | None = None,
+                   timeout: float | None = None, instrument: bool = False,
+                   agent_options: Dict[str, Dict[str, Any]] | None = None, dedup: Any = None,
+                   memoize: bool = True) -> Dict[str, Any]:
+    """
+    Parse one report and run every downstream agent on it (agents run concurrently).
+    parse_options are passed to parse_report as keyword arguments; timeout applies per stage.
+    memoize=False bypasses the on-disk agent cache.
+    With a DedupIndex (and no history), agent results of an earlier exact or near-exact duplicate
+    are reused (for a near duplicate, RAW_TEXT_AGENTS still run on this report's text) and the
+    result carries "dedup": {"match", "similarity", "exact"}.
+    Returns dict with report_path, extracted data and one entry per SECTIONS key; with
+    instrument=True also "metrics": {"wall_s", "stages": {stage: wall/cpu/memory/error}}.
+    """
+    if agents is None:
+        agents = build_agents()
 
-    # 3. Recommendations
-    recs = safe_call(agents.get("generate_recommendations"), parsed) if agents.get("generate_recommendations") else None
-    pretty_print_section("Recommendations:", recs)
+    pipeline = build_pipeline(agents, parse_options, history, patient_id, report_date, timeout,
+                              memoize=memoize, agent_options=agent_options)
+    stats: Dict[str, Dict[str, Any]] = {}
+    started = time.perf_counter()
+    initial: Dict[str, Any] = {"report_path": report_path}
+    fingerprint = match = None
+    if dedup is not None and history is None:
+        # parse first; agents only run when no earlier duplicate can stand in for them
+        initial.update(Pipeline(pipeline.stages[:1], metrics=pipeline.metrics).run(initial, stats))
+        fingerprint = _fingerprint(dedup, initial["parse_report"], agents, agent_options)
+        match = dedup.lookup(fingerprint) if fingerprint is not None else None
 
-    # 4. Trends
-    trends = safe_call(agents.get("analyze_trends"), parsed) if agents.get("analyze_trends") else None
-    pretty_print_section("Trend Analysis:", trends)
+    if match is not None:
+        initial.update({name: match["result"].get(key) for name, key, _ in SECTIONS
+                        if match["exact"] or name not in RAW_TEXT_AGENTS})
+    # stages already present in initial are not run again
+    agent_stats: Dict[str, Dict[str, Any]] = {}
+    outputs = pipeline.run(initial, agent_stats)
+    stats.update(agent_stats)
 
-    # 5. Diet
-    diet = safe_call(agents.get("analyze_diet"), parsed) if agents.get("analyze_diet") else None
-    pretty_print_section("Diet Analysis:", diet)
+    result: Dict[str, Any] = {"report_path": report_path, "extracted": outputs["parse_report"]}
+    for name, key, _ in SECTIONS:
+        result[key] = outputs[name]
+    if match is not None:
+        result["dedup"] = {k: match[k] for k in ("match", "similarity", "exact")}
+    elif fingerprint is not None and not any(isinstance(result[key], dict) and "_error" in result[key]
+                                             for _, key, _ in SECTIONS):
+        label = report_path if isinstance(report_path, str) else None  # uploads arrive as bytes
+        dedup.add(fingerprint, {key: result[key] for _, key, _ in SECTIONS}, label=label)
+    if instrument:
+        result["metrics"] = {"wall_s": round(time.perf_counter() - started, 6), "stages": stats}
+    return result
 
-    # 6. Sleep
-    sleep = safe_call(agents.get("analyze_sleep"), parsed) if agents.get("analyze_sleep") else None
-    pretty_print_section("Sleep Analysis:", sleep)
+def run_all(report_path: str | None, interactive: bool = False, page_workers: int = 1,
+            history_path: str | None = None, patient_id: str | None = None, report_date: str | None = None,
+            timeout: float | None = None, metrics_path: str | None = None,
+            agent_options: Dict[str, Dict[str, Any]] | None = None, layout: bool = False,
+            store_path: str | None = None):
+    agents = build_agents()
+    report_path = resolve_report_path(report_path)
 
-    # 7. Stress
-    stress = safe_call(agents.get("analyze_stress"), parsed) if agents.get("analyze_stress") else None
-    pretty_print_section("Stress / Mental Health Analysis:", stress)
+    history = None
+    if history_path and patient_id:
+        from src.utils.metric_store import MetricStore
+        history = MetricStore.load(history_path) if MetricStore.exists(history_path) else MetricStore()
 
-    # 8. Hydration
-    hydration = safe_call(agents.get("analyze_hydration"), parsed) if agents.get("analyze_hydration") else None
-    pretty_print_section("Hydration Analysis:", hydration)
+    parse_options = {"workers": page_workers} if page_workers != 1 else {}
+    if layout:
+        parse_options["layout"] = True
+    result = analyze_report(report_path, agents, parse_options, history, patient_id, report_date, timeout,
+                            instrument=metrics_path is not None, agent_options=agent_options)
+    if history is not None:
+        history.save(history_path)
+    if store_path is not None:
+        from src.utils.report_store import ReportStore
+        with ReportStore(store_path) as store:
+            store.add(result)
+    pretty_print_section("Reading report:", {"report_path": report_path})
+    pretty_print_section("Extracted Data:", result["extracted"])
+    for _, key, title in SECTIONS:
+        pretty_print_section(title, result[key])
 
     print("\n=== End of Analysis ===\n")
+    if metrics_path is not None:
+        write_metrics({"report_path": report_path, **result["metrics"]}, metrics_path)
+
+def write_metrics(report: Dict[str, Any], path: str):
+    """Write an instrumentation report as JSON; path "-" means stderr."""
+    import json
+    text = json.dumps(report, indent=2)
+    if path == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
 
 def interactive_menu():
     print("Interactive mode — pick which parts to run")
@@ -149,13 +264,13 @@ def interactive_menu():
     # call individually
     parsed = None
     if "parse_report" in to_run:
-        parsed = safe_call(load_callable("src.agents.report_agent", ["parse_report", "parse"]), rp)
+        parsed = safe_call(agents.get("parse_report"), rp)
         pretty_print_section("Parsed", parsed)
 
     for name in to_run:
         if name == "parse_report":
             continue
-        fn = build_agents().get(name)
+        fn = agents.get(name)
         out = safe_call(fn, parsed) if fn else None
         pretty_print_section(name, out)
 
@@ -163,12 +278,137 @@ def main():
     parser = argparse.ArgumentParser(prog="Personal Health Guardian")
     parser.add_argument("--report", "-r", help="Path to PDF report", default=None)
     parser.add_argument("--interactive", "-i", action="store_true", help="Run interactive menu")
+    parser.add_argument("--batch", "-b", help="Directory or glob of PDF reports to analyse in parallel", default=None)
+    parser.add_argument("--output", "-o", help="Batch/queue mode: write JSON lines here instead of stdout", default=None)
+    parser.add_argument("--results", default=None,
+                        help="Batch mode: also write flattened results to a columnar file (Parquet) or directory (NPZ/CSV)")
+    parser.add_argument("--results-format", choices=["parquet", "npz", "csv"], default=None,
+                        help="Batch mode: format for --results (default: parquet when pyarrow is installed, else npz)")
+    parser.add_argument("--workers", "-w", type=int, help="Batch/serve/watch/queue mode: worker processes (default: CPU count)", default=None)
+    parser.add_argument("--serve", action="store_true", help="Run the HTTP analysis service")
+    parser.add_argument("--watch", default=None, metavar="INBOX",
+                        help="Watch a directory and analyse every PDF dropped into it (result: <name>.pdf.json)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Watch mode: seconds a file must stay unchanged before it is analysed")
+    parser.add_argument("--host", default="127.0.0.1", help="Serve mode: bind address")
+    parser.add_argument("--port", type=int, default=8000, help="Serve mode: port")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Serve mode: max queued/running reports before answering 429 (default: 4x workers); "
+                             "watch mode: max reports waiting for a worker (default: 2x workers)")
+    parser.add_argument("--max-upload-mb", type=float, default=64,
+                        help="Serve mode: largest accepted upload in megabytes (larger ones get 413)")
+    parser.add_argument("--serve-cache", action="store_true",
+                        help="Serve mode: keep uploads' extracted text, OCR and agent results in the on-disk "
+                             "cache (off by default, so nothing from an upload is written there)")
+    parser.add_argument("--page-workers", type=int, default=1,
+                        help="Split extraction of large PDFs across N processes (0 = all cores)")
+    parser.add_argument("--patient", help="Patient id for longitudinal trends (with --history)", default=None)
+    parser.add_argument("--history", help="Metric history file (.npz) to append to and analyse", default=None)
+    parser.add_argument("--report-date", help="Report date YYYY-MM-DD for --history (default: today)", default=None)
+    parser.add_argument("--layout", action="store_true",
+                        help="Rebuild pages from word positions so lab table rows (test, result, unit, "
+                             "reference range) are read together")
+    parser.add_argument("--summary-mode", choices=["first", "textrank"], default="first",
+                        help="Summary: opening sentence(s) or TextRank-selected sentences")
+    parser.add_argument("--summary-sentences", type=int, default=None,
+                        help="Summary length in sentences (default: 1 for first, 3 for textrank)")
+    parser.add_argument("--stage-timeout", type=float, default=None,
+                        help="Seconds each pipeline stage may run before its result becomes an error "
+                             "(a timed-out stage keeps its thread until it returns; see src/utils/pipeline.py)")
+    parser.add_argument("--metrics-json", default=None,
+                        help="Write per-stage wall/CPU time, memory and error counts as JSON here (- for stderr)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record peak memory per stage with tracemalloc (slows analysis down)")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="Batch/serve/watch mode: reuse agent results of earlier reports at least this "
+                             "similar (0-1, e.g. 0.9); enables the dedup index")
+    parser.add_argument("--dedup-index", default=None,
+                        help="Dedup index file (default: dedup.sqlite3 in the cache directory)")
+    parser.add_argument("--dedup-max", type=int, default=None,
+                        help="Dedup index: keep at most this many reports, evicting the least recently matched "
+                             "(default 100000; 0 = unbounded)")
+    parser.add_argument("--queue", default=None, metavar="QUEUE_DB",
+                        help="Work through a resumable SQLite work queue shared by several processes or hosts; "
+                             "with --batch the reports there are queued first (--output is appended to)")
+    parser.add_argument("--shard-size", type=int, default=50, help="Queue mode: reports per leased shard")
+    parser.add_argument("--lease", type=float, default=300.0,
+                        help="Queue mode: seconds without a heartbeat before a shard can be reclaimed")
+    parser.add_argument("--retry-failed", action="store_true", help="Queue mode: re-queue failed reports")
+    parser.add_argument("--store", default=None,
+                        help="Single report/batch/queue mode: also save results in this SQLite report store "
+                             "(full-text and column search with --search/--where/--flag)")
+    parser.add_argument("--search", default=None, metavar="QUERY",
+                        help="Print the reports in --store whose text matches this full-text query (FTS5 syntax)")
+    parser.add_argument("--where", default=None,
+                        help="Search: SQL condition on stored columns, e.g. \"stress_score < 50\"")
+    parser.add_argument("--flag", action="append", default=[],
+                        help="Search: only reports that raised this flag (repeatable)")
+    parser.add_argument("--limit", type=int, default=100, help="Search: max reports to print")
+    parser.add_argument("--startup-timing", action="store_true",
+                        help="Print how long resolving each agent took (to stderr)")
     args = parser.parse_args()
 
-    if args.interactive:
+    if args.trace_memory:
+        from src.utils.instrumentation import start_memory_tracing
+        start_memory_tracing()
+
+    agent_options = None
+    parse_options = {"layout": True} if args.layout else None
+    if args.summary_mode != "first" or args.summary_sentences:
+        agent_options = {"generate_summary": {"mode": args.summary_mode, "sentences": args.summary_sentences}}
+
+    dedup_path = None
+    if args.dedup_threshold is not None:
+        from src.utils.dedup import default_index_path
+        dedup_path = args.dedup_index or default_index_path()
+        if args.dedup_max is not None:
+            # read by every DedupIndex, including the ones worker processes open
+            os.environ["PHG_DEDUP_MAX"] = str(args.dedup_max)
+
+    searching = args.search is not None or args.where is not None or args.flag
+    if searching and not args.store:
+        parser.error("--search/--where/--flag need --store")
+
+    if searching:
+        import json
+        from src.utils.report_store import ReportStore
+        with ReportStore(args.store) as store:
+            for row in store.search(args.search, where=args.where, flags=args.flag, limit=args.limit):
+                print(json.dumps(row, ensure_ascii=False))
+    elif args.queue:
+        from src.tools.work_queue import run_queue
+        run_queue(args.queue, source=args.batch, output=args.output, workers=args.workers,
+                  shard_size=args.shard_size, lease_s=args.lease, retry_failed=args.retry_failed,
+                  parse_options=parse_options, agent_options=agent_options, dedup_path=dedup_path,
+                  dedup_threshold=args.dedup_threshold, store_path=args.store)
+    elif args.watch:
+        from src.tools.watch import watch
+        watch(args.watch, workers=args.workers, queue_size=args.queue_size, settle_s=args.settle,
+              parse_options=parse_options, agent_options=agent_options,
+              dedup_path=dedup_path, dedup_threshold=args.dedup_threshold)
+    elif args.serve:
+        from src.tools.service import serve
+        serve(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+              dedup_path=dedup_path, dedup_threshold=args.dedup_threshold,
+              max_upload_bytes=int(args.max_upload_mb * 1024 * 1024),
+              agent_options=agent_options, parse_options=parse_options, cache=args.serve_cache)
+    elif args.batch:
+        from src.tools.batch import run_batch
+        run_batch(args.batch, output=args.output, workers=args.workers, metrics_path=args.metrics_json,
+                  results_path=args.results, results_format=args.results_format, parse_options=parse_options, agent_options=agent_options,
+                  dedup_path=dedup_path, dedup_threshold=args.dedup_threshold, store_path=args.store)
+    elif args.interactive:
         interactive_menu()
     else:
-        run_all(args.report, interactive=False)
+        run_all(args.report, interactive=False, page_workers=args.page_workers,
+                history_path=args.history, patient_id=args.patient, report_date=args.report_date,
+                timeout=args.stage_timeout, metrics_path=args.metrics_json, agent_options=agent_options,
+                layout=args.layout, store_path=args.store)
+
+    if args.startup_timing:
+        import json
+        timings = {name: round(sec, 4) for name, sec in build_agents().timings().items()}
+        print(json.dumps({"agent_resolution_s": timings}, indent=2), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
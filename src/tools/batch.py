@@ -0,0 +1,163 @@
+"""
+Batch runner
+- Expands a directory or glob into PDF report paths.
+- Fans parsing and all agents out over a process pool (one report per task).
+- Streams one JSON line per report as each one finishes and prints throughput at the end.
+- Each line carries that report's per-stage timings; the batch-wide totals and the slowest
+  reports can be written as a JSON metrics report.
+- Results can also go to a columnar sink (Parquet, or NPZ/CSV chunks) for analytics.
+- Results can also be stored in a searchable SQLite report store (see ReportStore).
+- With a dedup index, reports that (nearly) duplicate an already analysed one reuse its
+  agent results; the exact/near hit rate is printed at the end.
+"""
+
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.main import SECTIONS, analyze_report, build_agents, write_metrics
+from src.utils.dedup import DedupIndex
+from src.utils.instrumentation import Metrics, memory_tracing_from_env
+from src.utils.report_store import ReportStore
+from src.utils.results_sink import ResultsWriter
+
+# Agents are resolved once per worker process, not once per report
+_worker_agents: Optional[Dict[str, Any]] = None
+_worker_agent_options: Optional[Dict[str, Dict[str, Any]]] = None
+_worker_parse_options: Optional[Dict[str, Any]] = None
+_worker_dedup: Optional[DedupIndex] = None
+
+def _init_worker(agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                 parse_options: Optional[Dict[str, Any]] = None):
+    global _worker_agents, _worker_agent_options, _worker_parse_options, _worker_dedup
+    memory_tracing_from_env()
+    _worker_agents = build_agents()
+    _worker_agent_options = agent_options
+    _worker_parse_options = parse_options
+    # every worker opens the same SQLite index, so duplicates are found across processes
+    _worker_dedup = DedupIndex(dedup_path, dedup_threshold) if dedup_path else None
+
+def _process_one(report_path: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = analyze_report(report_path, _worker_agents, _worker_parse_options, instrument=True,
+                                agent_options=_worker_agent_options, dedup=_worker_dedup)
+    except Exception as e:
+        # same shape as safe_call: failures never take the whole batch down
+        result = {"report_path": report_path, "_error": f"{e}"}
+    result["elapsed_s"] = round(time.perf_counter() - started, 4)
+    return result
+
+def collect_reports(source: str) -> List[str]:
+    """Return sorted PDF paths for a directory (searched recursively) or a glob pattern."""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, "**", "*")
+    else:
+        pattern = source
+    paths = glob.glob(pattern, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(".pdf") and os.path.isfile(p))
+
+def iter_results(paths: List[str], workers: Optional[int] = None,
+                 agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                 parse_options: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield one result dict per report in completion order."""
+    if not paths:
+        return
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    # small chunks keep all cores busy without holding many finished results back
+    chunksize = max(1, min(16, len(paths) // (workers * 8)))
+    with multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=(agent_options, dedup_path, dedup_threshold, parse_options)) as pool:
+        for result in pool.imap_unordered(_process_one, paths, chunksize=chunksize):
+            yield result
+
+def _has_error(result: Dict[str, Any]) -> bool:
+    if "_error" in result:
+        return True
+    return any(isinstance(v, dict) and "_error" in v for v in result.values())
+
+def run_batch(source: str, output: Optional[str] = None, workers: Optional[int] = None,
+              metrics_path: Optional[str] = None, slowest: int = 10, results_path: Optional[str] = None,
+              results_format: Optional[str] = None,
+              agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+              dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+              parse_options: Optional[Dict[str, Any]] = None, store_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analyse every report under source. JSON lines go to output (or stdout); with results_path
+    the flattened results are also written to a columnar sink (see ResultsWriter), with
+    store_path they are added to a SQLite report store (see ReportStore).
+    With dedup_path, duplicates of reports already in that index (this run or earlier ones)
+    reuse the stored agent results.
+    """
+    paths = collect_reports(source)
+    if not paths:
+        print(f"No PDF reports found for: {source}", file=sys.stderr)
+        return {"reports": 0, "errors": 0, "elapsed_s": 0.0, "reports_per_s": 0.0}
+
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    sink = None
+    if results_path:
+        sink = ResultsWriter(results_path, results_format, stages=["parse_report"] + [name for name, _, _ in SECTIONS])
+    store = ReportStore(store_path) if store_path else None
+    started = time.perf_counter()
+    done = 0
+    errors = 0
+    metrics = Metrics()
+    timings = []
+    exact_hits = near_hits = 0
+    try:
+        for result in iter_results(paths, workers, agent_options, dedup_path, dedup_threshold, parse_options):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            done += 1
+            if _has_error(result):
+                errors += 1
+            metrics.observe_all(result.get("metrics", {}).get("stages", {}))
+            timings.append((result["elapsed_s"], result.get("report_path")))
+            if "dedup" in result:
+                if result["dedup"]["exact"]:
+                    exact_hits += 1
+                else:
+                    near_hits += 1
+            if sink is not None:
+                sink.add(result)
+            if store is not None:
+                store.add(result)
+    finally:
+        if output:
+            out.close()
+        if sink is not None:
+            sink.close()
+        if store is not None:
+            store.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "reports": done,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "reports_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    print(
+        f"Processed {done} reports ({errors} with errors) in {stats['elapsed_s']}s "
+        f"- {stats['reports_per_s']} reports/s",
+        file=sys.stderr,
+    )
+    if dedup_path:
+        stats["dedup"] = {"exact_hits": exact_hits, "near_hits": near_hits,
+                          "hit_rate": round((exact_hits + near_hits) / done, 4) if done else 0.0}
+        print(f"Dedup: {exact_hits} exact and {near_hits} near duplicates of {done} reports "
+              f"({stats['dedup']['hit_rate']:.1%} skipped)", file=sys.stderr)
+    if metrics_path is not None:
+        timings.sort(key=lambda t: t[0], reverse=True)
+        write_metrics({
+            **stats,
+            **metrics.snapshot(),
+            "slowest_reports": [{"report_path": p, "elapsed_s": t} for t, p in timings[:slowest]],
+        }, metrics_path)
+    return stats
@@ -0,0 +1,260 @@
+"""
+Analysis service
+- Small Flask HTTP API in front of a bounded process pool that runs parse_report plus all agents.
+- POST /analyze takes a PDF (multipart field "file" or a raw application/pdf body).
+  Small files are answered synchronously; larger ones (or ?mode=async) get a job id to poll.
+- At most `queue_size` reports may be queued or running; beyond that the service answers 429
+  instead of letting latency grow without bound.
+- GET /metrics exposes per-stage wall/CPU time, memory and error counts plus queue gauges
+  in the Prometheus text format.
+- Uploads larger than max_upload_bytes are refused with 413 before they are read into memory.
+- A worker crash (e.g. an out-of-memory kill) breaks the process pool; the jobs it was running
+  fail and the pool is replaced, so later uploads are analysed again.
+- With a dedup index, uploads that duplicate an earlier report reuse its agent results;
+  hits are counted in /metrics (dedup_exact_hits, dedup_near_hits).
+- Like the UI, the service keeps uploads out of the on-disk text, OCR and agent caches by default;
+  cache=True (--serve-cache) opts in, so a re-uploaded report skips extraction and agents.
+
+Usage:
+  python -m src.main --serve --port 8000
+  curl -F file=@sample_reports/sample1.pdf http://localhost:8000/analyze
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+
+from src.main import analyze_report, build_agents
+from src.utils.dedup import DedupIndex
+from src.utils.instrumentation import Metrics, memory_tracing_from_env
+
+# uploads up to this size are answered in the same request by default
+SYNC_MAX_BYTES = 2 * 1024 * 1024
+# larger request bodies are refused (413)
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+# how long a synchronous request waits before handing back a job id instead
+SYNC_WAIT_S = 30.0
+# finished jobs kept for polling
+MAX_FINISHED_JOBS = 1000
+JOB_TTL_S = 3600
+
+_worker_dedup: Optional[DedupIndex] = None
+_worker_agent_options: Optional[Dict[str, Dict[str, Any]]] = None
+_worker_parse_options: Optional[Dict[str, Any]] = None
+_worker_cache = False
+
+def _init_worker(dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                 agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 parse_options: Optional[Dict[str, Any]] = None, cache: bool = False):
+    global _worker_dedup, _worker_agent_options, _worker_parse_options, _worker_cache
+    memory_tracing_from_env()
+    build_agents()
+    _worker_dedup = DedupIndex(dedup_path, dedup_threshold) if dedup_path else None
+    _worker_agent_options = agent_options
+    _worker_parse_options = dict(parse_options or {}, cache=cache)
+    _worker_cache = cache
+
+def _analyze_bytes(data: bytes, name: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = analyze_report(data, build_agents(), _worker_parse_options, instrument=True,
+                                agent_options=_worker_agent_options, dedup=_worker_dedup, memoize=_worker_cache)
+    except Exception as e:
+        result = {"_error": f"{e}"}
+    result["report_path"] = name
+    result["elapsed_s"] = round(time.perf_counter() - started, 4)
+    return result
+
+class JobQueue:
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                 agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 parse_options: Optional[Dict[str, Any]] = None, cache: bool = False):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 4
+        self._initargs = (dedup_path, dedup_threshold, agent_options, parse_options, cache)
+        self._pool = self._new_pool()
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = Metrics()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._initargs)
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        # a worker died (e.g. out of memory) and took the pool down; later reports get a fresh one
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.metrics.increment("pool_restarts")
+
+    def _submit(self, data: bytes, name: str):
+        """(pool, future) of a new analysis; a pool found broken at submit time is replaced first."""
+        pool = self._pool
+        try:
+            return pool, pool.submit(_analyze_bytes, data, name)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            pool = self._pool
+            return pool, pool.submit(_analyze_bytes, data, name)
+
+    def submit(self, data: bytes, name: str) -> Optional[str]:
+        """Queue a report; returns its job id, or None when the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            self.metrics.increment("reports_rejected")
+            return None
+        job_id = uuid.uuid4().hex
+        try:
+            pool, future = self._submit(data, name)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._jobs[job_id] = {"future": future, "name": name, "submitted": time.time(), "finished": None}
+        future.add_done_callback(lambda f: self._finish(job_id, f, pool))
+        return job_id
+
+    def _finish(self, job_id: str, future, pool: ProcessPoolExecutor):
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_pool(pool)
+        self._record(future)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["finished"] = time.time()
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        finished = [jid for jid, job in self._jobs.items() if job["finished"] is not None]
+        excess = len(finished) - MAX_FINISHED_JOBS
+        for jid in finished:
+            if excess > 0 or now - self._jobs[jid]["finished"] > JOB_TTL_S:
+                del self._jobs[jid]
+                excess -= 1
+
+    def _record(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.metrics.increment("reports_failed")
+            return
+        result = future.result()
+        self.metrics.increment("reports_analyzed")
+        self.metrics.increment("report_seconds", result.get("elapsed_s", 0.0))
+        if "dedup" in result:
+            self.metrics.increment("dedup_exact_hits" if result["dedup"]["exact"] else "dedup_near_hits")
+        self.metrics.observe_all(result.get("metrics", {}).get("stages", {}))
+
+    def wait(self, job_id: str, timeout: float) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        try:
+            job["future"].result(timeout=timeout)
+        except Exception:
+            pass
+        return job["future"].done()
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        out: Dict[str, Any] = {"job_id": job_id, "report": job["name"]}
+        if not future.done():
+            out["status"] = "running" if future.running() else "queued"
+        elif future.exception() is not None:
+            out["status"] = "failed"
+            out["error"] = f"{future.exception()}"
+        else:
+            out["status"] = "done"
+            out["result"] = future.result()
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["finished"] is None)
+        return {"workers": self.workers, "queue_size": self.queue_size, "pending": pending}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def create_app(workers: Optional[int] = None, queue_size: Optional[int] = None,
+               sync_max_bytes: int = SYNC_MAX_BYTES, dedup_path: Optional[str] = None,
+               dedup_threshold: Optional[float] = None, max_upload_bytes: int = MAX_UPLOAD_BYTES,
+               agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+               parse_options: Optional[Dict[str, Any]] = None, cache: bool = False) -> Flask:
+    app = Flask("personal_health_guardian")
+    # Flask refuses larger bodies (413) from the Content-Length header, before reading them
+    app.config["MAX_CONTENT_LENGTH"] = max_upload_bytes
+    jobs = JobQueue(workers, queue_size, dedup_path, dedup_threshold, agent_options, parse_options, cache)
+    app.config["JOBS"] = jobs
+
+    @app.errorhandler(413)
+    def too_large(_error):
+        return jsonify({"error": f"upload larger than {max_upload_bytes} bytes"}), 413
+
+    @app.post("/analyze")
+    def analyze():
+        upload = request.files.get("file")
+        if upload is not None:
+            data, name = upload.read(), upload.filename or "upload.pdf"
+        else:
+            data, name = request.get_data(), request.args.get("name", "upload.pdf")
+        if not data:
+            return jsonify({"error": "send a PDF as multipart field 'file' or as the request body"}), 400
+
+        job_id = jobs.submit(data, name)
+        if job_id is None:
+            response = jsonify({"error": "analysis queue is full, retry later", **jobs.stats()})
+            response.headers["Retry-After"] = "5"
+            return response, 429
+
+        mode = request.args.get("mode", "auto")
+        if mode == "sync" or (mode == "auto" and len(data) <= sync_max_bytes):
+            if jobs.wait(job_id, SYNC_WAIT_S):
+                return jsonify(jobs.status(job_id))
+        return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+    @app.get("/jobs/<job_id>")
+    def job_status(job_id):
+        status = jobs.status(job_id)
+        if status is None:
+            return jsonify({"error": "unknown or expired job id"}), 404
+        return jsonify(status)
+
+    @app.get("/metrics")
+    def metrics():
+        text = jobs.metrics.to_prometheus(gauges={f"queue_{k}": v for k, v in jobs.stats().items()})
+        return Response(text, mimetype="text/plain; version=0.0.4")
+
+    @app.get("/health")
+    def health():
+        return jsonify({"status": "ok", **jobs.stats()})
+
+    return app
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: Optional[int] = None,
+          queue_size: Optional[int] = None, dedup_path: Optional[str] = None,
+          dedup_threshold: Optional[float] = None, max_upload_bytes: int = MAX_UPLOAD_BYTES,
+          agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+          parse_options: Optional[Dict[str, Any]] = None, cache: bool = False):
+    app = create_app(workers, queue_size, dedup_path=dedup_path, dedup_threshold=dedup_threshold,
+                     max_upload_bytes=max_upload_bytes, agent_options=agent_options, parse_options=parse_options,
+                     cache=cache)
+    try:
+        # threaded so polling and 429 answers are never stuck behind a synchronous request
+        app.run(host=host, port=port, threaded=True)
+    finally:
+        app.config["JOBS"].shutdown()
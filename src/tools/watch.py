@@ -0,0 +1,259 @@
+"""
+Hot-folder daemon
+- Watches an inbox directory (watchdog) and analyses every PDF dropped into it; the result
+  is written next to the input as <name>.pdf.json, atomically (temp file + rename), so
+  readers never see a half-written result.
+- A file is only picked up once it stopped changing for settle_s seconds and ends with the
+  PDF %%EOF marker, so copies and uploads still in progress are not parsed half-written.
+- Backpressure: ready files go onto a bounded asyncio queue consumed by one task per worker
+  process, so at most `workers` reports are analysed and `queue_size` are queued at any time.
+  A burst of dropped files only ever costs one pending path per file; everything else waits
+  on the filesystem.
+- The inbox is rescanned at startup and every rescan_s seconds, which picks up files whose
+  events were lost (e.g. inotify overflow) and reports dropped while the daemon was down.
+  PDFs that already have an up-to-date result are skipped.
+
+Usage:
+  python -m src.main --watch inbox/ --workers 4
+"""
+
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Set, Tuple
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from src.tools.batch import _has_error, _init_worker, _process_one
+
+RESULT_SUFFIX = ".json"
+SETTLE_S = 2.0
+RESCAN_S = 60.0
+# a file that never gets its %%EOF marker is processed anyway after this many settle periods
+MAX_SETTLE_ROUNDS = 15
+
+def result_path(pdf_path: str) -> str:
+    return pdf_path + RESULT_SUFFIX
+
+def _is_report(path: str) -> bool:
+    name = os.path.basename(path)
+    # editors and uploaders write dot-files first and rename them when done
+    return name.lower().endswith(".pdf") and not name.startswith(".")
+
+def _is_done(pdf_path: str) -> bool:
+    try:
+        return os.stat(result_path(pdf_path)).st_mtime >= os.stat(pdf_path).st_mtime
+    except OSError:
+        return False
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def _has_eof_marker(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - 1024))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+def write_atomic(path: str, result: Dict[str, Any]):
+    """Write result as JSON to path via a temp file in the same directory and a rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+class _InboxHandler(FileSystemEventHandler):
+    """Forwards watchdog events (observer thread) to the daemon's event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, touch):
+        self._loop = loop
+        self._touch = touch
+
+    def _forward(self, path: str):
+        if _is_report(path):
+            self._loop.call_soon_threadsafe(self._touch, path)
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self._forward(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._forward(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._forward(event.dest_path)
+
+class HotFolder:
+    def __init__(self, inbox: str, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 settle_s: float = SETTLE_S, rescan_s: float = RESCAN_S,
+                 agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+                 parse_options: Optional[Dict[str, Any]] = None):
+        self.inbox = os.path.abspath(inbox)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 2
+        self.settle_s = settle_s
+        self.rescan_s = rescan_s
+        self.processed = 0
+        self.failed = 0
+        self._initargs = (agent_options, dedup_path, dedup_threshold, parse_options)
+        # path -> (last change seen, file signature, settle rounds); at most one entry per file
+        self._pending: Dict[str, Tuple[float, Optional[Tuple[int, int]], int]] = {}
+        self._queued: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self._initargs)
+
+    def _touch(self, path: str):
+        if path in self._queued:
+            return
+        rounds = self._pending[path][2] if path in self._pending else 0
+        self._pending[path] = (time.monotonic(), _signature(path), rounds)
+
+    def _rescan(self):
+        try:
+            entries = list(os.scandir(self.inbox))
+        except OSError as e:
+            print(f"Cannot scan {self.inbox}: {e}", file=sys.stderr)
+            return
+        for entry in entries:
+            path = entry.path
+            if (entry.is_file() and _is_report(path) and path not in self._pending
+                    and path not in self._queued and not _is_done(path)):
+                self._touch(path)
+
+    def _settled(self) -> list:
+        """Pending paths that are ready to be analysed; updates the others."""
+        now = time.monotonic()
+        ready = []
+        for path, (seen, signature, rounds) in list(self._pending.items()):
+            if now - seen < self.settle_s:
+                continue
+            current = _signature(path)
+            if current is None:  # deleted or renamed away
+                del self._pending[path]
+            elif current != signature:
+                self._pending[path] = (now, current, rounds)
+            elif _has_eof_marker(path) or rounds + 1 >= MAX_SETTLE_ROUNDS:
+                ready.append(path)
+            else:
+                self._pending[path] = (now, current, rounds + 1)
+        return ready
+
+    async def _feed(self):
+        """Move settled files onto the bounded queue; blocks while it is full."""
+        next_rescan = time.monotonic() + self.rescan_s
+        while True:
+            if time.monotonic() >= next_rescan:
+                self._rescan()
+                next_rescan = time.monotonic() + self.rescan_s
+            for path in self._settled():
+                if _is_done(path):
+                    del self._pending[path]
+                    continue
+                await self._queue.put(path)
+                del self._pending[path]
+                self._queued.add(path)
+            await asyncio.sleep(min(0.5, self.settle_s / 2))
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            path = await self._queue.get()
+            pool = self._pool
+            try:
+                try:
+                    result = await loop.run_in_executor(pool, _process_one, path)
+                except BrokenProcessPool:
+                    # a worker died (e.g. out of memory); later reports get a fresh pool
+                    if self._pool is pool:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        self._pool = self._new_pool()
+                    result = {"report_path": path, "_error": "worker process died"}
+                await asyncio.to_thread(write_atomic, result_path(path), result)
+                failed = _has_error(result)
+                self.processed += 1
+                self.failed += failed
+                print(f"{'Failed' if failed else 'Analysed'} {path} in {result.get('elapsed_s', 0.0)}s",
+                      file=sys.stderr)
+            except Exception as e:
+                self.failed += 1
+                print(f"Could not write result for {path}: {e}", file=sys.stderr)
+            finally:
+                self._queued.discard(path)
+                self._queue.task_done()
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        os.makedirs(self.inbox, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+        self._pool = self._new_pool()
+        observer = Observer()
+        observer.schedule(_InboxHandler(loop, self._touch), self.inbox, recursive=False)
+        observer.start()
+        self._rescan()
+        tasks = [asyncio.create_task(self._feed())]
+        tasks += [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        print(f"Watching {self.inbox} ({self.workers} workers, queue of {self.queue_size})", file=sys.stderr)
+        try:
+            await self._stopping.wait()
+        finally:
+            observer.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            await asyncio.to_thread(observer.join)
+            print(f"Stopped: {self.processed} reports analysed ({self.failed} failed)", file=sys.stderr)
+
+def watch(inbox: str, workers: Optional[int] = None, queue_size: Optional[int] = None,
+          settle_s: float = SETTLE_S, agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+          dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+          parse_options: Optional[Dict[str, Any]] = None):
+    """Run the hot-folder daemon until SIGINT/SIGTERM."""
+    folder = HotFolder(inbox, workers, queue_size, settle_s, agent_options=agent_options,
+                       dedup_path=dedup_path, dedup_threshold=dedup_threshold, parse_options=parse_options)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, folder.stop)
+            except (NotImplementedError, RuntimeError):  # e.g. Windows
+                pass
+        await folder.run()
+
+    asyncio.run(main())
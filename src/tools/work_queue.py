@@ -0,0 +1,377 @@
+"""
+Work queue
+- Resumable, multi-node batch runs: every report of a back-fill is recorded in a SQLite queue
+  file on a filesystem shared by all nodes, grouped into shards of shard_size reports. Any
+  number of processes on any number of hosts run the same command; each claims shards under a
+  lease, analyses their reports on its own process pool and checkpoints finished ones.
+- A heartbeat thread renews the node's leases every lease_s / 3 seconds. When a node crashes
+  or is killed its leases expire and its shards are reclaimed by the other nodes (or by a
+  re-run); only the reports that were not checkpointed yet are analysed again.
+- Enqueueing is idempotent, so re-running the same command adds only new files and resumes
+  where the last run stopped. Finished reports are never analysed twice by a healthy node.
+- A shard claimed MAX_ATTEMPTS times without finishing (e.g. a PDF that kills its worker) has
+  its remaining reports marked failed instead of being retried forever; retry_failed() puts
+  failed reports back in the queue.
+- The queue keeps SQLite's rollback journal: WAL needs shared memory, which network
+  filesystems do not provide. Lease times use the wall clock, so keep lease_s well above the
+  clock skew between hosts.
+
+Usage:
+  python -m src.main --queue backfill.sqlite3 --batch archive/ --output node1.jsonl
+  python -m src.main --queue backfill.sqlite3 --output node2.jsonl   # on another host
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from src.tools.batch import _has_error, _init_worker, _process_one, collect_reports
+from src.utils.report_store import ReportStore
+
+SHARD_SIZE = 50
+LEASE_S = 300.0
+MAX_ATTEMPTS = 3
+# finished reports are checkpointed at least this often, and whenever a shard completes
+CHECKPOINT_S = 10.0
+# how often an idle node looks for expired leases while other nodes still hold shards
+POLL_S = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS shards_state ON shards (state, id);
+CREATE TABLE IF NOT EXISTS items (
+    path TEXT PRIMARY KEY,
+    shard_id INTEGER,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    error TEXT,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS items_shard ON items (shard_id, state);
+"""
+
+class Lease(NamedTuple):
+    shard_id: int
+    paths: List[str]
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """
+    Usage:
+      queue = WorkQueue("backfill.sqlite3")
+      queue.enqueue(paths)
+      lease = queue.claim()
+      ... analyse lease.paths, calling queue.heartbeat([lease.shard_id]) meanwhile ...
+      queue.complete(lease.shard_id, [(path, None) for path in lease.paths])
+    One instance per thread (SQLite connections are not shared between threads).
+    """
+
+    def __init__(self, path: str, lease_s: float = LEASE_S, owner: Optional[str] = None):
+        self.path = path
+        self.lease_s = lease_s
+        self.owner = owner or default_owner()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so two nodes never claim the same shard
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, paths: Iterable[str], shard_size: int = SHARD_SIZE) -> int:
+        """Add reports not queued yet, in new shards of shard_size; returns how many were added."""
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO items (path) VALUES (?)", ((p,) for p in paths))
+            new = [row[0] for row in conn.execute("SELECT path FROM items WHERE shard_id IS NULL ORDER BY path")]
+            for start in range(0, len(new), shard_size):
+                shard_id = conn.execute("INSERT INTO shards DEFAULT VALUES").lastrowid
+                conn.executemany("UPDATE items SET shard_id = ? WHERE path = ?",
+                                 ((shard_id, p) for p in new[start:start + shard_size]))
+        return len(new)
+
+    def claim(self) -> Optional[Lease]:
+        """Lease the next pending shard, or one whose lease expired; None when there is none."""
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT id, attempts FROM shards WHERE state = 'pending' "
+                    "OR (state = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                shard_id, attempts = row
+                if attempts >= MAX_ATTEMPTS:
+                    conn.execute("UPDATE items SET state = 'failed', error = ?, finished_at = ? "
+                                 "WHERE shard_id = ? AND state = 'pending'",
+                                 (f"abandoned after {attempts} leases expired", now, shard_id))
+                    conn.execute("UPDATE shards SET state = 'done', owner = NULL WHERE id = ?", (shard_id,))
+                    continue
+                paths = [r[0] for r in conn.execute(
+                    "SELECT path FROM items WHERE shard_id = ? AND state = 'pending' ORDER BY path", (shard_id,))]
+                if not paths:  # its last checkpoint landed but the shard was not closed
+                    conn.execute("UPDATE shards SET state = 'done', owner = NULL WHERE id = ?", (shard_id,))
+                    continue
+                conn.execute("UPDATE shards SET state = 'leased', owner = ?, lease_expires = ?, "
+                             "attempts = attempts + 1 WHERE id = ?", (self.owner, now + self.lease_s, shard_id))
+                return Lease(shard_id, paths)
+
+    def heartbeat(self, shard_ids: Iterable[int]) -> List[int]:
+        """Renew this owner's leases; returns the shards whose lease was lost to another node."""
+        expires = time.time() + self.lease_s
+        lost = []
+        with self._transaction() as conn:
+            for shard_id in shard_ids:
+                cur = conn.execute("UPDATE shards SET lease_expires = ? WHERE id = ? AND owner = ? "
+                                   "AND state = 'leased'", (expires, shard_id, self.owner))
+                if cur.rowcount == 0:
+                    lost.append(shard_id)
+        return lost
+
+    def complete(self, shard_id: int, finished: List[Tuple[str, Optional[str]]]) -> bool:
+        """
+        Checkpoint finished reports of a shard as (path, error or None); returns True when
+        the shard has no pending reports left and was closed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET state = ?, error = ?, owner = ?, finished_at = ? WHERE path = ? AND state = 'pending'",
+                (("failed" if error else "done", error, self.owner, now, path) for path, error in finished))
+            cur = conn.execute(
+                "UPDATE shards SET state = 'done', owner = NULL WHERE id = ? AND state != 'done' AND NOT EXISTS "
+                "(SELECT 1 FROM items WHERE shard_id = ? AND state = 'pending')", (shard_id, shard_id))
+            return cur.rowcount > 0
+
+    def release(self, shard_ids: Iterable[int]):
+        """Hand leased shards back (e.g. on Ctrl-C) so other nodes can take them at once."""
+        with self._transaction() as conn:
+            conn.executemany("UPDATE shards SET state = 'pending', owner = NULL, lease_expires = NULL, "
+                             "attempts = MAX(attempts - 1, 0) WHERE id = ? AND owner = ? AND state = 'leased'",
+                             ((shard_id, self.owner) for shard_id in shard_ids))
+
+    def retry_failed(self) -> int:
+        """Put failed reports back in the queue; returns how many."""
+        with self._transaction() as conn:
+            count = conn.execute("UPDATE items SET state = 'pending', error = NULL, finished_at = NULL "
+                                 "WHERE state = 'failed'").rowcount
+            conn.execute("UPDATE shards SET state = 'pending', attempts = 0 WHERE state = 'done' AND id IN "
+                         "(SELECT shard_id FROM items WHERE state = 'pending')")
+        return count
+
+    def unfinished_shards(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM shards WHERE state != 'done'").fetchone()[0]
+
+    def progress(self) -> Dict[str, int]:
+        counts = {"pending": 0, "done": 0, "failed": 0}
+        counts.update(self._conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+        return counts
+
+    def close(self):
+        self._conn.close()
+
+class _Heartbeat(threading.Thread):
+    """Renews the leases of the shards a node holds until stopped."""
+
+    def __init__(self, queue_path: str, lease_s: float, owner: str):
+        super().__init__(daemon=True)
+        self._args = (queue_path, lease_s, owner)
+        self._held: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def hold(self, shard_id: int):
+        with self._lock:
+            self._held.add(shard_id)
+
+    def drop(self, shard_id: int):
+        with self._lock:
+            self._held.discard(shard_id)
+
+    def held(self) -> List[int]:
+        with self._lock:
+            return sorted(self._held)
+
+    def run(self):
+        queue = WorkQueue(*self._args)
+        try:
+            while not self._stopped.wait(queue.lease_s / 3):
+                held = self.held()
+                if not held:
+                    continue
+                try:
+                    lost = queue.heartbeat(held)
+                except sqlite3.Error as e:
+                    print(f"Heartbeat failed: {e}", file=sys.stderr)
+                    continue
+                for shard_id in lost:
+                    # the work is still finished and checkpointed; another node may repeat some of it
+                    print(f"Lease on shard {shard_id} expired and was taken over", file=sys.stderr)
+                    self.drop(shard_id)
+        finally:
+            queue.close()
+
+    def stop(self):
+        self._stopped.set()
+
+def _error_text(result: Dict[str, Any]) -> Optional[str]:
+    if not _has_error(result):
+        return None
+    if "_error" in result:
+        return str(result["_error"])
+    return next(f"{key}: {v['_error']}" for key, v in result.items() if isinstance(v, dict) and "_error" in v)
+
+def run_queue(queue_path: str, source: Optional[str] = None, output: Optional[str] = None,
+              workers: Optional[int] = None, shard_size: int = SHARD_SIZE, lease_s: float = LEASE_S,
+              retry_failed: bool = False, agent_options: Optional[Dict[str, Dict[str, Any]]] = None,
+              dedup_path: Optional[str] = None, dedup_threshold: Optional[float] = None,
+              parse_options: Optional[Dict[str, Any]] = None, store_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Enqueue the reports under source (if given) and work the queue until no shard is left.
+    JSON lines are appended to output (or written to stdout) and are flushed, like store_path
+    results, before the reports are checkpointed as done.
+    """
+    queue = WorkQueue(queue_path, lease_s)
+    if source:
+        added = queue.enqueue([os.path.abspath(p) for p in collect_reports(source)], shard_size)
+        print(f"Queued {added} new reports from {source}", file=sys.stderr)
+    if retry_failed:
+        print(f"Re-queued {queue.retry_failed()} failed reports", file=sys.stderr)
+
+    workers = workers or os.cpu_count() or 1
+    initargs = (agent_options, dedup_path, dedup_threshold, parse_options)
+    out = open(output, "a", encoding="utf-8") if output else sys.stdout
+    store = ReportStore(store_path) if store_path else None
+    heartbeat = _Heartbeat(queue_path, lease_s, queue.owner)
+    heartbeat.start()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+
+    backlog: Deque[Tuple[int, str]] = deque()
+    in_flight: Dict[Future, Tuple[int, str]] = {}
+    remaining: Dict[int, int] = {}
+    finished: Dict[int, List[Tuple[str, Optional[str]]]] = {}
+    crashes: Dict[str, int] = {}
+    started = time.perf_counter()
+    last_checkpoint = time.monotonic()
+    done = errors = 0
+
+    def checkpoint():
+        # results must be durable before the queue says they are done
+        out.flush()
+        if output:
+            os.fsync(out.fileno())
+        if store is not None:
+            store.flush()
+        for shard_id, items in list(finished.items()):
+            queue.complete(shard_id, items)
+            del finished[shard_id]
+            if remaining[shard_id] == 0:
+                del remaining[shard_id]
+                heartbeat.drop(shard_id)
+
+    try:
+        while True:
+            while len(in_flight) < workers * 2:
+                if not backlog:
+                    lease = queue.claim()
+                    if lease is None:
+                        break
+                    heartbeat.hold(lease.shard_id)
+                    remaining[lease.shard_id] = len(lease.paths)
+                    backlog.extend((lease.shard_id, path) for path in lease.paths)
+                item = backlog.popleft()
+                in_flight[pool.submit(_process_one, item[1])] = item
+            if not in_flight:
+                checkpoint()
+                if queue.unfinished_shards() == 0:
+                    break
+                # other nodes still hold shards; take them over if their leases expire
+                time.sleep(min(POLL_S, lease_s / 4))
+                continue
+
+            ready, _ = wait(in_flight, timeout=CHECKPOINT_S, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in ready:
+                shard_id, path = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # a worker died (e.g. out of memory) and took the pool down; everything in flight
+                    # gets one more try on a fresh pool, a report that crashes it twice has failed
+                    broken = True
+                    crashes[path] = crashes.get(path, 0) + 1
+                    if crashes[path] < 2:
+                        backlog.appendleft((shard_id, path))
+                        continue
+                    result = {"report_path": path, "_error": "worker process died", "elapsed_s": 0.0}
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                done += 1
+                error = _error_text(result)
+                errors += error is not None
+                if store is not None:
+                    store.add(result)
+                finished.setdefault(shard_id, []).append((path, error))
+                remaining[shard_id] -= 1
+            if broken:
+                backlog.extendleft(in_flight.values())
+                in_flight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+            if (time.monotonic() - last_checkpoint >= CHECKPOINT_S
+                    or any(remaining[shard_id] == 0 for shard_id in finished)):
+                checkpoint()
+                last_checkpoint = time.monotonic()
+    finally:
+        try:
+            checkpoint()
+            queue.release(heartbeat.held())
+        finally:
+            heartbeat.stop()
+            pool.shutdown(wait=False, cancel_futures=True)
+            if output:
+                out.close()
+            if store is not None:
+                store.close()
+
+    elapsed = time.perf_counter() - started
+    progress = queue.progress()
+    queue.close()
+    stats = {
+        "reports": done,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "reports_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        "queue": progress,
+    }
+    print(
+        f"Processed {done} reports ({errors} with errors) in {stats['elapsed_s']}s "
+        f"- {stats['reports_per_s']} reports/s",
+        file=sys.stderr,
+    )
+    print(f"Queue: {progress['done']} done, {progress['failed']} failed, {progress['pending']} pending",
+          file=sys.stderr)
+    return stats
@@ -0,0 +1,111 @@
+"""
+Agent memoisation
+- Agent outputs are stored in the persistent DiskCache (LRU-evicted, shared between processes)
+  under namespace "agent:<name>:<code hash>" and keyed by the digest of the parsed report.
+- The code hash covers the agent's module source plus the project modules it uses (directly
+  or indirectly), or the module's AGENT_VERSION when it defines one. Changing one agent's
+  rules therefore only invalidates that agent; re-running a report recomputes nothing.
+- Modules whose behaviour depends on data that can change at runtime (the rule file) define
+  cache_version(); its current value is part of the hash of every agent using that module.
+- Only agents whose sole input is the parsed report are memoised; errors are never cached.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import sys
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .cache import get_default_cache
+from .report_context import get_context
+
+# module name -> (source digest, modules defining cache_version())
+_code_hashes: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+_lock = threading.Lock()
+
+def _source_of(module) -> bytes:
+    try:
+        return inspect.getsource(module).encode("utf-8")
+    except (OSError, TypeError):
+        return repr(module).encode("utf-8")
+
+def _project_modules(module) -> list:
+    """module plus every module of the same top-level package it uses, directly or indirectly."""
+    root = module.__name__.split(".")[0]
+    seen = {module.__name__}
+    stack = [module]
+    while stack:
+        for value in vars(stack.pop()).values():
+            name = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+            if (isinstance(name, str) and name.split(".")[0] == root and name not in seen
+                    and name in sys.modules):
+                seen.add(name)
+                stack.append(sys.modules[name])
+    return sorted(seen)
+
+def _with_versions(digest: str, versioned: Tuple[str, ...]) -> str:
+    if not versioned:
+        return digest
+    h = hashlib.sha256(digest.encode("utf-8"))
+    for name in versioned:
+        h.update(f"{name}:{sys.modules[name].cache_version()}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def agent_code_hash(fn: Callable[..., Any]) -> str:
+    """Hash identifying the code (and versioned data) behind fn; the source part is memoised per module."""
+    module = sys.modules.get(getattr(fn, "__module__", None) or "")
+    if module is None:
+        return hashlib.sha256(repr(fn).encode("utf-8")).hexdigest()[:16]
+    with _lock:
+        cached = _code_hashes.get(module.__name__)
+    if cached is not None:
+        return _with_versions(*cached)
+
+    version = getattr(module, "AGENT_VERSION", None)
+    modules = _project_modules(module)
+    if version is not None:
+        digest = hashlib.sha256(f"version:{version}".encode("utf-8")).hexdigest()[:16]
+    else:
+        h = hashlib.sha256()
+        for name in modules:
+            h.update(name.encode("utf-8"))
+            h.update(_source_of(sys.modules[name]))
+        digest = h.hexdigest()[:16]
+    versioned = tuple(name for name in modules if callable(getattr(sys.modules[name], "cache_version", None)))
+    with _lock:
+        _code_hashes[module.__name__] = (digest, versioned)
+    return _with_versions(digest, versioned)
+
+def memoize_agent(name: str, fn: Optional[Callable[..., Any]], cache=True) -> Optional[Callable[..., Any]]:
+    """
+    Wrap an agent taking a report dict (plus optional keyword options) so its output is served
+    from the cache when the same code has already seen the same report with the same options.
+    cache=True uses the shared on-disk cache, a DiskCache uses that instance,
+    None/False returns fn unchanged.
+    """
+    store = get_default_cache() if cache is True else (cache or None)
+    if fn is None or store is None:
+        return fn
+    namespace = f"agent:{name}:{agent_code_hash(fn)}"
+
+    @functools.wraps(fn)
+    def memoized(report_data, **options):
+        key = get_context(report_data).digest if isinstance(report_data, dict) else None
+        if key is None:
+            return fn(report_data, **options)
+        if options:
+            key = f"{key}:{json.dumps(options, sort_keys=True, default=str)}"
+        hit = store.get_text(namespace, key)
+        if hit is not None:
+            return json.loads(hit)
+        result = fn(report_data, **options)
+        if not (isinstance(result, dict) and "_error" in result):
+            try:
+                store.put_text(namespace, key, json.dumps(result, ensure_ascii=False))
+            except (TypeError, ValueError):
+                pass  # not JSON-serialisable: just don't cache it
+        return result
+
+    return memoized
@@ -0,0 +1,225 @@
+"""
+Caches
+- DiskCache: small persistent key/value store on SQLite, shared safely between processes.
+  Entries are grouped by namespace and evicted least-recently-used once the size cap is hit.
+  The total size is kept in a meta row by triggers, so a write only scans entries when it
+  pushes the cache over its cap (it then evicts down to EVICT_TO of the cap). Hits update
+  last_used in batches rather than with one UPDATE per get.
+- MemoryCache: in-process LRU of Python objects bounded by an estimated byte budget.
+- Both count hits and misses so callers can report cache effectiveness.
+
+Environment:
+  PHG_CACHE_DIR     directory for the cache file (default ~/.cache/personal-health-guardian)
+  PHG_CACHE_MAX_MB  size cap in megabytes (default 256)
+  PHG_CACHE=0       disable the default cache
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# eviction frees space down to this fraction of the cap, so a full cache does not evict on every write
+EVICT_TO = 0.9
+# last_used updates of cache hits are written once this many are pending or the oldest is this old
+TOUCH_BATCH = 64
+TOUCH_INTERVAL_S = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries;
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+"""
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # (namespace, key) -> last hit time, written by _write_touches
+        self._touched: Dict[tuple, float] = {}
+        self._touched_since = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        # connections must not be shared across fork()ed workers
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # one transaction, so the byte total is seeded exactly once alongside its triggers
+            conn.executescript("BEGIN IMMEDIATE;" + _SCHEMA + "COMMIT;")
+            self._conn = conn
+            self._pid = os.getpid()
+            self._touched = {}  # hits recorded before a fork belong to the parent
+        return self._conn
+
+    def _write_touches(self, conn: sqlite3.Connection):
+        if self._touched:
+            conn.executemany("UPDATE entries SET last_used = ? WHERE namespace = ? AND key = ?",
+                             [(t, ns, key) for (ns, key), t in self._touched.items()])
+            self._touched = {}
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if not self._touched:
+                self._touched_since = now
+            self._touched[(namespace, key)] = now
+            if len(self._touched) >= TOUCH_BATCH or now - self._touched_since >= TOUCH_INTERVAL_S:
+                self._write_touches(conn)
+            self.hits += 1
+            return bytes(row[0])
+
+    def put(self, namespace: str, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connection()
+            # an upsert (not INSERT OR REPLACE, whose implicit delete skips triggers) keeps the total right
+            conn.execute(
+                "INSERT INTO entries (namespace, key, value, size, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "last_used = excluded.last_used",
+                (namespace, key, value, len(value), time.time()),
+            )
+            total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total)
+
+    def get_text(self, namespace: str, key: str) -> Optional[str]:
+        value = self.get(namespace, key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put_text(self, namespace: str, key: str, value: str):
+        self.put(namespace, key, value.encode("utf-8"))
+
+    def _evict(self, conn: sqlite3.Connection, total: int):
+        # recent hits must count before choosing the least recently used entries
+        self._write_touches(conn)
+        excess = total - int(self.max_bytes * EVICT_TO)
+        freed = 0
+        doomed = []
+        for namespace, key, size in conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_used"
+        ):
+            doomed.append((namespace, key))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            conn = self._connection()
+            self._touched = {}
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+class MemoryCache:
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: str, value: Any):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._items), "bytes": self._bytes}
+
+_default_cache: Optional[DiskCache] = None
+
+def get_default_cache() -> Optional[DiskCache]:
+    """Shared process-wide cache, or None when disabled via PHG_CACHE=0."""
+    global _default_cache
+    if os.environ.get("PHG_CACHE", "1") == "0":
+        return None
+    if _default_cache is None:
+        cache_dir = os.environ.get("PHG_CACHE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "personal-health-guardian"
+        )
+        max_mb = os.environ.get("PHG_CACHE_MAX_MB")
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        _default_cache = DiskCache(os.path.join(cache_dir, "cache.sqlite3"), max_bytes=max_bytes)
+    return _default_cache
@@ -0,0 +1,204 @@
+"""
+Result catalogue
+- The sleep, stress, hydration and recommendation agents declare their flags and recommendation
+  sentences once, in a fixed order; a flag's code is its bit position and a recommendation's code
+  is its index. Codes are stable as long as agents only append to their lists.
+- Catalogues are versioned by the digest of the rule file they were compiled from, and every
+  version seen in the process stays registered, so results always expand against their own rules.
+- Recommendations may be templates ("{water_ml} ml"), filled from per-result parameters at render time.
+- CompactResult (__slots__) and ResultBatch (columnar NumPy arrays) carry results as a flag
+  bitmask, a score and recommendation codes; expand() renders exactly the dict the agent returns.
+- A saved ResultBatch records its rules version; load() refuses a file whose version is neither
+  the active rules nor registered in this process, instead of rendering the codes wrongly.
+- Only the *_batch agent variants produce these; batch runs, the service and the diet agent
+  (which has no catalogue) build the usual result dicts.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+class Catalogue:
+    """
+    layout lists the result dict's keys in order, each with its source:
+    "flags", "score", "recommendations" or "param:<name>".
+    """
+
+    def __init__(self, agent: str, flags: Sequence[str], recommendations: Sequence[str],
+                 layout: Sequence[Tuple[str, str]], params: Sequence[Tuple[str, type]] = (), version: str = ""):
+        if len(flags) > 32:
+            raise ValueError("at most 32 flags per agent")
+        self.agent = agent
+        self.version = version
+        self.flags = tuple(flags)
+        self.recommendations = tuple(recommendations)
+        self.layout = tuple(layout)
+        self.params = tuple(params)
+
+    def flag_names(self, mask: int) -> List[str]:
+        return [name for bit, name in enumerate(self.flags) if mask >> bit & 1]
+
+    def render(self, codes: Iterable[int], params: Optional[Dict[str, Any]] = None) -> List[str]:
+        texts = [self.recommendations[c] for c in codes]
+        return [t.format(**params) for t in texts] if params else texts
+
+    def expand(self, flags: int, score: Optional[int], codes: Iterable[int],
+               params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key, source in self.layout:
+            if source == "flags":
+                out[key] = self.flag_names(flags)
+            elif source == "score":
+                out[key] = score
+            elif source == "recommendations":
+                out[key] = self.render(codes, params)
+            else:
+                out[key] = (params or {}).get(source[len("param:"):])
+        return out
+
+# (agent, rules version) -> catalogue; _LATEST holds each agent's most recently registered one
+_CATALOGUES: Dict[Tuple[str, str], Catalogue] = {}
+_LATEST: Dict[str, Catalogue] = {}
+
+def register_catalogue(agent: str, flags: Sequence[str], recommendations: Sequence[str],
+                       layout: Sequence[Tuple[str, str]], params: Sequence[Tuple[str, type]] = (),
+                       version: str = "") -> Catalogue:
+    catalogue = Catalogue(agent, flags, recommendations, layout, params, version)
+    _CATALOGUES[(agent, version)] = catalogue
+    _LATEST[agent] = catalogue
+    return catalogue
+
+def get_catalogue(agent: str, version: Optional[str] = None) -> Catalogue:
+    """The agent's catalogue for a rules version (default: the latest registered)."""
+    catalogue = _LATEST.get(agent) if version is None else _CATALOGUES.get((agent, version))
+    if catalogue is None:
+        if version is None or agent not in _LATEST:
+            raise KeyError(f"no catalogue registered for agent {agent!r}")
+        raise ValueError(f"results of {agent!r} were coded with rules version {version!r}, which is not "
+                         f"loaded (active: {_LATEST[agent].version!r}); recompute them with the current rules")
+    return catalogue
+
+class CompactResult:
+    __slots__ = ("agent", "flags", "score", "codes", "params", "version")
+
+    def __init__(self, agent: str, flags: int, score: Optional[int], codes: Tuple[int, ...],
+                 params: Optional[Dict[str, Any]] = None, version: Optional[str] = None):
+        self.agent = agent
+        self.flags = flags
+        self.score = score
+        self.codes = codes
+        self.params = params
+        self.version = version
+
+    def expand(self) -> Dict[str, Any]:
+        return get_catalogue(self.agent, self.version).expand(self.flags, self.score, self.codes, self.params)
+
+    def __repr__(self) -> str:
+        return f"CompactResult({self.agent!r}, flags={self.flags:#x}, score={self.score}, codes={self.codes})"
+
+class ResultBatch:
+    """
+    Results of one agent for many reports as flat arrays: flags (uint32 bitmasks), scores
+    (int16, or None when the agent has no score), concatenated recommendation codes (uint16)
+    with row offsets, and one float64 column per template parameter (NaN = absent).
+    version is the rules version (digest) of the catalogue the codes refer to.
+    """
+
+    def __init__(self, agent: str, flags: np.ndarray, scores: Optional[np.ndarray], codes: np.ndarray,
+                 offsets: np.ndarray, params: Optional[Dict[str, np.ndarray]] = None, version: Optional[str] = None):
+        self.agent = agent
+        self.version = version
+        self.flags = flags
+        self.scores = scores
+        self.codes = codes
+        self.offsets = offsets
+        self.params = params or {}
+
+    @classmethod
+    def from_masks(cls, catalogue: Catalogue, flag_masks: Sequence[np.ndarray], rec_masks: Sequence[np.ndarray],
+                   scores: Optional[np.ndarray] = None, params: Optional[Dict[str, np.ndarray]] = None,
+                   rows: Optional[int] = None) -> "ResultBatch":
+        """
+        flag_masks[i] marks rows with flag bit i; rec_masks[c] marks rows that get recommendation
+        code c (codes come out per row in catalogue order).
+        """
+        n = len(rec_masks[0]) if rec_masks else (rows or 0)
+        flags = np.zeros(n, dtype=np.uint32)
+        for bit, mask in enumerate(flag_masks):
+            flags |= np.asarray(mask, dtype=np.uint32) << np.uint32(bit)
+        matrix = np.column_stack(rec_masks) if rec_masks else np.zeros((n, 0), dtype=bool)
+        row_idx, codes = np.nonzero(matrix)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_idx, minlength=n), out=offsets[1:])
+        return cls(
+            catalogue.agent, flags,
+            None if scores is None else np.asarray(scores, dtype=np.int16),
+            codes.astype(np.uint16), offsets, params, catalogue.version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def _param_columns(self, names: Sequence[Tuple[str, type]]) -> List[Tuple[str, type, list]]:
+        return [(name, kind, self.params[name].tolist()) for name, kind in names if name in self.params]
+
+    @staticmethod
+    def _row_params(i: int, columns: List[Tuple[str, type, list]]) -> Optional[Dict[str, Any]]:
+        # NaN marks an absent value; rows without any parameter carry none
+        out = {name: (None if values[i] != values[i] else kind(values[i])) for name, kind, values in columns}
+        return out if any(v is not None for v in out.values()) else None
+
+    def __getitem__(self, i: int) -> CompactResult:
+        catalogue = get_catalogue(self.agent, self.version)
+        return CompactResult(
+            self.agent, int(self.flags[i]),
+            None if self.scores is None else int(self.scores[i]),
+            tuple(self.codes[self.offsets[i]:self.offsets[i + 1]].tolist()),
+            self._row_params(i, self._param_columns(catalogue.params)), self.version,
+        )
+
+    def expand(self) -> List[Dict[str, Any]]:
+        """Render every result as the dict the per-report agent returns."""
+        catalogue = get_catalogue(self.agent, self.version)
+        flags = self.flags.tolist()
+        scores = self.scores.tolist() if self.scores is not None else [None] * len(flags)
+        codes = self.codes.tolist()
+        offsets = self.offsets.tolist()
+        columns = self._param_columns(catalogue.params)
+        return [
+            catalogue.expand(mask, score, codes[offsets[i]:offsets[i + 1]], self._row_params(i, columns))
+            for i, (mask, score) in enumerate(zip(flags, scores))
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.flags, self.codes, self.offsets, *self.params.values()]
+        if self.scores is not None:
+            arrays.append(self.scores)
+        return sum(a.nbytes for a in arrays)
+
+    def save(self, path: str):
+        arrays = {"flags": self.flags, "codes": self.codes, "offsets": self.offsets,
+                  "agent": np.asarray(self.agent, dtype=str), "version": np.asarray(self.version or "", dtype=str)}
+        if self.scores is not None:
+            arrays["scores"] = self.scores
+        for name, values in self.params.items():
+            arrays[f"param_{name}"] = values
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ResultBatch":
+        """Load a saved batch; ValueError when its codes belong to rules that are not loaded."""
+        from .rules import cache_version  # the rules compile catalogues, so import them lazily
+
+        with np.load(path) as data:
+            if "version" not in data.files:
+                raise ValueError(f"{path} has no rules version; recompute it with the current rules")
+            agent, version = str(data["agent"]), str(data["version"])
+            active = cache_version()
+            if version != active and (agent, version) not in _CATALOGUES:
+                raise ValueError(f"{path} was coded with rules version {version!r} but the active rules are "
+                                 f"{active!r}; recompute it with the current rules")
+            params = {k[len("param_"):]: data[k] for k in data.files if k.startswith("param_")}
+            return cls(agent, data["flags"], data["scores"] if "scores" in data.files else None,
+                       data["codes"], data["offsets"], params, version)
@@ -0,0 +1,25 @@
+"""
+Cohort helpers
+- Keyword matching over many reports at once with pandas string methods; same semantics as
+  ReportContext.has (a plain substring test on the lower-cased text).
+- Used by the *_batch variants of the rule-based agents, which return exactly what the
+  per-report agents would (one result per text, in input order), or a compact ResultBatch.
+"""
+
+from typing import Any, Iterable
+
+import pandas as pd
+
+def text_series(texts: Iterable[Any]) -> pd.Series:
+    """Texts as a 0..n-1 indexed object Series; missing texts become ""."""
+    if isinstance(texts, pd.Series):
+        return texts.fillna("").astype(str).reset_index(drop=True)
+    return pd.Series([t or "" for t in texts], dtype=object)
+
+def keyword_hits(texts: Iterable[Any], keywords: Iterable[str]) -> pd.DataFrame:
+    """Boolean frame with one row per text and one column per keyword."""
+    lower = text_series(texts).str.lower()
+    return pd.DataFrame(
+        {k: lower.str.contains(k, regex=False).to_numpy(dtype=bool) for k in dict.fromkeys(keywords)},
+        index=lower.index,
+    )
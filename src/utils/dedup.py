@@ -0,0 +1,234 @@
+"""
+Near-duplicate report index
+- Fingerprints extracted text with MinHash over word 3-gram shingles (NumPy, 64 permutations)
+  plus an exact hash of the raw text (only Unicode form and line endings normalised, since
+  agent rules can depend on whitespace and punctuation).
+- Signatures are bucketed with LSH bands in SQLite, so the index is shared by batch worker
+  processes and service workers and survives between runs (re-sends arriving days later still match).
+- A match needs an estimated Jaccard similarity >= threshold, identical lab values (templated
+  printouts that only differ in their numbers are never duplicates) and the same scope, so
+  results computed by older agent code or with other options are not reused.
+- Holds at most max_entries reports (PHG_DEDUP_MAX, default DEFAULT_MAX_ENTRIES; 0 = unbounded):
+  past that, adding a report evicts the least recently matched ones down to EVICT_TO of the cap.
+- Counts exact hits, near hits and misses so callers can report the dedup hit rate.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_WORDS = 3
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_MAX_ENTRIES = 100_000
+# eviction deletes down to this fraction of max_entries, so deletions come in batches
+EVICT_TO = 0.9
+
+_WORD_RE = re.compile(r"\w+")
+_CHUNK = 1 << 15
+
+_rng = np.random.default_rng(20240601)  # fixed: signatures must be comparable across processes and runs
+_XORS = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_MULTS = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    exact TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    label TEXT,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS docs_exact ON docs (exact, scope);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    doc INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, hash);
+CREATE INDEX IF NOT EXISTS bands_doc ON bands (doc);
+"""
+
+def _migrate(conn: sqlite3.Connection):
+    # indexes written before eviction existed have no "used" column
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "used" not in {row[1] for row in conn.execute("PRAGMA table_info(docs)")}:
+            conn.execute("ALTER TABLE docs ADD COLUMN used REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE docs SET used = created")
+        conn.execute("CREATE INDEX IF NOT EXISTS docs_used ON docs (used)")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def max_entries_from_env() -> int:
+    value = os.environ.get("PHG_DEDUP_MAX")
+    return int(value) if value else DEFAULT_MAX_ENTRIES
+
+def _tokens(text: str):
+    return _WORD_RE.findall(text.lower())
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of the text's word 3-gram shingles."""
+    words = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in _tokens(text)), dtype=np.uint64)
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    if len(words) == 0:
+        return signature
+    with np.errstate(over="ignore"):
+        if len(words) >= SHINGLE_WORDS:
+            shingles = (words[:-2] * np.uint64(0x9E3779B97F4A7C15)) ^ (words[1:-1] * np.uint64(0xC2B2AE3D27D4EB4F)) ^ words[2:]
+        else:
+            shingles = words
+        shingles = np.unique(shingles)
+        for start in range(0, len(shingles), _CHUNK):
+            values = (shingles[start:start + _CHUNK, None] ^ _XORS) * _MULTS
+            values ^= values >> np.uint64(29)
+            np.minimum(signature, values.min(axis=0), out=signature)
+    return signature
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float(np.mean(a == b))
+
+def _exact_key(text: str) -> str:
+    normalised = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return hashlib.sha256(normalised.encode("utf-8", "surrogatepass")).hexdigest()
+
+def _scope_key(labs: Optional[Iterable], scope: Any) -> str:
+    values = sorted((rec[0], rec[1], rec[2]) for rec in labs or [])
+    payload = repr(values) + json.dumps(scope, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _band_hashes(signature: np.ndarray):
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        yield band, int.from_bytes(digest, "big", signed=True)
+
+class DedupIndex:
+    def __init__(self, path: str, threshold: float = DEFAULT_THRESHOLD, max_entries: Optional[int] = None):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries_from_env() if max_entries is None else max_entries
+        self.evicted = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # connections must not be shared across fork()ed workers
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _migrate(conn)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def fingerprint(self, text: str, labs: Optional[Iterable] = None, scope: Any = None) -> Tuple[str, str, np.ndarray]:
+        """
+        (exact key, scope key, MinHash signature) of a report. Only reports with the same
+        lab values and the same JSON-serialisable scope (agent versions, options) can match.
+        """
+        return _exact_key(text), _scope_key(labs, scope), minhash(text)
+
+    def lookup(self, fingerprint: Tuple[str, str, np.ndarray]) -> Optional[Dict[str, Any]]:
+        """
+        Best stored match for a fingerprint, or None.
+        Returns {"result", "match", "similarity", "exact"}.
+        """
+        exact, scope, signature = fingerprint
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT id, label, result FROM docs WHERE exact = ? AND scope = ? LIMIT 1", (exact, scope)
+            ).fetchone()
+            if row is not None:
+                self.exact_hits += 1
+                self._touch(conn, row[0])
+                return {"result": json.loads(row[2]), "match": row[1], "similarity": 1.0, "exact": True}
+
+            candidates = set()
+            for band, value in _band_hashes(signature):
+                candidates.update(d for (d,) in conn.execute(
+                    "SELECT doc FROM bands WHERE band = ? AND hash = ?", (band, value)))
+            best = None
+            for doc in candidates:
+                found = conn.execute("SELECT scope, signature, label, result FROM docs WHERE id = ?", (doc,)).fetchone()
+                if found is None or found[0] != scope:
+                    continue
+                score = similarity(signature, np.frombuffer(found[1], dtype=np.uint64))
+                if score >= self.threshold and (best is None or score > best[0]):
+                    best = (score, found[2], found[3], doc)
+            if best is None:
+                self.misses += 1
+                return None
+            self.near_hits += 1
+            self._touch(conn, best[3])
+            return {"result": json.loads(best[2]), "match": best[1], "similarity": round(best[0], 4), "exact": False}
+
+    @staticmethod
+    def _touch(conn: sqlite3.Connection, doc: int):
+        conn.execute("UPDATE docs SET used = ? WHERE id = ?", (time.time(), doc))
+
+    def _evict(self, conn: sqlite3.Connection):
+        count = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        if not self.max_entries or count <= self.max_entries:
+            return
+        drop = [(d,) for (d,) in conn.execute(
+            "SELECT id FROM docs ORDER BY used LIMIT ?", (count - int(self.max_entries * EVICT_TO),))]
+        conn.executemany("DELETE FROM bands WHERE doc = ?", drop)
+        conn.executemany("DELETE FROM docs WHERE id = ?", drop)
+        self.evicted += len(drop)
+
+    def add(self, fingerprint: Tuple[str, str, np.ndarray], result: Dict[str, Any], label: Optional[str] = None):
+        exact, scope, signature = fingerprint
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(
+                    "INSERT INTO docs (exact, scope, signature, label, result, created, used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (exact, scope, signature.tobytes(), label, payload, now, now),
+                )
+                conn.executemany("INSERT INTO bands (band, hash, doc) VALUES (?, ?, ?)",
+                                 [(band, value, cur.lastrowid) for band, value in _band_hashes(signature)])
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        looked_up = self.exact_hits + self.near_hits + self.misses
+        hits = self.exact_hits + self.near_hits
+        return {"exact_hits": self.exact_hits, "near_hits": self.near_hits, "misses": self.misses,
+                "evicted": self.evicted, "hit_rate": round(hits / looked_up, 4) if looked_up else 0.0}
+
+def default_index_path() -> str:
+    cache_dir = os.environ.get("PHG_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "personal-health-guardian"
+    )
+    return os.path.join(cache_dir, "dedup.sqlite3")
@@ -0,0 +1,141 @@
+"""
+Stage instrumentation
+- measure() runs one stage or agent and records its wall time, the CPU time of the thread
+  that ran it, whether it ended in an error, and (while tracemalloc is tracing) the peak
+  memory allocated during the call.
+- Metrics aggregates those records per stage across reports and renders them as a JSON-able
+  snapshot or in the Prometheus text exposition format.
+- Memory tracing is off by default (tracemalloc slows Python code noticeably); turn it on with
+  start_memory_tracing() or PHG_TRACEMALLOC=1 for worker processes.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_mem_lock = threading.Lock()
+_mem_active = 0
+
+def start_memory_tracing():
+    """Start tracemalloc here and in worker processes started afterwards."""
+    os.environ["PHG_TRACEMALLOC"] = "1"
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def memory_tracing_from_env():
+    """Worker initialisers call this so memory tracing follows the parent's setting."""
+    if os.environ.get("PHG_TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "_error" in result
+
+def measure(fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Call fn and return (result, record). Exceptions are not caught here.
+    peak_bytes is exact for a stage that runs alone; for overlapping stages it is an upper
+    bound, because tracemalloc keeps a single process-wide peak.
+    """
+    global _mem_active
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        with _mem_lock:
+            if _mem_active == 0:
+                tracemalloc.reset_peak()
+            _mem_active += 1
+        mem_start = tracemalloc.get_traced_memory()[0]
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        record = {
+            "wall_s": round(time.perf_counter() - wall_start, 6),
+            "cpu_s": round(time.thread_time() - cpu_start, 6),
+        }
+        if tracing:
+            record["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - mem_start)
+            with _mem_lock:
+                _mem_active -= 1
+    record["error"] = is_error(result)
+    return result, record
+
+def timeout_record(timeout: float) -> Dict[str, Any]:
+    return {"wall_s": timeout, "cpu_s": 0.0, "error": True, "timed_out": True}
+
+class Metrics:
+    """Per-stage totals across many reports; thread-safe."""
+
+    def __init__(self):
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, record: Dict[str, Any]):
+        with self._lock:
+            s = self._stages.setdefault(stage, {
+                "calls": 0, "errors": 0, "timeouts": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                "wall_max_s": 0.0, "peak_bytes_max": 0,
+            })
+            s["calls"] += 1
+            s["errors"] += 1 if record.get("error") else 0
+            s["timeouts"] += 1 if record.get("timed_out") else 0
+            s["wall_s"] += record.get("wall_s", 0.0)
+            s["cpu_s"] += record.get("cpu_s", 0.0)
+            s["wall_max_s"] = max(s["wall_max_s"], record.get("wall_s", 0.0))
+            s["peak_bytes_max"] = max(s["peak_bytes_max"], record.get("peak_bytes", 0))
+
+    def observe_all(self, records: Dict[str, Dict[str, Any]]):
+        for stage, record in records.items():
+            self.observe(stage, record)
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(s) for name, s in self._stages.items()}
+            counters = dict(self._counters)
+        for s in stages.values():
+            s["wall_s"] = round(s["wall_s"], 6)
+            s["cpu_s"] = round(s["cpu_s"], 6)
+            s["wall_mean_s"] = round(s["wall_s"] / s["calls"], 6) if s["calls"] else 0.0
+        return {"stages": stages, "counters": counters}
+
+    def to_prometheus(self, gauges: Optional[Dict[str, float]] = None, prefix: str = "phg") -> str:
+        snap = self.snapshot()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, float]]):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        stages = sorted(snap["stages"].items())
+        per_stage = lambda key: [(f'{{stage="{name}"}}', s[key]) for name, s in stages]
+        family("stage_calls_total", "counter", "Stage executions.", per_stage("calls"))
+        family("stage_errors_total", "counter", "Stage executions that ended in an error.", per_stage("errors"))
+        family("stage_timeouts_total", "counter", "Stage executions that timed out.", per_stage("timeouts"))
+        family("stage_wall_seconds_total", "counter", "Wall time spent in each stage.", per_stage("wall_s"))
+        family("stage_cpu_seconds_total", "counter", "CPU time of the thread running each stage.", per_stage("cpu_s"))
+        family("stage_wall_seconds_max", "gauge", "Slowest single execution of each stage.", per_stage("wall_max_s"))
+        family("stage_peak_bytes_max", "gauge", "Largest traced peak allocation of each stage (0 when not tracing).",
+               per_stage("peak_bytes_max"))
+        for name, value in sorted(snap["counters"].items()):
+            family(f"{name}_total", "counter", f"{name.replace('_', ' ').capitalize()}.", [("", value)])
+        for name, value in sorted((gauges or {}).items()):
+            family(name, "gauge", f"{name.replace('_', ' ').capitalize()}.", [("", value)])
+        return "\n".join(lines) + "\n"
+
+_default_metrics: Optional[Metrics] = None
+
+def default_metrics() -> Metrics:
+    """Process-wide metrics that every pipeline run and safe_call reports into."""
+    global _default_metrics
+    if _default_metrics is None:
+        _default_metrics = Metrics()
+    return _default_metrics
@@ -0,0 +1,163 @@
+"""
+Lab value extractor
+- Precompiled patterns for LDL/HDL, glucose, HbA1c, blood pressure, haemoglobin, weight and height.
+- Runs once per report (or once per page when streaming) and emits compact LabRecord tuples
+  with values converted to one canonical unit per analyte.
+- Implausible values (e.g. "lost 5 kg") are dropped rather than reported.
+- Layout text (see layout.py) is read table-aware: aligned rows become "label: value unit ref range".
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .layout import table_lines
+
+class LabRecord(NamedTuple):
+    analyte: str
+    value: float
+    unit: str
+    ref_low: Optional[float] = None
+    ref_high: Optional[float] = None
+    page: Optional[int] = None
+
+# analyte -> (canonical unit, {reported unit: factor to canonical}); None = canonical assumed
+_UNITS: Dict[str, tuple] = {
+    "ldl": ("mg/dL", {None: 1.0, "mg/dl": 1.0, "mmol/l": 38.67}),
+    "hdl": ("mg/dL", {None: 1.0, "mg/dl": 1.0, "mmol/l": 38.67}),
+    "glucose": ("mg/dL", {None: 1.0, "mg/dl": 1.0, "mmol/l": 18.016}),
+    "hba1c": ("%", {None: 1.0, "%": 1.0}),
+    "haemoglobin": ("g/dL", {None: 1.0, "g/dl": 1.0, "g/l": 0.1, "mmol/l": 1.611}),
+    "bp_systolic": ("mmHg", {None: 1.0, "mmhg": 1.0}),
+    "bp_diastolic": ("mmHg", {None: 1.0, "mmhg": 1.0}),
+    "weight": ("kg", {"kg": 1.0, "kgs": 1.0, "kilogram": 1.0, "kilograms": 1.0,
+                      "lb": 0.45359237, "lbs": 0.45359237, "pounds": 0.45359237}),
+    "height": ("m", {"cm": 0.01, "centimeter": 0.01, "centimeters": 0.01, "centimetre": 0.01,
+                     "centimetres": 0.01, "m": 1.0, "meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0}),
+}
+
+_DISPLAY = {
+    "ldl": "LDL", "hdl": "HDL", "glucose": "Glucose", "hba1c": "HbA1c", "haemoglobin": "Haemoglobin",
+    "bp_systolic": "Systolic BP", "bp_diastolic": "Diastolic BP", "weight": "Weight", "height": "Height",
+}
+
+# every analyte the extractor can emit, in a stable order
+ANALYTES = tuple(_UNITS)
+
+# canonical-unit bounds outside which a match is treated as noise
+_PLAUSIBLE = {
+    "ldl": (10, 500), "hdl": (5, 200), "glucose": (20, 1000), "hba1c": (3, 20),
+    "haemoglobin": (2, 25), "bp_systolic": (50, 260), "bp_diastolic": (30, 160),
+    "weight": (20, 350), "height": (0.5, 2.5),
+}
+
+# Order matters: HbA1c must win over plain haemoglobin/"hb" at the same position
+_LABEL_RE = re.compile(
+    r"\b(?:"
+    r"(?P<hba1c>hb\s*a1c|a1c|glyc(?:ated|osylated)\s+ha?emoglobin)"
+    r"|(?P<ldl>ldl(?:[\s-]*c(?:holesterol)?)?|low[\s-]density\s+lipoprotein)"
+    r"|(?P<hdl>hdl(?:[\s-]*c(?:holesterol)?)?|high[\s-]density\s+lipoprotein)"
+    r"|(?P<glucose>(?:(?:fasting|random|blood|plasma|serum)\s+)*glucose|blood\s+sugar|fbs|rbs)"
+    r"|(?P<haemoglobin>ha?emoglobin|hgb|hb)"
+    r"|(?P<bp>blood\s+pressure|bp)"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# value right after a label on the same line, e.g. "LDL (calc): 130 mg/dL  ref 0-100" or "BP 140/90 mmHg"
+_VALUE_RE = re.compile(
+    r"[^\S\n]*(?:\([^)\n]{0,20}\))?[^\S\n]*[:=\-]?[^\S\n]*(?:(?:is|of|was)[^\S\n]+)?"
+    r"(?P<value>\d{1,4}(?:\.\d+)?)(?:[^\S\n]*/[^\S\n]*(?P<value2>\d{2,3}))?"
+    r"[^\S\n]*(?P<unit>mg/dl|mmol/mol|mmol/l|g/dl|g/l|mmhg|%)?"
+    r"(?:[^\S\n]*[(\[]?[^\S\n]*(?:(?:ref(?:erence)?|normal)(?:[^\S\n]+range)?[^\S\n]*[:\-]?[^\S\n]*)?"
+    r"(?P<low>\d+(?:\.\d+)?)[^\S\n]*(?:-|–|to)[^\S\n]*(?P<high>\d+(?:\.\d+)?))?",
+    re.IGNORECASE,
+)
+
+_WEIGHT_RE = re.compile(
+    r"(?<![\d.])(?P<value>\d{1,3}(?:\.\d+)?)\s*(?P<unit>kgs?|kilograms?|lbs?|pounds)\b",
+    re.IGNORECASE,
+)
+
+_HEIGHT_RE = re.compile(
+    r"(?<![\d.])(?P<value>\d{1,3}(?:\.\d+)?)\s*(?P<unit>cm|centimet(?:er|re)s?|m|met(?:er|re)s?)\b",
+    re.IGNORECASE,
+)
+
+def _record(analyte: str, value: float, unit: Optional[str], low=None, high=None, page=None) -> Optional[LabRecord]:
+    canonical, factors = _UNITS[analyte]
+    unit = unit.lower() if unit else None
+    if analyte == "hba1c" and unit == "mmol/mol":
+        # IFCC -> NGSP master equation
+        convert = lambda v: round(0.09148 * v + 2.152, 2)
+    elif unit in factors:
+        factor = factors[unit]
+        convert = lambda v: round(v * factor, 3)
+    else:
+        return None
+    value = convert(value)
+    lo, hi = _PLAUSIBLE[analyte]
+    if not lo <= value <= hi:
+        return None
+    ref_low = convert(float(low)) if low is not None else None
+    ref_high = convert(float(high)) if high is not None else None
+    return LabRecord(analyte, value, canonical, ref_low, ref_high, page)
+
+def extract_lab_values(text: str, page: Optional[int] = None) -> List[LabRecord]:
+    """All recognised lab values in text, in order of appearance."""
+    found = []
+    for m in _LABEL_RE.finditer(text):
+        v = _VALUE_RE.match(text, m.end())
+        if v is None:
+            continue
+        analyte = m.lastgroup
+        unit = v.group("unit")
+        if analyte == "bp":
+            if v.group("value2") is None:
+                continue
+            for name, raw in (("bp_systolic", v.group("value")), ("bp_diastolic", v.group("value2"))):
+                rec = _record(name, float(raw), unit, page=page)
+                if rec:
+                    found.append((m.start(), rec))
+            continue
+        if v.group("value2") is not None:
+            continue
+        rec = _record(analyte, float(v.group("value")), unit, v.group("low"), v.group("high"), page)
+        if rec:
+            found.append((m.start(), rec))
+
+    for analyte, pattern in (("weight", _WEIGHT_RE), ("height", _HEIGHT_RE)):
+        for m in pattern.finditer(text):
+            rec = _record(analyte, float(m.group("value")), m.group("unit"), page=page)
+            if rec:
+                found.append((m.start(), rec))
+
+    found.sort(key=lambda item: item[0])
+    return [rec for _, rec in found]
+
+def first_measurement(text: str, analyte: str) -> Optional[LabRecord]:
+    """First weight or height in text; same as first(extract_lab_values(text), analyte) but scans one pattern."""
+    pattern = {"weight": _WEIGHT_RE, "height": _HEIGHT_RE}[analyte]
+    for m in pattern.finditer(text):
+        rec = _record(analyte, float(m.group("value")), m.group("unit"))
+        if rec:
+            return rec
+    return None
+
+def extract_lab_values_from_pages(page_texts: Iterable[str], layout: bool = False) -> List[LabRecord]:
+    """Lab values of every page; layout=True for layout text, whose aligned table rows are read column-wise."""
+    records: List[LabRecord] = []
+    for pno, text in enumerate(page_texts):
+        records.extend(extract_lab_values(table_lines(text) if layout else text, page=pno))
+    return records
+
+def canonical_unit(analyte: str) -> str:
+    return _UNITS[analyte][0] if analyte in _UNITS else ""
+
+def display_name(analyte: str) -> str:
+    return _DISPLAY.get(analyte, analyte)
+
+def first(records: Iterable[LabRecord], analyte: str) -> Optional[LabRecord]:
+    for rec in records:
+        if rec.analyte == analyte:
+            return rec
+    return None
@@ -0,0 +1,175 @@
+"""
+Layout-aware page text
+- Rebuilds a page from PyMuPDF word boxes (page.get_text("words")) row by row, so a lab table
+  row keeps its label, result, unit and reference range on one line even when the PDF stores
+  the table column by column.
+- Words are bucketed by vertical centre into a grid of bands one row tolerance high; a word is
+  only compared with the rows in its own and the two neighbouring bands, so grouping a page is
+  linear in its number of words instead of comparing every pair of boxes.
+- Within a row, words are split into cells at wide gaps and cells are joined with tabs.
+  Below a lab table header (Test / Result / Units / Reference range ...) every row gets one
+  field per header column, empty ones included, so the columns stay aligned when a row
+  leaves e.g. the flag column blank.
+- table_lines() turns those aligned rows into "label: value unit ref low-high" lines that the
+  lab value extractor understands.
+"""
+
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (x0, y0, x1, y1, text)
+Word = Tuple[float, float, float, float, str]
+# (x0, x1, text)
+Cell = Tuple[float, float, str]
+
+# words whose vertical centres differ by less than this fraction of the typical word height share a row
+ROW_TOLERANCE = 0.5
+# a horizontal gap wider than this fraction of the row's word height starts a new cell
+CELL_GAP = 1.0
+
+_HEADER_NAMES = {
+    "label": ("test", "tests", "test name", "investigation", "analyte", "parameter", "component", "description"),
+    "value": ("result", "results", "value", "observed value", "your result"),
+    "unit": ("unit", "units", "uom"),
+    "range": ("reference range", "reference", "ref range", "ref. range", "normal range", "range",
+              "reference interval", "biological reference interval", "normal values"),
+    "flag": ("flag", "status"),
+}
+_HEADER_ROLES = {name: role for role, names in _HEADER_NAMES.items() for name in names}
+
+_DIGIT_RE = re.compile(r"\d")
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def group_rows(words: Sequence[Word], tolerance: float = ROW_TOLERANCE) -> List[List[Word]]:
+    """Words grouped into rows, top to bottom, each row ordered left to right."""
+    if not words:
+        return []
+    band = max(_median([w[3] - w[1] for w in words]) * tolerance, 0.5)
+    grid: Dict[int, List[int]] = {}
+    centres: List[float] = []
+    rows: List[List[Word]] = []
+    for word in words:
+        centre = (word[1] + word[3]) / 2
+        key = int(centre // band)
+        best, best_distance = None, band
+        # a row within `band` of this word can only sit in the neighbouring grid cells
+        for k in (key - 1, key, key + 1):
+            for r in grid.get(k, ()):
+                distance = abs(centres[r] - centre)
+                if distance <= best_distance:
+                    best, best_distance = r, distance
+        if best is None:
+            best = len(rows)
+            rows.append([])
+            centres.append(centre)
+            grid.setdefault(key, []).append(best)
+        rows[best].append(word)
+    order = sorted(range(len(rows)), key=centres.__getitem__)
+    return [sorted(rows[i], key=lambda w: w[0]) for i in order]
+
+def split_cells(row: Sequence[Word], gap: float = CELL_GAP) -> List[Cell]:
+    """Consecutive words of a row merged into cells wherever the gap between them is small."""
+    limit = _median([w[3] - w[1] for w in row]) * gap
+    cells: List[Cell] = []
+    x0, x1, parts = row[0][0], row[0][2], [row[0][4]]
+    for word in row[1:]:
+        if word[0] - x1 > limit:
+            cells.append((x0, x1, " ".join(parts)))
+            x0, parts = word[0], []
+        parts.append(word[4])
+        x1 = max(x1, word[2])
+    cells.append((x0, x1, " ".join(parts)))
+    return cells
+
+def header_roles(fields: Sequence[str]) -> Optional[List[Optional[str]]]:
+    """Column role of each field if they form a lab table header (needs a result column plus units or range)."""
+    roles = [_HEADER_ROLES.get(f.strip().rstrip(":").lower()) for f in fields]
+    if "value" in roles and ("unit" in roles or "range" in roles):
+        return roles
+    return None
+
+class _Columns:
+    """Header columns of a lab table; cells are assigned by their centre via bisection over column boundaries."""
+
+    def __init__(self, cells: List[Cell], roles: List[Optional[str]]):
+        if roles[0] != "label":
+            # the label column often has no heading; everything left of the first heading is the label
+            cells = [(cells[0][0] - 1, cells[0][0] - 1, "")] + cells
+        self.headers = [c[2] for c in cells]
+        self.boundaries = [(a[1] + b[0]) / 2 for a, b in zip(cells, cells[1:])]
+
+    def align(self, cells: List[Cell]) -> Optional[List[str]]:
+        """One field per column, or None when the row is not part of the table (e.g. a full-width line)."""
+        if len(cells) == 1 and bisect_right(self.boundaries, cells[0][0]) != bisect_right(self.boundaries, cells[0][1]):
+            return None
+        fields: List[List[str]] = [[] for _ in self.headers]
+        for x0, x1, text in cells:
+            # long labels may reach into the result column; they still start in the label column
+            column = 0 if x0 < self.boundaries[0] else bisect_right(self.boundaries, (x0 + x1) / 2)
+            fields[column].append(text)
+        return [" ".join(parts) for parts in fields]
+
+def layout_lines(words: Sequence[Word]) -> List[str]:
+    """Text lines of a page, one per row; cells are tab-separated and aligned under lab table headers."""
+    lines = []
+    columns: Optional[_Columns] = None
+    for row in group_rows(words):
+        cells = split_cells(row)
+        roles = header_roles([c[2] for c in cells])
+        if roles is not None:
+            columns = _Columns(cells, roles)
+            lines.append("\t".join(columns.headers))
+            continue
+        fields = columns.align(cells) if columns is not None else None
+        if fields is None:
+            columns = None
+            fields = [c[2] for c in cells]
+        lines.append("\t".join(fields))
+    return lines
+
+def page_text(page) -> str:
+    """Layout text of a PyMuPDF page; like page.get_text() it ends with a newline when not empty."""
+    words = [w[:5] for w in page.get_text("words")]
+    return "".join(line + "\n" for line in layout_lines(words))
+
+def _lab_line(fields: List[str], roles: List[Optional[str]]) -> Optional[str]:
+    by_role = {}
+    for field, role in zip(fields, roles):
+        if role is not None and role not in by_role:
+            by_role[role] = field.strip()
+    value = by_role.get("value", "")
+    label = fields[0].strip()
+    if not label or not _DIGIT_RE.search(value):
+        return None
+    parts = [f"{label}: {value}"]
+    if by_role.get("unit"):
+        parts.append(by_role["unit"])
+    if by_role.get("range"):
+        parts.append(f"ref {by_role['range']}")
+    return " ".join(parts)
+
+def table_lines(text: str) -> str:
+    """
+    Text with every aligned lab table row (as written by layout_lines) rewritten as
+    "label: value unit ref range"; all other lines are returned unchanged.
+    """
+    if "\t" not in text:
+        return text
+    out = []
+    roles: Optional[List[Optional[str]]] = None
+    for line in text.split("\n"):
+        fields = line.split("\t")
+        header = header_roles(fields)
+        if header is not None:
+            roles = header
+            roles[0] = roles[0] or "label"
+        elif roles is not None and len(fields) == len(roles):
+            line = _lab_line(fields, roles) or line
+        else:
+            roles = None
+        out.append(line)
+    return "\n".join(out)
@@ -0,0 +1,272 @@
+"""
+Metric store
+- Columnar NumPy store of extracted metrics (lab values) per patient over time.
+- One value per (patient, metric, report date): appending a key again replaces its value, so
+  re-running a report is idempotent and series lengths count reports, not lab lines.
+- Rows are kept sorted by one packed int64 key (patient, metric, day) in two runs: the main
+  arrays and a small delta that appends are merged into. The delta is folded into the main
+  arrays only once it outgrows 1/COMPACT_RATIO of them, so an append followed by a
+  single-patient query (the trend agent's pattern) costs O(delta), not O(store).
+- Trend queries (slope, percent change, threshold crossings) are computed for every
+  (patient, metric) series at once with grouped reductions, not per-patient loops.
+- Saved as compressed .npz; save(), load() and exists() all add the suffix when it is missing.
+"""
+
+import datetime
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# key layout: patient code (high 24 bits) | metric code (8 bits) | day number (32 bits)
+_DAY_BITS = 32
+_METRIC_BITS = 8
+_DAY_OFFSET = 1 << 31  # days are stored offset so dates before 1970 still sort correctly
+_PATIENT_SHIFT = _METRIC_BITS + _DAY_BITS
+# the delta run is folded into the main run once it holds more than max(COMPACT_MIN, main / COMPACT_RATIO) rows
+COMPACT_RATIO = 64
+COMPACT_MIN = 4096
+
+def store_path(path: str) -> str:
+    """path as np.savez writes it: with the .npz suffix."""
+    return path if path.endswith(".npz") else path + ".npz"
+
+def _day_number(date) -> int:
+    if date is None:
+        date = datetime.date.today()
+    elif isinstance(date, str):
+        date = datetime.date.fromisoformat(date[:10])
+    elif isinstance(date, datetime.datetime):
+        date = date.date()
+    return date.toordinal() - datetime.date(1970, 1, 1).toordinal()
+
+def _merge(keys: np.ndarray, values: np.ndarray, new_keys: np.ndarray, new_values: np.ndarray) -> tuple:
+    """Merge sorted unique new_keys into sorted unique keys (binary search, no re-sort); new values win."""
+    at = np.searchsorted(keys, new_keys)
+    stored = at < len(keys)
+    stored[stored] = keys[at[stored]] == new_keys[stored]
+    if stored.any():
+        values = values.copy()
+        values[at[stored]] = new_values[stored]
+    new = ~stored
+    if new.any():
+        keys = np.insert(keys, at[new], new_keys[new])
+        values = np.insert(values, at[new], new_values[new])
+    return keys, values
+
+def _patient_range(keys: np.ndarray, p: int) -> slice:
+    lo, hi = np.searchsorted(keys, [p << _PATIENT_SHIFT, (p + 1) << _PATIENT_SHIFT])
+    return slice(lo, hi)
+
+class MetricStore:
+    def __init__(self):
+        self._patients: Dict[str, int] = {}
+        self._patient_ids: List[str] = []
+        self._metrics: Dict[str, int] = {}
+        self._metric_names: List[str] = []
+        self._keys = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.float64)
+        self._delta_keys = np.empty(0, dtype=np.int64)
+        self._delta_values = np.empty(0, dtype=np.float64)
+        self._pending: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        self._flush(compact=True)
+        return len(self._keys)
+
+    def _code(self, table: Dict[str, int], names: List[str], name: str, limit: int) -> int:
+        code = table.get(name)
+        if code is None:
+            code = len(names)
+            if code >= limit:
+                raise ValueError(f"too many distinct values for key field (limit {limit})")
+            table[name] = code
+            names.append(name)
+        return code
+
+    def append(self, patient_id: str, date, metric: str, value: float):
+        """Record a value; one already stored for the same patient, metric and day is replaced."""
+        p = self._code(self._patients, self._patient_ids, str(patient_id), 1 << (63 - _DAY_BITS - _METRIC_BITS))
+        m = self._code(self._metrics, self._metric_names, metric, 1 << _METRIC_BITS)
+        day = _day_number(date) + _DAY_OFFSET
+        self._pending[(((p << _METRIC_BITS) | m) << _DAY_BITS) | day] = float(value)
+
+    def append_report(self, patient_id: str, date, labs: Iterable) -> int:
+        """
+        Record one report's lab records (analyte, value, ...): the first value of each analyte,
+        as later mentions are usually repeats or other conditions (e.g. a post-meal glucose).
+        Returns the number of metrics recorded.
+        """
+        first: Dict[str, float] = {}
+        for rec in labs:
+            first.setdefault(rec[0], rec[1])
+        for metric, value in first.items():
+            self.append(patient_id, date, metric, value)
+        return len(first)
+
+    def _flush(self, compact: bool = False):
+        """Merge pending appends into the delta run; fold the delta into the main run when large (or compact)."""
+        if self._pending:
+            keys = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+            values = np.fromiter(self._pending.values(), dtype=np.float64, count=len(self._pending))
+            self._pending = {}
+            order = np.argsort(keys)
+            self._delta_keys, self._delta_values = _merge(self._delta_keys, self._delta_values,
+                                                          keys[order], values[order])
+        if len(self._delta_keys) and (compact or len(self._delta_keys) > max(COMPACT_MIN, len(self._keys) // COMPACT_RATIO)):
+            self._keys, self._values = _merge(self._keys, self._values, self._delta_keys, self._delta_values)
+            self._delta_keys = self._delta_keys[:0]
+            self._delta_values = self._delta_values[:0]
+
+    def _select(self, metric: Optional[str], patient_id: Optional[str], since) -> Optional[tuple]:
+        if patient_id is None:
+            self._flush(compact=True)
+            keys, values = self._keys, self._values
+        else:
+            self._flush()
+            p = self._patients.get(str(patient_id))
+            if p is None:
+                return None
+            # only this patient's rows of both runs are merged
+            main, delta = _patient_range(self._keys, p), _patient_range(self._delta_keys, p)
+            keys, values = _merge(self._keys[main], self._values[main],
+                                  self._delta_keys[delta], self._delta_values[delta])
+        series = keys >> _DAY_BITS
+        days = (keys & ((1 << _DAY_BITS) - 1)) - _DAY_OFFSET
+        mask = None
+        if metric is not None:
+            m = self._metrics.get(metric)
+            if m is None:
+                return None
+            mask = (series & ((1 << _METRIC_BITS) - 1)) == m
+        if since is not None:
+            recent = days >= _day_number(since)
+            mask = recent if mask is None else mask & recent
+        if mask is not None:
+            series, days, values = series[mask], days[mask], values[mask]
+        if len(series) == 0:
+            return None
+        return series, days, values
+
+    def _decode(self, series: np.ndarray) -> tuple:
+        patients = [self._patient_ids[c] for c in (series >> _METRIC_BITS).tolist()]
+        metrics = [self._metric_names[c] for c in (series & ((1 << _METRIC_BITS) - 1)).tolist()]
+        return patients, metrics
+
+    def trends(self, metric: Optional[str] = None, patient_id: Optional[str] = None,
+               since=None, min_points: int = 2) -> Dict[str, Any]:
+        """
+        One row per (patient, metric) series with at least min_points observations:
+        patient, metric, n, first, last, pct_change and slope_per_year (least squares).
+        Returned as a dict of equal-length columns.
+        """
+        empty = {k: [] for k in ("patient", "metric", "n", "first", "last", "pct_change", "slope_per_year")}
+        selected = self._select(metric, patient_id, since)
+        if selected is None:
+            return empty
+        series, days, values = selected
+
+        starts = np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+        ends = np.r_[starts[1:], len(series)]
+        n = ends - starts
+        keep = n >= min_points
+        if not keep.any():
+            return empty
+
+        # centre time on each series' first observation to keep the sums well conditioned
+        t = (days - np.repeat(days[starts], n)) / 365.25
+        st = np.add.reduceat(t, starts)
+        sv = np.add.reduceat(values, starts)
+        stt = np.add.reduceat(t * t, starts)
+        stv = np.add.reduceat(t * values, starts)
+        denom = n * stt - st * st
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(denom > 0, (n * stv - st * sv) / denom, 0.0)
+            first_v = values[starts]
+            last_v = values[ends - 1]
+            pct = np.where(first_v != 0, (last_v - first_v) / first_v * 100.0, np.nan)
+
+        patients, metrics = self._decode(series[starts][keep])
+        return {
+            "patient": patients,
+            "metric": metrics,
+            "n": n[keep],
+            "first": first_v[keep],
+            "last": last_v[keep],
+            "pct_change": pct[keep],
+            "slope_per_year": slope[keep],
+        }
+
+    def crossings(self, metric: str, threshold: float, direction: str = "up",
+                  patient_id: Optional[str] = None, since=None) -> Dict[str, Any]:
+        """Observations where a series moves across threshold ("up": from below to at/above; "down": the reverse)."""
+        empty = {"patient": [], "metric": [], "date": [], "previous": [], "value": []}
+        selected = self._select(metric, patient_id, since)
+        if selected is None:
+            return empty
+        series, days, values = selected
+        same = series[1:] == series[:-1]
+        prev, cur = values[:-1], values[1:]
+        if direction == "up":
+            hit = same & (prev < threshold) & (cur >= threshold)
+        else:
+            hit = same & (prev >= threshold) & (cur < threshold)
+        idx = np.flatnonzero(hit) + 1
+        patients, metrics = self._decode(series[idx])
+        epoch = datetime.date(1970, 1, 1).toordinal()
+        return {
+            "patient": patients,
+            "metric": metrics,
+            "date": [datetime.date.fromordinal(int(d) + epoch).isoformat() for d in days[idx]],
+            "previous": values[idx - 1],
+            "value": values[idx],
+        }
+
+    def history(self, patient_id: str, metric: str) -> Dict[str, Any]:
+        selected = self._select(metric, patient_id, None)
+        if selected is None:
+            return {"date": [], "value": np.empty(0)}
+        _, days, values = selected
+        epoch = datetime.date(1970, 1, 1).toordinal()
+        return {"date": [datetime.date.fromordinal(int(d) + epoch).isoformat() for d in days], "value": values}
+
+    def to_frame(self):
+        """All rows as a pandas DataFrame (patient, metric, date, value)."""
+        import pandas as pd
+
+        self._flush(compact=True)
+        series = self._keys >> _DAY_BITS
+        days = (self._keys & ((1 << _DAY_BITS) - 1)) - _DAY_OFFSET
+        patients, metrics = self._decode(series)
+        return pd.DataFrame({
+            "patient": patients,
+            "metric": metrics,
+            "date": pd.to_datetime(days, unit="D"),
+            "value": self._values,
+        })
+
+    def save(self, path: str):
+        self._flush(compact=True)
+        np.savez_compressed(
+            store_path(path),
+            keys=self._keys,
+            values=self._values,
+            patients=np.asarray(self._patient_ids, dtype=str),
+            metrics=np.asarray(self._metric_names, dtype=str),
+        )
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(store_path(path))
+
+    @classmethod
+    def load(cls, path: str) -> "MetricStore":
+        store = cls()
+        with np.load(store_path(path)) as data:
+            store._keys = data["keys"]
+            store._values = data["values"]
+            store._patient_ids = [str(p) for p in data["patients"]]
+            store._metric_names = [str(m) for m in data["metrics"]]
+        store._patients = {p: i for i, p in enumerate(store._patient_ids)}
+        store._metrics = {m: i for i, m in enumerate(store._metric_names)}
+        return store
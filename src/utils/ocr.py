@@ -0,0 +1,128 @@
+"""
+OCR fallback
+- Only pages with no text layer that do contain images are rasterised and OCR'd.
+- OCR runs on a bounded thread pool (tesseract is a subprocess, so threads parallelise it);
+  at most a few rendered pages are held in memory at once.
+- Results are cached per (document hash, page number, dpi, language) and looked up before
+  the page is rendered, so a cached page costs neither rasterisation nor OCR.
+- Per-page timings are returned so the pool can be sized.
+Needs pytesseract, pillow and the tesseract binary; without them OCR reports itself unavailable.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from .cache import get_default_cache, hash_bytes, hash_file
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # optional dependency
+    pytesseract = None
+    Image = None
+
+OCR_DPI = 300
+OCR_LANG = "eng"
+
+_UNKNOWN = object()
+_tesseract_version: Any = _UNKNOWN
+
+def tesseract_version() -> Optional[str]:
+    """Installed tesseract version, or None when OCR is unavailable."""
+    global _tesseract_version
+    if _tesseract_version is _UNKNOWN:
+        if pytesseract is None:
+            _tesseract_version = None
+        else:
+            try:
+                _tesseract_version = str(pytesseract.get_tesseract_version())
+            except Exception:
+                _tesseract_version = None
+    return _tesseract_version
+
+def ocr_available() -> bool:
+    return tesseract_version() is not None
+
+def needs_ocr(page, text: str) -> bool:
+    """A page needs OCR when it has no text layer but carries at least one image."""
+    return not text.strip() and bool(page.get_images(full=False))
+
+def document_hash(doc) -> str:
+    """Content hash of an open fitz document (of its file when it was opened from a path)."""
+    if doc.name and os.path.isfile(doc.name):
+        return hash_file(doc.name)
+    return hash_bytes(doc.tobytes())
+
+def _render(page, dpi: int) -> Tuple[int, int, bytes]:
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return pix.width, pix.height, pix.samples
+
+def _ocr_image(width: int, height: int, samples: bytes, lang: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    image = Image.frombytes("L", (width, height), samples)
+    text = pytesseract.image_to_string(image, lang=lang)
+    return text, time.perf_counter() - started
+
+def ocr_page(page, dpi: int = OCR_DPI, lang: str = OCR_LANG, cache=True, doc_hash: Optional[str] = None) -> str:
+    """OCR a single page inline (used by the streaming extractor)."""
+    texts, _ = ocr_pages(page.parent, [page.number], workers=1, cache=cache, dpi=dpi, lang=lang,
+                         doc_hash=doc_hash)
+    return texts.get(page.number, "")
+
+def ocr_pages(doc, page_numbers: Iterable[int], workers: Optional[int] = None, cache=True,
+              dpi: int = OCR_DPI, lang: str = OCR_LANG,
+              doc_hash: Optional[str] = None) -> Tuple[Dict[int, str], List[Dict[str, Any]]]:
+    """
+    OCR the given pages of an open fitz document.
+    doc_hash is the document's content hash for the cache key; callers that already know it
+    (e.g. the extractor, which hashed the source) pass it to avoid hashing the file again.
+    Returns ({page_number: text}, [per-page timing dicts]).
+    """
+    if not ocr_available():
+        raise RuntimeError("OCR requested but pytesseract/tesseract is not installed")
+    if workers is None or workers == 0:
+        workers = min(4, os.cpu_count() or 1)
+    store = get_default_cache() if cache is True else (cache or None)
+    namespace = f"ocr:{tesseract_version()}:{lang}:{dpi}"
+    if store is not None and doc_hash is None:
+        doc_hash = document_hash(doc)
+
+    texts: Dict[int, str] = {}
+    timings: List[Dict[str, Any]] = []
+    # bounds how many rendered pages wait in memory for a worker
+    slots = threading.BoundedSemaphore(workers * 2)
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for pno in page_numbers:
+            key = f"{doc_hash}:{pno}"
+            cached = store.get_text(namespace, key) if store is not None else None
+            if cached is not None:
+                texts[pno] = cached
+                timings.append({"page": pno, "render_s": 0.0, "ocr_s": 0.0, "cached": True})
+                continue
+
+            started = time.perf_counter()
+            width, height, samples = _render(doc[pno], dpi)
+            timing = {"page": pno, "render_s": round(time.perf_counter() - started, 4)}
+
+            slots.acquire()
+            future = pool.submit(_ocr_image, width, height, samples, lang)
+            future.add_done_callback(lambda _: slots.release())
+            pending.append((pno, key, timing, future))
+            del samples
+
+        for pno, key, timing, future in pending:
+            text, seconds = future.result()
+            texts[pno] = text
+            timing.update(ocr_s=round(seconds, 4), cached=False)
+            timings.append(timing)
+            if store is not None:
+                store.put_text(namespace, key, text)
+
+    timings.sort(key=lambda t: t["page"])
+    return texts, timings
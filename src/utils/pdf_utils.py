@@ -1,8 +1,150 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(path):
-    doc = fitz.open(path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
\ No newline at end of file
+from .cache import get_default_cache, hash_bytes, hash_file
+from .layout import page_text
+from .ocr import needs_ocr, ocr_available, ocr_page, ocr_pages, tesseract_version
+
+# extracted text depends on the decoder, so the PyMuPDF version is part of the key
+_CACHE_NAMESPACE = f"pdf_pages:{fitz.VersionBind}"
+
+# below this many pages process start-up costs more than it saves
+PARALLEL_MIN_PAGES = 64
+
+def open_pdf(source):
+    """Open a PDF from a path or from in-memory bytes (e.g. an upload) without touching disk."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def _source_hash(source) -> str:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hash_bytes(source)
+    return hash_file(source)
+
+def _use_ocr(ocr) -> bool:
+    """ocr may be True (required), False, or "auto" (only when tesseract is installed)."""
+    if ocr == "auto":
+        return ocr_available()
+    if ocr and not ocr_available():
+        raise RuntimeError("OCR requested but pytesseract/tesseract is not installed")
+    return bool(ocr)
+
+def iter_pages(source, pages: Optional[Iterable[int]] = None, ocr=False,
+               layout=False, cache=True) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) one page at a time; page numbers are 0-based.
+    source is a file path or the PDF's bytes.
+    pages limits extraction to those page numbers (e.g. range(10, 20)); out-of-range numbers are skipped.
+    With ocr enabled, image-only pages are OCR'd inline (results cached unless cache is None/False).
+    layout=True rebuilds each page row by row from its word boxes (see layout.page_text),
+    keeping lab table rows together.
+    The document is closed as soon as the generator finishes or is closed.
+    """
+    use_ocr = _use_ocr(ocr)
+    doc_hash = None  # hashed on the first page that needs OCR
+    with open_pdf(source) as doc:
+        numbers = range(doc.page_count) if pages is None else pages
+        for pno in numbers:
+            if 0 <= pno < doc.page_count:
+                page = doc[pno]
+                text = page_text(page) if layout else page.get_text()
+                if use_ocr and needs_ocr(page, text):
+                    if doc_hash is None and cache:
+                        doc_hash = _source_hash(source)
+                    text = ocr_page(page, cache=cache, doc_hash=doc_hash)
+                yield pno, text
+
+def _extract_range(args):
+    source, start, stop, layout = args
+    # each worker opens its own document; fitz handles are not shareable across processes
+    return [text for _, text in iter_pages(source, range(start, stop), layout=layout)]
+
+def _process_context():
+    # extraction runs inside pipeline threads; fork()ing a threaded process can deadlock the children
+    # on locks other threads held, so workers start from a clean server process (or spawn) instead
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])  # the server imports PyMuPDF once, its children inherit it
+    return ctx
+
+def _extract_pages(source, workers=1, layout=False) -> List[str]:
+    if workers is None or workers == 0:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        with open_pdf(source) as doc:
+            page_count = doc.page_count
+        if page_count >= PARALLEL_MIN_PAGES:
+            workers = min(workers, page_count // (PARALLEL_MIN_PAGES // 4))
+            # a few chunks per worker evens out pages that are slower to decode;
+            # in-memory PDFs are copied to every chunk, so they get one chunk per worker
+            n_chunks = workers if isinstance(source, (bytes, bytearray, memoryview)) else workers * 4
+            step = -(-page_count // n_chunks)
+            chunks = [(source, start, min(start + step, page_count), layout)
+                      for start in range(0, page_count, step)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_process_context()) as pool:
+                return [text for chunk in pool.map(_extract_range, chunks) for text in chunk]
+    return [text for _, text in iter_pages(source, layout=layout)]
+
+def _extract(source, workers=1, ocr=False, ocr_workers=None, layout=False, cache=True,
+             doc_hash: Optional[str] = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    page_texts = _extract_pages(source, workers, layout)
+    timings: List[Dict[str, Any]] = []
+    blank = [pno for pno, text in enumerate(page_texts) if not text.strip()]
+    if ocr and blank:
+        with open_pdf(source) as doc:
+            # only pages with no text layer but with images are worth OCR'ing
+            targets = [pno for pno in blank if needs_ocr(doc[pno], page_texts[pno])]
+            if targets:
+                if doc_hash is None and cache:
+                    doc_hash = _source_hash(source)
+                ocr_texts, timings = ocr_pages(doc, targets, workers=ocr_workers, cache=cache, doc_hash=doc_hash)
+                for pno, text in ocr_texts.items():
+                    page_texts[pno] = text
+    return page_texts, timings
+
+def extract_pages_with_ocr_timings(source, cache=True, workers=1, ocr="auto", ocr_workers=None,
+                                   layout=False) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Like extract_text_from_pdf but returns the text of each page separately, plus per-page
+    OCR timings ([] when no page needed OCR or the text came from the cache).
+    cache=True uses the shared on-disk cache (for the page text and OCR results), a DiskCache
+    uses that instance, None/False writes nothing to disk.
+    """
+    use_ocr = _use_ocr(ocr)
+    store = get_default_cache() if cache is True else (cache or None)
+    if store is None:
+        return _extract(source, workers, use_ocr, ocr_workers, layout, cache=None)
+
+    # OCR'd and layout text differ from the bare text layer, so they are cached separately
+    namespace = f"{_CACHE_NAMESPACE}:ocr={tesseract_version() if use_ocr else 'off'}"
+    if layout:
+        namespace += ":layout"
+    key = _source_hash(source)
+    cached = store.get_text(namespace, key)
+    if cached is not None:
+        return json.loads(cached), []
+    page_texts, timings = _extract(source, workers, use_ocr, ocr_workers, layout, cache=store, doc_hash=key)
+    store.put_text(namespace, key, json.dumps(page_texts, ensure_ascii=False))
+    return page_texts, timings
+
+def extract_text_from_pdf(path, cache=True, workers=1, ocr="auto", layout=False):
+    """
+    Return the text of every page in the PDF; path may also be the PDF's bytes.
+    cache=True uses the shared on-disk cache, a DiskCache uses that instance, None/False disables it.
+    workers > 1 (0/None = all cores) splits documents of PARALLEL_MIN_PAGES or more pages
+    across processes; smaller documents are always extracted serially.
+    ocr="auto" OCRs image-only pages when tesseract is installed; True requires it, False disables it.
+    layout=True returns the row-by-row layout text instead of PyMuPDF's plain text.
+    """
+    return "".join(extract_pages_with_ocr_timings(path, cache, workers, ocr, layout=layout)[0])
+
+def cache_stats():
+    store = get_default_cache()
+    return store.stats() if store is not None else None
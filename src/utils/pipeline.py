@@ -0,0 +1,151 @@
+"""
+Pipeline engine
+- Stages declare the names of the results they need; a stage starts as soon as all of
+  its inputs exist, so independent stages (the analysis agents) run concurrently.
+- Each stage is isolated like safe_call: an exception or a timeout becomes {"_error": ...}
+  in that stage's result and never stops the others.
+- Runs on a thread pool by default (shared per process); any concurrent.futures executor can be passed.
+- A timed-out stage keeps its thread until it returns (threads cannot be killed). Once ABANDON_LIMIT
+  of them are stuck on the shared pool it is replaced by a fresh one, so new stages are not starved;
+  while MAX_ABANDONED are still running in the process, new stages are refused with an error
+  instead of piling up more threads.
+- Every stage is measured (wall/CPU time, errors, traced memory) and reported into a Metrics
+  aggregate; run() can also hand back the per-stage records of that run.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .instrumentation import Metrics, default_metrics, measure, timeout_record
+
+class Stage:
+    def __init__(self, name: str, fn: Optional[Callable[..., Any]], inputs: Iterable[str] = (),
+                 timeout: Optional[float] = None, kwargs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.timeout = timeout
+        self.kwargs = kwargs or {}
+
+def _guarded(fn: Callable[..., Any], args: List[Any], kwargs: Dict[str, Any]) -> Any:
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        return {"_error": f"{e}"}
+
+def _call(fn: Callable[..., Any], args: List[Any], kwargs: Dict[str, Any]) -> tuple:
+    return measure(_guarded, fn, args, kwargs)
+
+# timed-out stages still running on the shared pool before it is replaced, and in the whole process
+# before new stages are refused
+ABANDON_LIMIT = 8
+MAX_ABANDONED = 64
+
+_shared: Optional[ThreadPoolExecutor] = None
+_shared_pid: Optional[int] = None
+_shared_lock = threading.Lock()
+# future of a timed-out stage that is still running -> the executor running it
+_abandoned: Dict[Future, Executor] = {}
+
+def shared_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool, recreated after fork() and once ABANDON_LIMIT timed-out stages hold its threads."""
+    global _shared, _shared_pid
+    with _shared_lock:
+        if _shared_pid != os.getpid():
+            _shared = None
+            _abandoned.clear()
+        elif _shared is not None and sum(e is _shared for e in _abandoned.values()) >= ABANDON_LIMIT:
+            _shared.shutdown(wait=False)  # its stuck threads exit when their stages return
+            _shared = None
+        if _shared is None:
+            _shared = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 8),
+                                         thread_name_prefix="pipeline")
+            _shared_pid = os.getpid()
+        return _shared
+
+def _abandon(future: Future, executor: Executor):
+    with _shared_lock:
+        _abandoned[future] = executor
+    future.add_done_callback(_forget)  # runs at once if the stage finished in the meantime
+
+def _forget(future: Future):
+    with _shared_lock:
+        _abandoned.pop(future, None)
+
+def abandoned_stages() -> int:
+    """Timed-out stages whose threads are still running."""
+    with _shared_lock:
+        return len(_abandoned)
+
+class Pipeline:
+    def __init__(self, stages: Iterable[Stage], executor: Optional[Executor] = None,
+                 metrics: Optional[Metrics] = None):
+        self.stages = list(stages)
+        self.executor = executor
+        self.metrics = metrics
+        names = {s.name for s in self.stages}
+        if len(names) != len(self.stages):
+            raise ValueError("duplicate stage names")
+
+    def run(self, initial: Optional[Dict[str, Any]] = None,
+            stats: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Run every stage once; initial seeds results that stages may take as inputs.
+        Returns {name: result} for initial values and all stages. Stages whose inputs can
+        never be produced get {"_error": "missing inputs: ..."}.
+        If a stats dict is given it is filled with {name: measurement} for every executed stage.
+        """
+        executor = self.executor or shared_executor()
+        metrics = self.metrics or default_metrics()
+        stats = {} if stats is None else stats
+        results: Dict[str, Any] = dict(initial or {})
+        waiting = [s for s in self.stages if s.name not in results]
+        running: Dict[Any, tuple] = {}  # future -> (stage, deadline)
+
+        while waiting or running:
+            ready = [s for s in waiting if all(i in results for i in s.inputs)]
+            for stage in ready:
+                waiting.remove(stage)
+                if stage.fn is None:
+                    results[stage.name] = None
+                    continue
+                if abandoned_stages() >= MAX_ABANDONED:
+                    results[stage.name] = {"_error": f"refused: {MAX_ABANDONED} timed-out stages are still running"}
+                    stats[stage.name] = {"wall_s": 0.0, "cpu_s": 0.0, "error": True}
+                    continue
+                args = [results[i] for i in stage.inputs]
+                future = executor.submit(_call, stage.fn, args, stage.kwargs)
+                deadline = time.monotonic() + stage.timeout if stage.timeout else None
+                running[future] = (stage, deadline)
+            if ready and any(s.name in results for s in ready):
+                # a skipped or refused stage may unblock others without anything running
+                continue
+
+            if not running:
+                for stage in waiting:
+                    missing = [i for i in stage.inputs if i not in results]
+                    results[stage.name] = {"_error": f"missing inputs: {', '.join(missing)}"}
+                break
+
+            deadlines = [d for _, d in running.values() if d is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, _ = running.pop(future)
+                results[stage.name], stats[stage.name] = future.result()
+
+            now = time.monotonic()
+            for future, (stage, deadline) in list(running.items()):
+                if deadline is not None and now >= deadline and not future.done():
+                    # the worker thread cannot be killed; its late result is discarded
+                    if not future.cancel():
+                        _abandon(future, executor)
+                    running.pop(future)
+                    results[stage.name] = {"_error": f"timed out after {stage.timeout}s"}
+                    stats[stage.name] = timeout_record(stage.timeout)
+
+        metrics.observe_all(stats)
+        return results
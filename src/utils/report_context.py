@@ -0,0 +1,163 @@
+"""
+Report context
+- Built once per parsed report and shared by every agent.
+- Holds the lower-cased text (computed once) and memoises keyword lookups: the first ask for a
+  keyword is one `keyword in text` substring scan, later asks from any agent reuse its answer.
+  The text is not indexed; a report costs one scan per distinct keyword asked for.
+- Exposes the report's structured lab values, extracted once.
+- Can also be built from a page stream without keeping the text: each registered keyword is
+  then scanned for page by page until found, and only the hits and lab values are retained.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .lab_values import LabRecord, extract_lab_values, first
+from .layout import table_lines
+
+# characters of the report kept for agents that need a little raw text in streamed mode
+HEAD_CHARS = 4096
+
+# Keywords agents query; streamed contexts can only answer for these
+_KEYWORDS: Set[str] = set()
+
+def register_keywords(*keywords: str):
+    _KEYWORDS.update(k.lower() for k in keywords)
+
+def registered_keywords() -> Set[str]:
+    return set(_KEYWORDS)
+
+def _as_records(labs) -> Optional[List[LabRecord]]:
+    # labs that went through JSON come back as plain lists
+    if labs is None:
+        return None
+    return [rec if isinstance(rec, LabRecord) else LabRecord(*rec) for rec in labs]
+
+class ReportContext:
+    def __init__(self, text: str, labs: Optional[List[LabRecord]] = None):
+        self.text = text or ""
+        self.head = self.text[:HEAD_CHARS]
+        self.streamed = False
+        self.page_count = None
+        self._lower = None
+        self._labs = _as_records(labs)
+        self._hits: Dict[str, bool] = {}
+        self._digest: Optional[str] = None
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Tuple[int, str]], keep_text: bool = False,
+                   layout: bool = False) -> "ReportContext":
+        """
+        Build a context from (page_number, text) pairs, holding one page at a time.
+        With keep_text=False only keyword hits, lab values and the first HEAD_CHARS characters are kept.
+        layout=True when the pages are layout text (lab tables are then read column-wise).
+        """
+        keywords = registered_keywords()
+        pending = set(keywords)
+        hits: Dict[str, bool] = {k: False for k in keywords}
+        # tail of the previous page so keywords spanning a page break are still found
+        overlap = max((len(k) for k in keywords), default=1) - 1
+        carry = ""
+        head = ""
+        kept = []
+        labs: List[LabRecord] = []
+        count = 0
+        for pno, page_text in pages:
+            count += 1
+            labs.extend(extract_lab_values(table_lines(page_text) if layout else page_text, page=pno))
+            if len(head) < HEAD_CHARS:
+                head += page_text[:HEAD_CHARS - len(head)]
+            if keep_text:
+                kept.append(page_text)
+            window = carry + page_text.lower()
+            found = {k for k in pending if k in window}
+            for k in found:
+                hits[k] = True
+            pending -= found
+            carry = window[-overlap:] if overlap else ""
+
+        ctx = cls("".join(kept), labs)
+        ctx.head = head
+        ctx.page_count = count
+        ctx._hits = hits
+        ctx.streamed = not keep_text
+        return ctx
+
+    @property
+    def lower(self) -> str:
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def digest(self) -> str:
+        """Content hash of everything agents can see: text, lab values and, when streamed, head and hits."""
+        if self._digest is None:
+            h = hashlib.sha256(self.text.encode("utf-8", "surrogatepass"))
+            h.update(repr(self.labs).encode("utf-8"))
+            if self.streamed:
+                h.update(self.head.encode("utf-8", "surrogatepass"))
+                h.update(repr(sorted(self._hits.items())).encode("utf-8"))
+            self._digest = h.hexdigest()
+        return self._digest
+
+    @property
+    def labs(self) -> List[LabRecord]:
+        if self._labs is None:
+            self._labs = extract_lab_values(self.text)
+        return self._labs
+
+    def lab(self, analyte: str) -> Optional[LabRecord]:
+        """First record for analyte in report order, or None."""
+        return first(self.labs, analyte)
+
+    def has(self, keyword: str) -> bool:
+        """Same semantics as `keyword in text.lower()`; keyword must be lower-case."""
+        hit = self._hits.get(keyword)
+        if hit is None:
+            if self.streamed:
+                raise LookupError(f"keyword {keyword!r} was not registered before the report was streamed")
+            hit = keyword in self.lower
+            self._hits[keyword] = hit
+        return hit
+
+    def any(self, *keywords: str) -> bool:
+        return any(self.has(k) for k in keywords)
+
+class ParsedReport(dict):
+    """Plain report dict (JSON-serialisable as before) that also carries its ReportContext."""
+
+    @classmethod
+    def from_context(cls, ctx: ReportContext, **data) -> "ParsedReport":
+        report = cls(**data)
+        report.__dict__["_context"] = ctx
+        return report
+
+    @property
+    def context(self) -> ReportContext:
+        ctx = self.__dict__.get("_context")
+        if ctx is None or not (ctx.streamed or ctx.text is (self.get("raw_text") or "")):
+            ctx = ReportContext(self.get("raw_text") or "", self.get("labs"))
+            self.__dict__["_context"] = ctx
+        return ctx
+
+    def __reduce__(self):
+        # ship the data between processes; a streamed context has no text to rebuild from
+        ctx = self.__dict__.get("_context")
+        if ctx is not None and ctx.streamed:
+            return (_rebuild_streamed, (dict(self), ctx.head, ctx.page_count, ctx._hits))
+        return (self.__class__, (dict(self),))
+
+def _rebuild_streamed(data, head, page_count, hits) -> ParsedReport:
+    ctx = ReportContext("", data.get("labs"))
+    ctx.head = head
+    ctx.page_count = page_count
+    ctx._hits = hits
+    ctx.streamed = True
+    return ParsedReport.from_context(ctx, **data)
+
+def get_context(report_data: Dict[str, Any]) -> ReportContext:
+    """Context for any report dict; plain dicts get a fresh one."""
+    if isinstance(report_data, ParsedReport):
+        return report_data.context
+    return ReportContext(report_data.get("raw_text", "") or "", report_data.get("labs"))
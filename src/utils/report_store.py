@@ -0,0 +1,205 @@
+"""
+Report store
+- Persists analysed reports in a local SQLite database: one row per report with its scores,
+  BMI, water estimate and error count in indexed columns, the agents' output as JSON, one row
+  per raised flag and per lab value, and the extracted text in an FTS5 full-text index.
+- "All reports mentioning HbA1c with stress_score < 50" is then a single indexed query:
+    store.search("hba1c", where="stress_score < ?", params=(50,))
+- Writes are buffered and flushed batch_size reports per transaction (WAL journal), so a batch
+  run does not wait on the database for every report. Re-adding a report path replaces it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_BATCH_SIZE = 500
+
+# (column, SQL type, path into the analyze_report result)
+_COLUMNS = [
+    ("page_count", "INTEGER", ("extracted", "page_count")),
+    ("sleep_score", "INTEGER", ("sleep", "sleep_score")),
+    ("stress_score", "INTEGER", ("stress", "stress_score")),
+    ("bmi", "REAL", ("diet", "bmi")),
+    ("bmi_category", "TEXT", ("diet", "bmi_category")),
+    ("recommended_daily_ml", "INTEGER", ("hydration", "recommended_daily_ml")),
+]
+
+# section key -> key of its flag list
+_FLAG_LISTS = {"sleep": "sleep_flags", "stress": "stress_flags", "diet": "flags", "hydration": "flags"}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    report_path TEXT NOT NULL UNIQUE,
+    analyzed_at REAL NOT NULL,
+    {"".join(f"{name} {kind}, " for name, kind, _ in _COLUMNS)}
+    error_count INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+{"".join(f"CREATE INDEX IF NOT EXISTS reports_{name} ON reports ({name});" for name, _, _ in _COLUMNS)}
+CREATE TABLE IF NOT EXISTS report_flags (
+    report_id INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    flag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS report_flags_flag ON report_flags (flag, report_id);
+CREATE INDEX IF NOT EXISTS report_flags_report ON report_flags (report_id);
+CREATE TABLE IF NOT EXISTS report_labs (
+    report_id INTEGER NOT NULL,
+    analyte TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT,
+    ref_low REAL,
+    ref_high REAL,
+    page INTEGER
+);
+CREATE INDEX IF NOT EXISTS report_labs_analyte ON report_labs (analyte, value);
+CREATE INDEX IF NOT EXISTS report_labs_report ON report_labs (report_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5 (text, tokenize = 'unicode61');
+"""
+
+_SELECT = "r.id, r.report_path, r.analyzed_at, " + ", ".join(f"r.{name}" for name, _, _ in _COLUMNS) + ", r.error_count"
+
+def _lookup(result: Dict[str, Any], path) -> Any:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def _error_count(result: Dict[str, Any]) -> int:
+    return ("_error" in result) + sum(isinstance(v, dict) and "_error" in v for v in result.values())
+
+class ReportStore:
+    """
+    Usage:
+      with ReportStore("reports.sqlite3") as store:
+          for result in results:
+              store.add(result)
+      rows = ReportStore("reports.sqlite3").search("hba1c", where="stress_score < ?", params=(50,))
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, result: Dict[str, Any]):
+        """Queue one analyze_report result; written with the next flush (every batch_size reports)."""
+        with self._lock:
+            self._pending.append(result)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            # a path added twice in one batch keeps its last result
+            by_path = {str(r.get("report_path")): r for r in pending}
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(conn, by_path)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _write(self, conn: sqlite3.Connection, by_path: Dict[str, Dict[str, Any]]):
+        paths = [(p,) for p in by_path]
+        for table, column in (("report_flags", "report_id"), ("report_labs", "report_id"), ("reports_fts", "rowid")):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE {column} = (SELECT id FROM reports WHERE report_path = ?)", paths)
+        conn.executemany("DELETE FROM reports WHERE report_path = ?", paths)
+
+        now = time.time()
+        insert = (f"INSERT INTO reports (report_path, analyzed_at, {', '.join(n for n, _, _ in _COLUMNS)}, "
+                  f"error_count, result) VALUES ({', '.join('?' * (len(_COLUMNS) + 4))})")
+        texts, flags, labs = [], [], []
+        for path, result in by_path.items():
+            extracted = result.get("extracted") if isinstance(result.get("extracted"), dict) else {}
+            sections = {k: v for k, v in result.items() if k not in ("extracted", "metrics", "report_path")}
+            row_id = conn.execute(insert, (
+                path, now, *(_lookup(result, p) for _, _, p in _COLUMNS), _error_count(result),
+                json.dumps(sections, ensure_ascii=False),
+            )).lastrowid
+            # streamed reports keep no raw text; they are still found by their columns, flags and labs
+            texts.append((row_id, extracted.get("raw_text") or ""))
+            for section, key in _FLAG_LISTS.items():
+                for flag in _lookup(result, (section, key)) or []:
+                    flags.append((row_id, section, flag))
+            for rec in extracted.get("labs") or []:
+                rec = list(rec) + [None] * (6 - len(rec))
+                labs.append((row_id, *rec[:6]))
+        conn.executemany("INSERT INTO reports_fts (rowid, text) VALUES (?, ?)", texts)
+        conn.executemany("INSERT INTO report_flags (report_id, section, flag) VALUES (?, ?, ?)", flags)
+        conn.executemany("INSERT INTO report_labs (report_id, analyte, value, unit, ref_low, ref_high, page) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", labs)
+
+    def search(self, text: Optional[str] = None, where: Optional[str] = None, params: Sequence[Any] = (),
+               flags: Iterable[str] = (), limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+        """
+        Reports matching every given filter:
+        - text: FTS5 query over the extracted text ("hba1c", "blood NEAR pressure", "fatigue OR tired");
+          results are ranked by relevance and carry a "snippet"
+        - where: SQL condition on the report columns (stress_score, sleep_score, bmi, ...) with params
+        - flags: flags the report must have raised (any section)
+        """
+        self.flush()
+        sql = f"SELECT {_SELECT}"
+        args: List[Any] = []
+        if text:
+            sql += (", snippet(reports_fts, 0, '[', ']', '…', 12) AS snippet"
+                    " FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid WHERE reports_fts MATCH ?")
+            args.append(text)
+        else:
+            sql += " FROM reports r WHERE 1"
+        for flag in flags:
+            sql += " AND r.id IN (SELECT report_id FROM report_flags WHERE flag = ?)"
+            args.append(flag)
+        if where:
+            sql += f" AND ({where})"
+            args.extend(params)
+        sql += " ORDER BY reports_fts.rank" if text else " ORDER BY r.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, args)]
+
+    def get(self, report_path: str) -> Optional[Dict[str, Any]]:
+        """The stored agent output of a report (as analyze_report returned it, without text and metrics)."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM reports WHERE report_path = ?", (report_path,)).fetchone()
+        return json.loads(row["result"]) if row else None
+
+    def count(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self) -> "ReportStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
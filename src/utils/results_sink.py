@@ -0,0 +1,189 @@
+"""
+Columnar results sink
+- Flattens each analyze_report result into one row of scalar columns: errors, timings, scores,
+  BMI, water estimate, flags (joined with "|") and the first value of every lab analyte.
+- Rows are buffered as column chunks and flushed every chunk_rows reports:
+  Parquet (one row group per chunk, zstd) when pyarrow is installed, otherwise compressed
+  NPZ or gzipped CSV part files in a directory.
+- The schema is fixed up front, so every chunk and every part file has the same columns.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .lab_values import ANALYTES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+DEFAULT_CHUNK_ROWS = 10000
+
+# (column, kind, path into the result); kind is "str", "int" or "float"
+_FIELDS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("report_path", "str", ("report_path",)),
+    ("elapsed_s", "float", ("elapsed_s",)),
+    ("wall_s", "float", ("metrics", "wall_s")),
+    ("page_count", "int", ("extracted", "page_count")),
+    ("sleep_score", "int", ("sleep", "sleep_score")),
+    ("stress_score", "int", ("stress", "stress_score")),
+    ("bmi", "float", ("diet", "bmi")),
+    ("bmi_category", "str", ("diet", "bmi_category")),
+    ("recommended_daily_ml", "int", ("hydration", "recommended_daily_ml")),
+    ("sleep_flags", "str", ("sleep", "sleep_flags")),
+    ("stress_flags", "str", ("stress", "stress_flags")),
+    ("diet_flags", "str", ("diet", "flags")),
+    ("hydration_flags", "str", ("hydration", "flags")),
+]
+
+def parquet_available() -> bool:
+    return pa is not None
+
+def _lookup(result: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    if isinstance(value, list):
+        return "|".join(str(v) for v in value)
+    return value
+
+def _errors(result: Dict[str, Any]) -> List[str]:
+    errors = [f"report: {result['_error']}"] if "_error" in result else []
+    for key, value in result.items():
+        if isinstance(value, dict) and "_error" in value:
+            errors.append(f"{key}: {value['_error']}")
+    return errors
+
+class ResultsWriter:
+    """
+    Usage:
+      with ResultsWriter("results.parquet", stages=["parse_report", ...]) as sink:
+          for result in results:
+              sink.add(result)
+    fmt is "parquet", "npz" or "csv" (default: parquet when pyarrow is installed, else npz).
+    For npz/csv, path is a directory that receives part-00000.npz/.csv.gz files.
+    stages names the per-stage timing columns (t_<stage>_s); by default those of the first result.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 stages: Optional[Iterable[str]] = None):
+        if fmt is None:
+            fmt = "parquet" if parquet_available() else "npz"
+        if fmt == "parquet" and not parquet_available():
+            raise RuntimeError("Parquet output needs pyarrow; use fmt='npz' or 'csv'")
+        if fmt not in ("parquet", "npz", "csv"):
+            raise ValueError(f"unknown results format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._stages = list(stages) if stages is not None else None
+        self._columns: Optional[List[Tuple[str, str]]] = None
+        self._buffer: Dict[str, list] = {}
+        self._parts = 0
+        self._parquet = None
+
+    def _init_columns(self, result: Dict[str, Any]):
+        if self._stages is None:
+            self._stages = sorted((result.get("metrics") or {}).get("stages", {}))
+        self._columns = (
+            [(name, kind) for name, kind, _ in _FIELDS]
+            + [("error", "str"), ("error_count", "int")]
+            + [(f"lab_{a}", "float") for a in ANALYTES]
+            + [(f"t_{s}_s", "float") for s in self._stages]
+        )
+        self._buffer = {name: [] for name, _ in self._columns}
+
+    def add(self, result: Dict[str, Any]):
+        if self._columns is None:
+            self._init_columns(result)
+        row = {name: _lookup(result, path) for name, _, path in _FIELDS}
+        errors = _errors(result)
+        row["error"] = "; ".join(errors) if errors else None
+        row["error_count"] = len(errors)
+
+        extracted = result.get("extracted")
+        labs = extracted.get("labs") if isinstance(extracted, dict) else None
+        for rec in labs or []:
+            key = f"lab_{rec[0]}"
+            if key in self._buffer and row.get(key) is None:
+                row[key] = rec[1]
+
+        stage_stats = (result.get("metrics") or {}).get("stages", {})
+        for stage in self._stages:
+            row[f"t_{stage}_s"] = (stage_stats.get(stage) or {}).get("wall_s")
+
+        for name, _ in self._columns:
+            self._buffer[name].append(row.get(name))
+        self.rows += 1
+        if len(self._buffer["report_path"]) >= self.chunk_rows:
+            self.flush()
+
+    def _numpy_columns(self) -> Dict[str, np.ndarray]:
+        arrays = {}
+        for name, kind in self._columns:
+            values = self._buffer[name]
+            if kind == "str":
+                arrays[name] = np.asarray(["" if v is None else str(v) for v in values], dtype=str)
+            else:
+                # missing numbers become NaN so int and float columns share one representation
+                arrays[name] = np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+        return arrays
+
+    def flush(self):
+        if not self._columns or not self._buffer["report_path"]:
+            return
+        if self.fmt == "parquet":
+            types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+            schema = pa.schema([(name, types[kind]) for name, kind in self._columns])
+            table = pa.Table.from_pydict(self._buffer, schema=schema)
+            if self._parquet is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._parquet = pq.ParquetWriter(self.path, schema, compression="zstd")
+            self._parquet.write_table(table)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            arrays = self._numpy_columns()
+            part = os.path.join(self.path, f"part-{self._parts:05d}")
+            if self.fmt == "npz":
+                np.savez_compressed(part + ".npz", **arrays)
+            else:
+                import pandas as pd
+                pd.DataFrame(arrays).to_csv(part + ".csv.gz", index=False, compression="gzip")
+            self._parts += 1
+        self._buffer = {name: [] for name, _ in self._columns}
+
+    def close(self):
+        self.flush()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_results(path: str):
+    """Load everything a ResultsWriter wrote (Parquet file or NPZ/CSV part directory) as a DataFrame."""
+    import pandas as pd
+    if os.path.isfile(path):
+        return pd.read_parquet(path)
+    parts = sorted(os.listdir(path))
+    frames = []
+    for name in parts:
+        full = os.path.join(path, name)
+        if name.endswith(".npz"):
+            with np.load(full) as data:
+                frames.append(pd.DataFrame({k: data[k] for k in data.files}))
+        elif name.endswith(".csv.gz"):
+            frames.append(pd.read_csv(full))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,392 @@
+"""
+Declarative rule engine
+- The rule-based agents' flags, score deductions and recommendation texts live in a JSON rule file
+  (src/agents/rules.json, or the file named by PHG_RULES). Per agent: an optional score
+  {"base", "min", "max"} and an ordered list of rules, each with a condition ("when") and actions:
+  "flag", "score" (added to the base score) and "add" ({output list: text or [texts]}).
+  A rule with "otherwise": "<list>" only fires when no ordinary rule added to that list.
+- Conditions: a keyword (substring of the lower-cased report), "lab:<analyte>" (the report has that
+  lab value), true, or {"any": [...]}, {"all": [...]}, {"not": condition}.
+- The file is compiled once into a decision table: every distinct predicate gets a bit, every rule
+  becomes (required bits, forbidden bits) conjunctions. A report's predicates are evaluated once per
+  agent into a bitmask (keyword lookups are memoised per report across agents by ReportContext) and
+  fan out to every rule that references them with a few integer operations.
+- evaluate_batch() runs the same table over many reports: one vectorised substring scan per
+  keyword, then NumPy boolean algebra per rule; results come out as ResultBatch masks.
+- The file is re-read when it changes on disk (checked at most every RELOAD_CHECK_S seconds), so
+  rules hot-reload without a restart. A file that fails to compile is reported on stderr and the
+  previous rules stay active. Codes stay stable as long as rules only append texts and flags.
+  A keyword added by a reload is registered for reports streamed afterwards; a report streamed
+  before it (or while it happened) is checked against the report head it kept, never an error.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .catalogue import Catalogue, register_catalogue
+from .cohort import keyword_hits, text_series
+from .lab_values import extract_lab_values, first, first_measurement
+from .report_context import ReportContext, _as_records, register_keywords
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "agents", "rules.json")
+RELOAD_CHECK_S = 1.0
+
+_RULE_KEYS = {"id", "when", "otherwise", "flag", "score", "add", "note"}
+
+# (required bits, forbidden bits)
+Conjunction = Tuple[int, int]
+
+class Evaluation(NamedTuple):
+    flags: int
+    score: Optional[int]
+    codes: Dict[str, Tuple[int, ...]]
+
+class BatchEvaluation(NamedTuple):
+    flag_masks: List[np.ndarray]
+    scores: Optional[np.ndarray]
+    rec_masks: Dict[str, List[np.ndarray]]
+
+class _Rule(NamedTuple):
+    conjunctions: Tuple[Conjunction, ...]
+    flag: Optional[int]
+    delta: int
+    add: Dict[str, Tuple[int, ...]]
+    otherwise: Optional[str]
+
+def _and(left: List[Conjunction], right: List[Conjunction]) -> List[Conjunction]:
+    out = []
+    for req_a, forb_a in left:
+        for req_b, forb_b in right:
+            req, forb = req_a | req_b, forb_a | forb_b
+            if not req & forb:  # drop contradictions (x and not x)
+                out.append((req, forb))
+    return out
+
+class RuleTable:
+    """A compiled rule file: the predicate columns shared by all agents plus one AgentRules per agent."""
+
+    def __init__(self, spec: Dict[str, Any], digest: str = ""):
+        self.digest = digest
+        self.atoms: List[str] = []
+        self._atom_bits: Dict[str, int] = {}
+        agents = spec.get("agents")
+        if not isinstance(agents, dict):
+            raise ValueError('rule file needs an "agents" object')
+        self.agents = {name: AgentRules(self, name, agent_spec) for name, agent_spec in agents.items()}
+        register_keywords(*self.keywords())
+
+    def _atom(self, atom: str) -> int:
+        atom = atom.lower()
+        if atom.startswith("lab:"):
+            atom = "lab:" + atom[4:].strip()
+        if atom not in self._atom_bits:
+            self._atom_bits[atom] = len(self.atoms)
+            self.atoms.append(atom)
+        return self._atom_bits[atom]
+
+    def compile_condition(self, cond: Any) -> List[Conjunction]:
+        """Condition -> disjunction of (required bits, forbidden bits)."""
+        if cond is True:
+            return [(0, 0)]
+        if cond is False:
+            return []
+        if isinstance(cond, str):
+            if not cond:
+                raise ValueError("empty keyword in condition")
+            return [(1 << self._atom(cond), 0)]
+        if isinstance(cond, dict) and len(cond) == 1:
+            op, args = next(iter(cond.items()))
+            if op == "any" and isinstance(args, list):
+                return [c for arg in args for c in self.compile_condition(arg)]
+            if op == "all" and isinstance(args, list):
+                out: List[Conjunction] = [(0, 0)]
+                for arg in args:
+                    out = _and(out, self.compile_condition(arg))
+                return out
+            if op == "not":
+                # not (c1 or c2 ...) = (not c1) and (not c2) ..., each a disjunction of negated literals
+                out = [(0, 0)]
+                for req, forb in self.compile_condition(args):
+                    negated = [(0, 1 << b) for b in _bits(req)] + [(1 << b, 0) for b in _bits(forb)]
+                    out = _and(out, negated)
+                return out
+        raise ValueError(f"invalid condition: {cond!r}")
+
+    def keywords(self, bits: Optional[int] = None) -> Tuple[str, ...]:
+        return tuple(a for i, a in enumerate(self.atoms)
+                     if not a.startswith("lab:") and (bits is None or bits >> i & 1))
+
+    def agent(self, name: str) -> "AgentRules":
+        try:
+            return self.agents[name]
+        except KeyError:
+            raise KeyError(f"no rules for agent {name!r}") from None
+
+def _bits(mask: int) -> Iterable[int]:
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+class AgentRules:
+    def __init__(self, table: RuleTable, name: str, spec: Dict[str, Any]):
+        self.table = table
+        self.name = name
+        score = spec.get("score")
+        self.score = None if score is None else (int(score.get("base", 100)), score.get("min"), score.get("max"))
+        self.flags: List[str] = []
+        self.texts: Dict[str, List[str]] = {}
+        self.rules: List[_Rule] = []
+        self.bits = 0  # predicates this agent needs
+        for i, rule in enumerate(spec.get("rules", [])):
+            try:
+                self.rules.append(self._compile_rule(rule))
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"{name}, rule {rule.get('id', i) if isinstance(rule, dict) else i}: {e}") from None
+        self.flags = tuple(self.flags)
+        self.texts = {key: tuple(texts) for key, texts in self.texts.items()}
+        self._catalogues: Dict[Any, Catalogue] = {}
+
+    def _code(self, texts: List[str], text: str) -> int:
+        if text not in texts:
+            texts.append(text)
+        return texts.index(text)
+
+    def _compile_rule(self, rule: Dict[str, Any]) -> _Rule:
+        unknown = set(rule) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"unknown keys {sorted(unknown)}")
+        conjunctions = tuple(self.table.compile_condition(rule.get("when", True)))
+        for req, forb in conjunctions:
+            self.bits |= req | forb
+        flag = None
+        if rule.get("flag"):
+            flag = self._code(self.flags, rule["flag"])
+            if flag >= 32:
+                raise ValueError("at most 32 flags per agent")
+        add = {}
+        for key, texts in (rule.get("add") or {}).items():
+            texts = [texts] if isinstance(texts, str) else list(texts)
+            add[key] = tuple(self._code(self.texts.setdefault(key, []), t) for t in texts)
+        otherwise = rule.get("otherwise")
+        if otherwise is not None and otherwise not in add:
+            raise ValueError(f'"otherwise": {otherwise!r} but the rule adds nothing to that list')
+        return _Rule(conjunctions, flag, int(rule.get("score", 0)), add, otherwise)
+
+    def keywords(self) -> Tuple[str, ...]:
+        return self.table.keywords(self.bits)
+
+    def _clamp(self, score):
+        _, low, high = self.score
+        if low is not None:
+            score = np.maximum(score, low) if isinstance(score, np.ndarray) else max(score, low)
+        if high is not None:
+            score = np.minimum(score, high) if isinstance(score, np.ndarray) else min(score, high)
+        return score
+
+    def predicates(self, ctx: ReportContext) -> int:
+        values = 0
+        for bit in _bits(self.bits):
+            atom = self.table.atoms[bit]
+            if atom.startswith("lab:"):
+                hit = ctx.lab(atom[4:]) is not None
+            else:
+                try:
+                    hit = ctx.has(atom)
+                except LookupError:
+                    # added by a reload after the report was streamed: only its head is left to rescan
+                    hit = atom in ctx.head.lower()
+            if hit:
+                values |= 1 << bit
+        return values
+
+    def evaluate(self, ctx: ReportContext) -> Evaluation:
+        values = self.predicates(ctx)
+        flags = 0
+        score = self.score[0] if self.score else None
+        codes: Dict[str, set] = {key: set() for key in self.texts}
+        added = set()  # lists an ordinary (not "otherwise") rule has added to
+        for rule in self.rules:
+            if rule.otherwise is not None and rule.otherwise in added:
+                continue
+            if not any(values & req == req and not values & forb for req, forb in rule.conjunctions):
+                continue
+            if rule.otherwise is None:
+                added.update(rule.add)
+            if rule.flag is not None:
+                flags |= 1 << rule.flag
+            if score is not None:
+                score += rule.delta
+            for key, rule_codes in rule.add.items():
+                codes[key].update(rule_codes)
+        if score is not None:
+            score = self._clamp(score)
+        return Evaluation(flags, score, {key: tuple(sorted(c)) for key, c in codes.items()})
+
+    def evaluate_batch(self, texts, hits=None, labs=None, facts: Optional[Dict[str, np.ndarray]] = None) -> BatchEvaluation:
+        """
+        Evaluate many reports at once (texts: list or pandas Series). hits may be a precomputed
+        keyword_hits frame covering self.keywords(); facts may supply predicate columns directly
+        (e.g. {"lab:weight": has_weight}); other lab predicates come from labs (one lab list per
+        report) or are extracted from the text.
+        """
+        texts = text_series(texts)
+        n = len(texts)
+        keywords = self.keywords()
+        if hits is None and keywords:
+            hits = keyword_hits(texts, keywords)
+        facts = {k.lower(): np.asarray(v, dtype=bool) for k, v in (facts or {}).items()}
+        columns: Dict[int, np.ndarray] = {}
+        for bit in _bits(self.bits):
+            atom = self.table.atoms[bit]
+            if atom in facts:
+                columns[bit] = facts[atom]
+            elif atom.startswith("lab:"):
+                columns[bit] = _lab_column(texts, labs, atom[4:])
+            elif atom in hits:
+                columns[bit] = hits[atom].to_numpy(dtype=bool)
+            else:  # hits computed before a reload added this keyword
+                columns[bit] = keyword_hits(texts, (atom,))[atom].to_numpy(dtype=bool)
+
+        fired: List[np.ndarray] = []
+        added: Dict[str, np.ndarray] = {key: np.zeros(n, dtype=bool) for key in self.texts}
+        rec_masks = {key: [np.zeros(n, dtype=bool) for _ in texts_] for key, texts_ in self.texts.items()}
+        for rule in self.rules:
+            mask = np.zeros(n, dtype=bool)
+            for req, forb in rule.conjunctions:
+                conj = np.ones(n, dtype=bool)
+                for bit in _bits(req):
+                    conj &= columns[bit]
+                for bit in _bits(forb):
+                    conj &= ~columns[bit]
+                mask |= conj
+            if rule.otherwise is not None:
+                mask &= ~added[rule.otherwise]
+            else:
+                for key in rule.add:
+                    added[key] |= mask
+            fired.append(mask)
+            for key, rule_codes in rule.add.items():
+                for code in rule_codes:
+                    rec_masks[key][code] |= mask
+
+        flag_masks = [np.zeros(n, dtype=bool) for _ in self.flags]
+        scores = None
+        if self.score:
+            scores = np.full(n, self.score[0], dtype=np.int64)
+        for rule, mask in zip(self.rules, fired):
+            if rule.flag is not None:
+                flag_masks[rule.flag] |= mask
+            if scores is not None and rule.delta:
+                scores += rule.delta * mask
+        if scores is not None:
+            scores = self._clamp(scores)
+        return BatchEvaluation(flag_masks, scores, rec_masks)
+
+    def catalogue(self, layout: Sequence[Tuple[str, str]], texts: str = "recommendations",
+                  params: Sequence[Tuple[str, type]] = ()) -> Catalogue:
+        """Catalogue for this version of the rules, with the texts of one output list as recommendation codes."""
+        key = (tuple(layout), texts, tuple(params))
+        catalogue = self._catalogues.get(key)
+        if catalogue is None:
+            catalogue = register_catalogue(self.name, self.flags, self.texts.get(texts, ()), layout, params,
+                                           self.table.digest)
+            self._catalogues[key] = catalogue
+        return catalogue
+
+    def render(self, key: str, codes: Iterable[int]) -> List[str]:
+        return [self.texts[key][c] for c in codes]
+
+    def flag_names(self, flags: int) -> List[str]:
+        return [name for bit, name in enumerate(self.flags) if flags >> bit & 1]
+
+def _lab_column(texts, labs, analyte: str) -> np.ndarray:
+    labs = [None] * len(texts) if labs is None else list(labs)
+    out = np.zeros(len(texts), dtype=bool)
+    for i, (text, report_labs) in enumerate(zip(texts, labs)):
+        if report_labs is not None:
+            rec = first(_as_records(report_labs), analyte)
+        elif analyte in ("weight", "height"):
+            rec = first_measurement(text, analyte)
+        else:
+            rec = first(extract_lab_values(text), analyte)
+        out[i] = rec is not None
+    return out
+
+def load_rules(path: str) -> RuleTable:
+    with open(path, "rb") as f:
+        data = f.read()
+    return RuleTable(json.loads(data.decode("utf-8")), hashlib.sha256(data).hexdigest()[:16])
+
+class RuleSet:
+    """The rule file at path, compiled on first use and recompiled whenever the file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._table: Optional[RuleTable] = None
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def table(self) -> RuleTable:
+        now = time.monotonic()
+        if self._table is not None and now - self._checked < RELOAD_CHECK_S:
+            return self._table
+        with self._lock:
+            if self._table is not None and now - self._checked < RELOAD_CHECK_S:
+                return self._table
+            self._checked = now
+            try:
+                stamp = self._file_stamp()
+            except OSError:
+                if self._table is None:
+                    raise
+                return self._table  # e.g. an editor replacing the file; keep the rules we have
+            if stamp != self._stamp:
+                # remembered even when loading fails, so a broken file is reported once per change
+                self._stamp = stamp
+                try:
+                    table = load_rules(self.path)
+                except (OSError, ValueError, TypeError, AttributeError) as e:
+                    if self._table is None:
+                        raise
+                    print(f"Keeping previous rules; cannot load {self.path}: {e}", file=sys.stderr)
+                else:
+                    if self._table is not None:
+                        print(f"Reloaded rules from {self.path}", file=sys.stderr)
+                    self._table = table
+        return self._table
+
+    def agent(self, name: str) -> AgentRules:
+        return self.table().agent(name)
+
+    def keyword_hits(self, texts):
+        """Keyword frame covering every agent's rules; pass it as hits= to the agents' *_batch functions."""
+        return keyword_hits(texts, self.table().keywords())
+
+_default: Optional[RuleSet] = None
+_default_lock = threading.Lock()
+
+def default_rules() -> RuleSet:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RuleSet(os.environ.get("PHG_RULES") or DEFAULT_RULES_PATH)
+        return _default
+
+def cache_version() -> str:
+    """Digest of the active rule file; part of the agent cache key of every agent that uses rules."""
+    return default_rules().table().digest
@@ -0,0 +1,157 @@
+"""
+Sentence segmentation and extractive ranking
+- iter_sentences() walks the text once with a compiled boundary pattern and yields sentences
+  lazily, so callers that need only the first few never split the whole report.
+  A "." ends a sentence only when followed by whitespace and not preceded by a known
+  abbreviation ("Dr.", "e.g.") or an initial (a capital letter followed by another capitalised
+  word, "J. Smith"); decimals such as "5.6" never split. Letters that name things ("Vitamin D.",
+  "Hepatitis B.") are not initials.
+  Blank lines also end a sentence, and run-on text (tables, lists) is cut at line breaks
+  once it exceeds max_chars.
+- textrank() ranks sentences by PageRank over a term-overlap similarity graph. Overlaps are
+  counted from each term's list of sentences, so memory is n x n for n candidates rather than
+  n x vocabulary; only the first max_candidates sentences are considered, so the total cost
+  stays linear in the length of the report.
+"""
+
+import re
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+MAX_SENTENCE_CHARS = 400
+MAX_CANDIDATES = 200
+
+_BOUNDARY_RE = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n[^\S\n]*\n")
+_LAST_WORD_RE = re.compile(r"([A-Za-z][A-Za-z.]*)$")
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]+")
+_NEXT_CAPITAL_RE = re.compile(r"\s+[\"'(\[]*[A-Z]")
+
+_ABBREVIATIONS = {
+    "dr", "mr", "mrs", "ms", "prof", "st", "sr", "jr", "no", "vs", "approx", "appt", "dept",
+    "e.g", "i.e", "fig", "ref", "hosp", "tel", "pt", "wt", "ht", "yrs", "mos", "mins", "hrs",
+}
+
+# words followed by a letter that names something rather than an initial
+_LETTER_NAMES = {"vitamin", "hepatitis", "type", "group", "grade", "stage", "class", "phase", "lead", "factor", "plan"}
+
+_STOPWORDS = {
+    "the", "and", "for", "are", "was", "were", "with", "this", "that", "from", "has", "have", "had",
+    "not", "but", "all", "any", "can", "may", "will", "been", "being", "into", "than", "then", "its",
+    "our", "you", "your", "his", "her", "their", "they", "she", "him", "who", "which", "what", "per",
+    "also", "such", "other", "more", "most", "some", "there", "these", "those", "over", "under",
+}
+
+def _is_abbreviation(text: str, dot: int, end: int, start: int) -> bool:
+    m = _LAST_WORD_RE.search(text, max(start, dot - 12), dot)
+    if m is None:
+        return False
+    word = m.group(1).rstrip(".")
+    if word.lower() in _ABBREVIATIONS:
+        return True
+    if len(word) != 1 or not word.isupper() or not _NEXT_CAPITAL_RE.match(text, end):
+        return False
+    previous = text[max(start, m.start() - 16):m.start()].split()
+    return not (previous and previous[-1].lower() in _LETTER_NAMES)
+
+def _split_long(sentence: str, max_chars: int) -> Iterator[str]:
+    if len(sentence) <= max_chars:
+        yield sentence
+        return
+    piece = ""
+    for line in sentence.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if piece:
+                yield piece
+                piece = ""
+            yield line[:cut].strip()
+            line = line[cut:].strip()
+        if piece and len(piece) + 1 + len(line) > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece} {line}" if piece else line
+    if piece:
+        yield piece
+
+def iter_sentences(text: str, max_chars: int = MAX_SENTENCE_CHARS) -> Iterator[str]:
+    """Yield the sentences of text in order (stripped, never empty)."""
+    start = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        if m.group()[0] == "." and _is_abbreviation(text, m.start(), m.end(), start):
+            continue
+        sentence = text[start:m.end()].strip()
+        start = m.end()
+        if sentence:
+            yield from _split_long(sentence, max_chars)
+    sentence = text[start:].strip()
+    if sentence:
+        yield from _split_long(sentence, max_chars)
+
+def _terms(sentence: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(sentence.lower()) if t not in _STOPWORDS]
+
+def textrank(sentences: List[str], damping: float = 0.85, iterations: int = 50, tol: float = 1e-6) -> np.ndarray:
+    """
+    Score each sentence. Similarity is the original TextRank overlap measure,
+    |shared terms| / (log|Si| + log|Sj|), counted from each term's list of sentences.
+    """
+    n = len(sentences)
+    if n == 0:
+        return np.zeros(0)
+    postings: Dict[str, List[int]] = {}
+    sizes = np.zeros(n)
+    for i, sentence in enumerate(sentences):
+        terms = set(_terms(sentence))
+        for t in terms:
+            postings.setdefault(t, []).append(i)
+        sizes[i] = len(terms)
+    if not postings:
+        return np.full(n, 1.0 / n)
+
+    overlap = np.zeros((n, n))
+    for ids in postings.values():
+        if len(ids) > 1:
+            ids = np.asarray(ids)
+            overlap[ids[:, None], ids[None, :]] += 1.0
+    log_sizes = np.log(np.maximum(sizes, 1.0))
+    norm = log_sizes[:, None] + log_sizes[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(norm > 0, overlap / norm, 0.0)
+    np.fill_diagonal(weights, 0.0)
+
+    out_weight = weights.sum(axis=1)
+    dangling = out_weight == 0
+    transition = np.divide(weights, out_weight[:, None], out=np.zeros_like(weights), where=~dangling[:, None])
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        # sentences sharing no terms spread their score evenly
+        updated = (1 - damping) / n + damping * (transition.T @ scores + scores[dangling].sum() / n)
+        if np.abs(updated - scores).sum() < tol:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+def summarize(text: str, max_sentences: int = 3, max_candidates: int = MAX_CANDIDATES) -> List[str]:
+    """The max_sentences highest-ranked distinct sentences among the first max_candidates, in document order."""
+    candidates = []
+    seen = set()
+    for sentence in iter_sentences(text):
+        # repeated boilerplate lines would otherwise reinforce each other
+        if sentence in seen:
+            continue
+        seen.add(sentence)
+        candidates.append(sentence)
+        if len(candidates) >= max_candidates:
+            break
+    if len(candidates) <= max_sentences:
+        return candidates
+    scores = textrank(candidates)
+    # stable: ties keep the earlier sentence
+    best = np.argsort(-scores, kind="stable")[:max_sentences]
+    return [candidates[i] for i in sorted(best)]
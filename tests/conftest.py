@@ -0,0 +1,25 @@
+import fitz
+import pytest
+
+REPORT_PAGES = [
+    "Patient: Jane Doe\nDate: 2024-03-01\nHemoglobin 13.2 g/dL 12.0-15.5\n"
+    "Glucose 112 mg/dL 70-99\nWeight 82 kg\nHeight 170 cm\n",
+    "Total cholesterol 231 mg/dL 0-200\nPatient reports poor sleep and insomnia.\n"
+    "Work stress and anxiety noted. Blood pressure stable.\n",
+    "Sodium 146 mmol/L 135-145\nMild dehydration, advised to increase fluid intake.\n",
+]
+
+@pytest.fixture(autouse=True)
+def _private_cache(tmp_path, monkeypatch):
+    # keep the tests' reports out of the user's on-disk cache
+    monkeypatch.setenv("PHG_CACHE", "0")
+
+@pytest.fixture
+def report_pdf(tmp_path):
+    path = tmp_path / "report.pdf"
+    doc = fitz.open()
+    for text in REPORT_PAGES:
+        doc.new_page().insert_text((72, 72), text, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
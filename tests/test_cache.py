@@ -0,0 +1,34 @@
+import sqlite3
+
+from src.utils.cache import DiskCache
+
+def _stored_bytes(cache):
+    conn = sqlite3.connect(cache.path)
+    total, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+    return total
+
+def test_byte_total_follows_upserts_and_evictions(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    for i in range(5):
+        cache.put("ns", f"k{i}", b"x" * 100)
+    assert cache.stats()["bytes"] == _stored_bytes(cache) == 500
+
+    cache.put("ns", "k0", b"y" * 300)  # upsert grows an entry
+    cache.put("ns", "k1", b"y" * 10)   # and shrinks one
+    assert cache.stats()["bytes"] == _stored_bytes(cache) == 610
+
+    assert cache.get("ns", "k2") is not None  # recently used, so it survives eviction
+    for i in range(5, 9):
+        cache.put("other", f"k{i}", b"z" * 100)
+    stats = cache.stats()
+    assert stats["bytes"] == _stored_bytes(cache) <= 1000
+    assert cache.get("ns", "k2") is not None and cache.get("ns", "k3") is None
+
+    cache.clear("other")
+    assert cache.stats()["bytes"] == _stored_bytes(cache)
+
+def test_total_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path).put("ns", "k", b"abc")
+    reopened = DiskCache(path)
+    assert reopened.stats()["bytes"] == 3 and reopened.get_text("ns", "k") == "abc"
@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from src.agents.hydration_agent import analyze_hydration, analyze_hydration_batch
+from src.agents.recommendation_agent import generate_recommendations, generate_recommendations_batch
+from src.agents.sleep_agent import analyze_sleep, analyze_sleep_batch
+from src.agents.stress_agent import analyze_stress, analyze_stress_batch
+from src.utils.rules import default_rules
+
+WORDS = ["cholesterol", "sugar", "glucose", "blood pressure", "bp", "hemoglobin", "tired", "fatigue", "insomnia",
+         "sleep", "poor", "lack", "iron", "thyroid", "stress", "anxious", "low mood", "sad", "panic", "dehydration",
+         "dry mouth", "sweat", "vomit", "Weight 72 kg", "weight: 80.5 kg", "the", "patient", ".", "\n"]
+
+AGENTS = [(analyze_sleep, analyze_sleep_batch), (analyze_stress, analyze_stress_batch),
+          (analyze_hydration, analyze_hydration_batch), (generate_recommendations, generate_recommendations_batch)]
+
+@pytest.fixture(scope="module")
+def texts():
+    rng = random.Random(7)
+    out = [" ".join(rng.choice(WORDS) if rng.random() < 0.6 else rng.choice(WORDS).upper()
+                    for _ in range(rng.randint(0, 12))) for _ in range(400)]
+    return out + ["", None]
+
+@pytest.mark.parametrize("single, batch", AGENTS, ids=lambda fn: fn.__name__)
+def test_batch_matches_per_report(texts, single, batch):
+    expected = [single({"raw_text": t or ""}) for t in texts]
+    assert batch(texts) == expected
+    assert batch(texts, hits=default_rules().keyword_hits(texts)) == expected
+    assert batch(texts, compact=True).expand() == expected
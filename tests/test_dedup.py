@@ -0,0 +1,28 @@
+import sqlite3
+
+from src.utils.dedup import DedupIndex
+
+def _text(i):
+    return f"report {i} " + " ".join(f"word{i}_{j}" for j in range(40))
+
+def test_eviction_keeps_recently_matched_reports(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"), 0.9, max_entries=10)
+    fingerprints = [index.fingerprint(_text(i)) for i in range(12)]
+    for i, fp in enumerate(fingerprints[:10]):
+        index.add(fp, {"n": i})
+    assert index.lookup(fingerprints[0])["result"] == {"n": 0}  # report 0 is now the most recently used
+
+    index.add(fingerprints[10], {"n": 10})  # 11 > 10: evicts down to 9, least recently used first
+    conn = sqlite3.connect(index.path)
+    assert conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0] == 9
+    assert conn.execute("SELECT COUNT(*) FROM bands WHERE doc NOT IN (SELECT id FROM docs)").fetchone()[0] == 0
+    assert index.lookup(fingerprints[0]) is not None
+    assert index.lookup(fingerprints[10]) is not None
+    assert index.lookup(fingerprints[1]) is None and index.stats()["evicted"] == 2
+
+def test_zero_means_unbounded(tmp_path, monkeypatch):
+    monkeypatch.setenv("PHG_DEDUP_MAX", "0")
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"))
+    for i in range(5):
+        index.add(index.fingerprint(_text(i)), {"n": i})
+    assert index.max_entries == 0 and index.stats()["evicted"] == 0
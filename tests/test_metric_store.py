@@ -0,0 +1,22 @@
+import os
+
+from src.agents.trend_agent import analyze_trends
+from src.utils.metric_store import MetricStore
+
+def test_history_path_without_suffix_round_trips(tmp_path):
+    path = str(tmp_path / "hist")
+    store = MetricStore()
+    store.append("P1", "2024-01-01", "weight", 80.0)
+    store.save(path)
+    assert os.path.exists(path + ".npz") and MetricStore.exists(path)
+    loaded = MetricStore.load(path)
+    loaded.append("P1", "2024-06-01", "weight", 80.0)
+    assert loaded.history("P1", "weight")["value"].tolist() == [80.0, 80.0]
+
+def test_flat_series_has_no_negative_zero():
+    store = MetricStore()
+    store.append("P1", "2024-01-01", "weight", 80.0)
+    store.append("P1", "2024-06-01", "weight", 79.999)
+    trends = analyze_trends({"raw_text": "", "patient_id": "P1"}, history=store)["trends"]
+    line = next(t for t in trends if t.startswith("Weight"))
+    assert "-0.0" not in line and "+0.00 kg/year" in line
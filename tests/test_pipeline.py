@@ -0,0 +1,29 @@
+import threading
+
+from src.utils import pipeline
+from src.utils.pipeline import Pipeline, Stage
+
+def test_timed_out_stages_are_bounded(monkeypatch):
+    monkeypatch.setattr(pipeline, "ABANDON_LIMIT", 2)
+    monkeypatch.setattr(pipeline, "MAX_ABANDONED", 3)
+    release = threading.Event()
+    stuck = Pipeline([Stage("stuck", lambda: release.wait(10), timeout=0.05)])
+    try:
+        first_pool = pipeline.shared_executor()
+        for _ in range(2):
+            assert "timed out" in stuck.run()["stuck"]["_error"]
+        assert pipeline.abandoned_stages() == 2
+        # two stuck threads hold the shared pool: the next run gets a fresh one
+        assert pipeline.shared_executor() is not first_pool
+
+        assert "timed out" in stuck.run()["stuck"]["_error"]
+        refused = Pipeline([Stage("quick", lambda: 1)]).run()["quick"]
+        assert "refused" in refused["_error"]
+    finally:
+        release.set()
+    for _ in range(100):
+        if not pipeline.abandoned_stages():
+            break
+        threading.Event().wait(0.01)
+    assert pipeline.abandoned_stages() == 0
+    assert Pipeline([Stage("quick", lambda: 1)]).run()["quick"] == 1
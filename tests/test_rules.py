@@ -0,0 +1,144 @@
+import json
+import random
+import os
+
+import pytest
+
+from src.utils import rules as rules_mod
+from src.utils.report_context import ReportContext
+from src.utils.rules import DEFAULT_RULES_PATH, RuleSet
+
+from conftest import REPORT_PAGES
+
+def _write_rules(path, extra_rules=()):
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["agents"]["generate_recommendations"]["rules"][:0] = list(extra_rules)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+
+def _reload(ruleset, path, extra_rules, monkeypatch):
+    _write_rules(path, extra_rules)
+    os.utime(path, ns=(1, 1))  # a new stamp even within the file system's timestamp resolution
+    monkeypatch.setattr(rules_mod, "RELOAD_CHECK_S", 0.0)
+    return ruleset.table()
+
+def test_reload_after_streaming_rescans_the_head(tmp_path, monkeypatch):
+    path = str(tmp_path / "rules.json")
+    _write_rules(path)
+    ruleset = RuleSet(path)
+    ruleset.table()
+    ctx = ReportContext.from_pages(enumerate(REPORT_PAGES, 1))
+    assert ctx.streamed
+
+    table = _reload(ruleset, path, [
+        {"id": "patient", "when": "jane doe", "add": {"recommendations": "In the head."}},
+        {"id": "absent", "when": "never mentioned", "add": {"recommendations": "Not in the report."}},
+    ], monkeypatch)
+    agent = table.agent("generate_recommendations")
+    result = agent.evaluate(ctx)
+    texts = agent.render("recommendations", result.codes["recommendations"])
+    assert "In the head." in texts and "Not in the report." not in texts
+
+def test_batch_with_hits_from_before_a_reload(tmp_path, monkeypatch):
+    path = str(tmp_path / "rules.json")
+    _write_rules(path)
+    ruleset = RuleSet(path)
+    texts = ["".join(REPORT_PAGES), "nothing to see"]
+    hits = ruleset.keyword_hits(texts)
+
+    table = _reload(ruleset, path, [
+        {"id": "patient", "when": "jane doe", "add": {"recommendations": "Named patient."}},
+    ], monkeypatch)
+    agent = table.agent("generate_recommendations")
+    batch = agent.evaluate_batch(texts, hits=hits)
+    code = agent.texts["recommendations"].index("Named patient.")
+    assert batch.rec_masks["recommendations"][code].tolist() == [True, False]
+
+def test_result_batch_refuses_other_rules(tmp_path, monkeypatch):
+    from src.agents.sleep_agent import analyze_sleep_batch
+    from src.utils import catalogue
+    from src.utils.catalogue import ResultBatch
+
+    texts = ["".join(REPORT_PAGES), "slept well"]
+    batch = analyze_sleep_batch(texts, compact=True)
+    path = str(tmp_path / "sleep.npz")
+    batch.save(path)
+    assert ResultBatch.load(path).expand() == batch.expand() == analyze_sleep_batch(texts)
+
+    monkeypatch.setattr(catalogue, "_CATALOGUES", {})
+    monkeypatch.setattr(rules_mod, "cache_version", lambda: "other-rules")
+    with pytest.raises(ValueError, match="rules version"):
+        ResultBatch.load(path)
+
+# the hand-written keyword logic the rule file replaced
+def _legacy_recommendations(text):
+    recs = []
+    if "cholesterol" in text:
+        recs.append("Reduce oily and fried foods. Increase fiber intake.")
+    if "sugar" in text or "glucose" in text:
+        recs.append("Monitor sugar levels and reduce sweets.")
+    if "blood pressure" in text or "bp" in text:
+        recs.append("Reduce salt intake and check BP regularly.")
+    if "hemoglobin" in text:
+        recs.append("Increase iron-rich foods like spinach and broccoli.")
+    if not recs:
+        recs.append("No specific issues detected. Maintain a healthy lifestyle.")
+    return {"recommendations": recs}
+
+def _legacy_sleep(text):
+    flags, recs = [], []
+    if "tired" in text or "fatigue" in text or "exhaustion" in text:
+        flags.append("fatigue")
+        recs.append("Ensure 7–9 hours of consistent sleep; avoid screens 1 hour before bed.")
+    if "insomnia" in text or "sleep" in text and "poor" in text:
+        flags.append("possible insomnia")
+        recs.append("Maintain fixed sleep schedule and avoid caffeine after 5 PM.")
+    if "iron" in text or "hemoglobin" in text:
+        recs.append("Low iron can affect sleep; consider iron-rich foods if suggested by doctor.")
+    if "thyroid" in text:
+        recs.append("Thyroid imbalance may disrupt sleep; follow prescribed treatment.")
+    if not recs:
+        recs.append("Maintain consistent sleep schedule and good sleep hygiene practices.")
+    score = 100 - 20 * ("fatigue" in flags) - 30 * ("possible insomnia" in flags)
+    return {"sleep_flags": flags, "sleep_score": score, "sleep_recommendations": recs}
+
+def _legacy_stress(text):
+    flags, recs = [], []
+    if "stress" in text or "anxiety" in text or "anxious" in text:
+        flags.append("stress/anxiety detected")
+        recs.append("Practice deep breathing or meditation for 10–15 minutes daily.")
+    if "depression" in text or "low mood" in text or "sad" in text:
+        flags.append("low mood indicators")
+        recs.append("Maintain routine, stay socially connected, and consider counseling if symptoms persist.")
+    if "fatigue" in text or "tired" in text:
+        flags.append("fatigue")
+        recs.append("Balance work and rest; avoid overexertion.")
+    if "panic" in text:
+        flags.append("panic indicators")
+        recs.append("Practice grounding techniques; consult healthcare if episodes repeat.")
+    if "sleep" in text and ("poor" in text or "lack" in text):
+        flags.append("sleep-related stress")
+        recs.append("Maintain sleep hygiene: fixed sleep times, no caffeine late evening.")
+    if not recs:
+        recs.append("Maintain a balanced schedule, practice mindfulness, and stay physically active.")
+    deductions = {"stress/anxiety detected": 25, "low mood indicators": 25, "panic indicators": 30,
+                  "sleep-related stress": 10, "fatigue": 5}
+    score = max(0, 100 - sum(deductions[f] for f in flags))
+    return {"stress_flags": flags, "stress_score": score, "stress_recommendations": recs}
+
+LEGACY_WORDS = ["cholesterol", "sugar", "glucose", "blood pressure", "bp", "hemoglobin", "tired", "fatigue",
+                "exhaustion", "insomnia", "sleep", "poor", "lack", "iron", "thyroid", "stress", "anxiety",
+                "anxious", "depression", "low mood", "sad", "panic", "the", "patient"]
+
+@pytest.mark.parametrize("agent, legacy", [("generate_recommendations", _legacy_recommendations),
+                                           ("analyze_sleep", _legacy_sleep), ("analyze_stress", _legacy_stress)])
+def test_rule_table_matches_keyword_agents(agent, legacy):
+    from src.agents.registry import default_registry
+
+    rng = random.Random(3)
+    fn = default_registry()[agent]
+    for _ in range(500):
+        text = " ".join(rng.choice(LEGACY_WORDS) for _ in range(rng.randint(0, 8)))
+        text = text.upper() if rng.random() < 0.2 else text
+        assert fn({"raw_text": text}) == legacy(text.lower()), text
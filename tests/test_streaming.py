@@ -0,0 +1,41 @@
+import pytest
+
+from src.agents.registry import default_registry
+from src.agents.report_agent import parse_report
+from src.utils import report_context
+
+AGENTS = ["generate_summary", "generate_recommendations", "analyze_trends", "analyze_diet",
+          "analyze_sleep", "analyze_stress", "analyze_hydration"]
+
+@pytest.fixture
+def no_keywords(monkeypatch):
+    # as in a fresh process: no agent module has registered its keywords yet
+    monkeypatch.setattr(report_context, "_KEYWORDS", set())
+
+def test_streamed_parse_alone_serves_every_agent(report_pdf, no_keywords):
+    streamed = parse_report(report_pdf, keep_text=False)
+    eager = parse_report(report_pdf)
+    assert streamed.context.streamed and streamed["page_count"] == eager["page_count"] == 3
+    for name in AGENTS:
+        agent = default_registry()[name]
+        result = agent(streamed)
+        if name != "generate_summary":  # summarises the text, of which a streamed report keeps the head
+            assert result == agent(eager), name
+
+def test_streamed_context_matches_eager(no_keywords):
+    # "insomnia" straddles the page break (lab lines do not: eager parsing reads labs per page as well)
+    pages = ["Glucose 112 mg/dL 70-99\nPoor sleep and insom", "nia reported.\nBlood pressure 150/95 mmHg\nTIRED, Hemoglobin 13.2 g/dL"]
+    text = "".join(pages)
+    report_context.register_keywords("blood pressure", "glucose", "tired", "insomnia", "sleep", "poor", "95 mm")
+    eager = report_context.ReportContext(text)
+    streamed = report_context.ReportContext.from_pages(enumerate(pages, 1))
+    assert streamed.streamed and streamed.text == "" and streamed.page_count == 2
+    for keyword in report_context.registered_keywords():
+        assert streamed.has(keyword) == eager.has(keyword), keyword
+    assert streamed.head == text[:report_context.HEAD_CHARS]
+    assert [rec[:3] for rec in streamed.labs] == [rec[:3] for rec in eager.labs]
+
+    kept = report_context.ReportContext.from_pages(enumerate(pages, 1), keep_text=True)
+    assert not kept.streamed and kept.text == text and kept.has("nia rep") is True
+    with pytest.raises(LookupError):
+        streamed.has("not registered")
@@ -0,0 +1,50 @@
+import time
+
+from src.tools import work_queue
+from src.tools.work_queue import WorkQueue
+
+PATHS = [f"r{i}.pdf" for i in range(5)]
+
+def test_claim_complete_and_idempotent_enqueue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "q.sqlite3"), owner="a")
+    assert queue.enqueue(PATHS, shard_size=2) == 5
+    assert queue.enqueue(PATHS, shard_size=2) == 0
+    first, second = queue.claim(), queue.claim()
+    assert first.paths == PATHS[:2] and second.paths == PATHS[2:4]
+
+    assert not queue.complete(first.shard_id, [(PATHS[0], None)])  # checkpoint, one report still pending
+    assert queue.complete(first.shard_id, [(PATHS[1], "boom")])
+    assert queue.heartbeat([second.shard_id]) == []
+    assert queue.progress() == {"pending": 3, "done": 1, "failed": 1}
+    assert queue.unfinished_shards() == 2
+
+def test_expired_lease_is_reclaimed_without_finished_reports(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    crashed = WorkQueue(path, lease_s=0.05, owner="a")
+    crashed.enqueue(PATHS[:3], shard_size=3)
+    lease = crashed.claim()
+    crashed.complete(lease.shard_id, [(PATHS[0], None)])
+    other = WorkQueue(path, owner="b")
+    assert other.claim() is None  # still leased
+    time.sleep(0.1)
+
+    taken = other.claim()
+    assert taken.shard_id == lease.shard_id and taken.paths == PATHS[1:3]
+    assert crashed.heartbeat([lease.shard_id]) == [lease.shard_id]  # its lease now belongs to b
+
+def test_shard_fails_after_max_attempts_and_retry_requeues(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "MAX_ATTEMPTS", 2)
+    queue = WorkQueue(str(tmp_path / "q.sqlite3"), lease_s=0.01, owner="a")
+    queue.enqueue(PATHS[:2])
+    for _ in range(2):  # leased twice, expiring both times
+        assert queue.claim() is not None
+        time.sleep(0.02)
+    assert queue.claim() is None
+    assert queue.progress() == {"pending": 0, "done": 0, "failed": 2}
+
+    assert queue.retry_failed() == 2
+    queue.lease_s = 60.0
+    lease = queue.claim()
+    assert lease.paths == PATHS[:2]
+    assert queue.complete(lease.shard_id, [(p, None) for p in lease.paths])
+    assert queue.progress() == {"pending": 0, "done": 2, "failed": 0} and queue.unfinished_shards() == 0